@@ -0,0 +1,137 @@
+"""Compare the step time of AGEM's gradient bookkeeping with per-parameter
+copies (the previous store_grad / overwrite_grad) and with gradients pointing
+into flat buffers.
+
+A stack of linear layers stands in for the policy, so the numbers isolate the
+cost of storing, projecting and writing back the gradients around the two
+backward passes.
+"""
+import init_path
+import argparse
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from libero.lifelong.algos.agem import point_grads, project
+
+
+def store_grad(params, grads, grad_dims):
+    grads.fill_(0.0)
+    count = 0
+    for param in params():
+        if param.grad is not None:
+            begin = 0 if count == 0 else sum(grad_dims[:count])
+            end = np.sum(grad_dims[: count + 1])
+            grads[begin:end].copy_(param.grad.data.view(-1))
+        count += 1
+
+
+def overwrite_grad(params, newgrad, grad_dims):
+    count = 0
+    for param in params():
+        if param.grad is not None:
+            begin = 0 if count == 0 else sum(grad_dims[:count])
+            end = sum(grad_dims[: count + 1])
+            this_grad = newgrad[begin:end].contiguous().view(param.grad.data.size())
+            param.grad.data.copy_(this_grad)
+        count += 1
+
+
+def copy_step(model, optimizer, x, buf_x, grad_dims, grad_xy, grad_er):
+    optimizer.zero_grad()
+    model(x).square().mean().backward()
+    store_grad(model.parameters, grad_xy, grad_dims)
+    model.zero_grad()
+    model(buf_x).square().mean().backward()
+    store_grad(model.parameters, grad_er, grad_dims)
+    dot_prod = torch.dot(grad_xy, grad_er)
+    if dot_prod.item() < 0:
+        g_tilde = grad_xy - dot_prod / torch.dot(grad_er, grad_er) * grad_er
+        overwrite_grad(model.parameters, g_tilde, grad_dims)
+    else:
+        overwrite_grad(model.parameters, grad_xy, grad_dims)
+    optimizer.step()
+
+
+def flat_step(model, optimizer, x, buf_x, params, grad_xy, grad_er):
+    optimizer.zero_grad()
+    point_grads(params, grad_xy)
+    grad_xy.zero_()
+    model(x).square().mean().backward()
+    point_grads(params, grad_er)
+    grad_er.zero_()
+    model(buf_x).square().mean().backward()
+    project(grad_xy, grad_er)
+    point_grads(params, grad_xy)
+    optimizer.step()
+
+
+def run(step_fn, model, n_steps, device, batch_size, width):
+    x = torch.randn(batch_size, width, device=device)
+    buf_x = torch.randn(batch_size, width, device=device)
+    for _ in range(5):
+        step_fn(x, buf_x)
+    if device.startswith("cuda"):
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(n_steps):
+        step_fn(x, buf_x)
+    if device.startswith("cuda"):
+        torch.cuda.synchronize()
+    return (time.time() - start) / n_steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-layers", type=int, default=100)
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--n-steps", type=int, default=100)
+    parser.add_argument(
+        "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = nn.Sequential(
+        *[nn.Linear(args.width, args.width) for _ in range(args.num_layers)]
+    ).to(args.device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+    params = list(model.parameters())
+    grad_dims = [p.numel() for p in params]
+    numel = sum(grad_dims)
+
+    grad_xy = torch.zeros(numel, device=args.device)
+    grad_er = torch.zeros(numel, device=args.device)
+    copy_time = run(
+        lambda x, buf_x: copy_step(
+            model, optimizer, x, buf_x, grad_dims, grad_xy, grad_er
+        ),
+        model,
+        args.n_steps,
+        args.device,
+        args.batch_size,
+        args.width,
+    )
+    flat_time = run(
+        lambda x, buf_x: flat_step(model, optimizer, x, buf_x, params, grad_xy, grad_er),
+        model,
+        args.n_steps,
+        args.device,
+        args.batch_size,
+        args.width,
+    )
+
+    print(
+        f"[info] {args.num_layers * 2} parameters, {numel} elements, "
+        f"device {args.device}"
+    )
+    print(f"[info] per-parameter copies: {copy_time * 1000:.2f} ms/step")
+    print(f"[info] flat gradient views: {flat_time * 1000:.2f} ms/step")
+    print(f"[info] speedup {copy_time / flat_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure the time to import the LIBERO packages in a fresh interpreter, as
+paid by every eval worker process and CLI script, and report which heavy
+dependencies each import pulls in.
+
+Example:
+    python benchmark_scripts/benchmark_import_time.py --repeats 5
+"""
+import init_path
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+DEFAULT_MODULES = [
+    "libero.libero.envs",
+    "libero.libero.envs.env_wrapper",
+    "libero.libero.benchmark",
+    "libero.lifelong.models",
+    "libero.lifelong.algos",
+    "libero.lifelong.utils",
+]
+
+# dependencies that should only be imported when they are used
+HEAVY_MODULES = [
+    "robosuite",
+    "mujoco",
+    "transformers",
+    "thop",
+    "wandb",
+    "gym",
+    "libero.libero.envs.problems.libero_tabletop_manipulation",
+    "libero.libero.envs.objects.hope_objects",
+    "libero.lifelong.models.bc_transformer_policy",
+    "libero.lifelong.algos.packnet",
+]
+
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def time_import(module, root):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([root, env.get("PYTHONPATH", "")])
+    output = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(module=module, heavy=HEAVY_MODULES)],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=str, nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for module in args.modules:
+        try:
+            results = [time_import(module, root) for _ in range(args.repeats)]
+        except subprocess.CalledProcessError as e:
+            print(f"[error] failed to import {module}: {e.stderr.strip()}")
+            continue
+        elapsed = np.median([result["elapsed"] for result in results])
+        print(f"[info] {module}: {elapsed:.2f} sec")
+        print(f"       heavy imports: {', '.join(results[0]['heavy']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
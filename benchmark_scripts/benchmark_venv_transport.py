@@ -0,0 +1,102 @@
+"""Compare the observation throughput of SubprocVectorEnv with and without
+shared-memory transport.
+
+By default a synthetic env that returns the same observation layout as
+OffScreenRenderEnv (two camera images plus proprioception) is used, so the
+numbers isolate the IPC cost. Pass --bddl-file to measure a real task.
+"""
+import init_path
+import argparse
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from libero.libero.envs import OffScreenRenderEnv, SubprocVectorEnv
+
+
+class FakeRenderEnv:
+    """Returns random observations shaped like OffScreenRenderEnv's."""
+
+    def __init__(self, img_h=128, img_w=128):
+        self.rng = np.random.default_rng(0)
+        self.obs = OrderedDict(
+            [
+                ("agentview_image", np.zeros((img_h, img_w, 3), dtype=np.uint8)),
+                (
+                    "robot0_eye_in_hand_image",
+                    np.zeros((img_h, img_w, 3), dtype=np.uint8),
+                ),
+                ("robot0_joint_pos", np.zeros(7)),
+                ("robot0_eef_pos", np.zeros(3)),
+                ("robot0_eef_quat", np.zeros(4)),
+                ("robot0_gripper_qpos", np.zeros(2)),
+            ]
+        )
+
+    def _get_observations(self):
+        for v in self.obs.values():
+            v[...] = self.rng.integers(0, 255, size=v.shape)
+        return OrderedDict((k, v.copy()) for k, v in self.obs.items())
+
+    def reset(self):
+        return self._get_observations()
+
+    def step(self, action):
+        return self._get_observations(), 0.0, False, {}
+
+    def seed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def close(self):
+        pass
+
+
+def run(env_fn, env_num, n_steps, share_memory):
+    env = SubprocVectorEnv(
+        [env_fn for _ in range(env_num)], share_memory=share_memory
+    )
+    env.reset()
+    actions = np.zeros((env_num, 7))
+    # the first step sets up the shared buffers
+    env.step(actions)
+    start = time.time()
+    for _ in range(n_steps):
+        obs, _, _, _ = env.step(actions)
+    elapsed = time.time() - start
+    env.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-procs", type=int, default=20)
+    parser.add_argument("--n-steps", type=int, default=600)
+    parser.add_argument("--img-size", type=int, default=128)
+    parser.add_argument("--bddl-file", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.bddl_file is None:
+        env_fn = lambda: FakeRenderEnv(args.img_size, args.img_size)
+    else:
+        env_args = {
+            "bddl_file_name": args.bddl_file,
+            "camera_heights": args.img_size,
+            "camera_widths": args.img_size,
+        }
+        env_fn = lambda: OffScreenRenderEnv(**env_args)
+
+    results = {}
+    for share_memory in [False, True]:
+        elapsed = run(env_fn, args.num_procs, args.n_steps, share_memory)
+        results[share_memory] = elapsed
+        print(
+            f"[info] share_memory={share_memory}: {elapsed:.2f} sec for "
+            f"{args.n_steps} steps x {args.num_procs} envs "
+            f"({args.n_steps * args.num_procs / elapsed:.0f} env steps/sec)"
+        )
+    print(f"[info] speedup {results[False] / results[True]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
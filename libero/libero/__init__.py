@@ -26,12 +26,16 @@ def get_default_path_dict(custom_location=None):
     # This is a default path for localizing all the default assets
     assets_default_path = os.path.join(benchmark_root_path, "./assets")
 
+    # This is a default path for caching the task embeddings
+    task_embs_default_path = os.path.join(benchmark_root_path, "../task_embs")
+
     return {
         "benchmark_root": benchmark_root_path,
         "bddl_files": bddl_files_default_path,
         "init_states": init_states_default_path,
         "datasets": dataset_default_path,
         "assets": assets_default_path,
+        "task_embs": task_embs_default_path,
     }
 
 
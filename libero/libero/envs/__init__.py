@@ -1,7 +1,27 @@
-from .bddl_base_domain import TASK_MAPPING
-from .base_object import OBJECTS_DICT
-from .problems import *
-from .robots import *
-from .arenas import *
-from .env_wrapper import OffScreenRenderEnv, SegmentationRenderEnv
-from .venv import SubprocVectorEnv, DummyVectorEnv
+import importlib
+
+# the public names of the package and the modules defining them. They are
+# imported on first access, so that e.g. the vector envs do not pull in
+# robosuite, and envs only import the problem and objects they use.
+_LAZY_ATTRS = {
+    "TASK_MAPPING": "bddl_base_domain",
+    "OBJECTS_DICT": "base_object",
+    "OffScreenRenderEnv": "env_wrapper",
+    "SegmentationRenderEnv": "env_wrapper",
+    "SubprocVectorEnv": "venv",
+    "DummyVectorEnv": "venv",
+}
+
+__all__ = list(_LAZY_ATTRS.keys())
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(f"{__name__}.{_LAZY_ATTRS[name]}")
+        return getattr(module, name)
+    if not name.startswith("__"):
+        # the problem classes used to be imported here
+        problems = importlib.import_module(f"{__name__}.problems")
+        if name.lower() in problems.PROBLEM_MODULES:
+            return getattr(problems, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,49 @@
-import re
 
-OBJECTS_DICT = {}
-VISUAL_CHANGE_OBJECTS_DICT = {}
+from libero.libero.utils.registry_utils import (
+    LazyRegistry,
+    index_registered_classes,
+    snake_case_key,
+)
+
+# the modules of libero.libero.envs.objects registering objects, imported when
+# one of their objects is requested
+OBJECT_MODULES = [
+    "hope_objects",
+    "google_scanned_objects",
+    "articulated_objects",
+    "turbosquid_objects",
+    "robosuite_objects",
+    "target_zones",
+]
+
+OBJECTS_DICT = LazyRegistry(
+    lambda: index_registered_classes(
+        "libero.libero.envs.objects",
+        OBJECT_MODULES,
+        ["register_object"],
+        snake_case_key,
+    )
+)
+VISUAL_CHANGE_OBJECTS_DICT = LazyRegistry(
+    lambda: index_registered_classes(
+        "libero.libero.envs.objects",
+        OBJECT_MODULES,
+        ["register_visual_change_object"],
+        snake_case_key,
+    )
+)
 
 
 def register_object(target_class):
     """We design the mapping to be case-INsensitive."""
-    key = "_".join(re.sub(r"([A-Z0-9])", r" \1", target_class.__name__).split()).lower()
-    assert key not in OBJECTS_DICT
+    key = snake_case_key(target_class.__name__)
+    assert not OBJECTS_DICT.is_registered(key)
     OBJECTS_DICT[key] = target_class
     return target_class
 
 
 def register_visual_change_object(target_class):
     """We keep track of objects that might have visual changes to optimize the codebase"""
-    key = "_".join(re.sub(r"([A-Z0-9])", r" \1", target_class.__name__).split()).lower()
+    key = snake_case_key(target_class.__name__)
     VISUAL_CHANGE_OBJECTS_DICT[key] = target_class
     return target_class
@@ -1,32 +1,156 @@
+import glob
+import hashlib
 import numpy as np
 import os
+import re
 import robosuite.utils.transform_utils as T
 
-from copy import deepcopy
+from collections import OrderedDict
+from copy import copy
 from robosuite.environments.manipulation.single_arm_env import SingleArmEnv
 from robosuite.models.tasks import ManipulationTask
 from robosuite.utils.placement_samplers import SequentialCompositeSampler
 from robosuite.utils.observables import Observable, sensor
 from robosuite.utils.mjcf_utils import CustomMaterial
+from robosuite.utils.binding_utils import MjSim
 import robosuite.macros as macros
 
 import mujoco
 
 import libero.libero.envs.bddl_utils as BDDLUtils
-from libero.libero.envs.predicates.predicate_wrapper import Constraint, Sequential, StatefulWrapper
+from libero.libero.envs.predicates.predicate_wrapper import (
+    Constraint,
+    PredicateStateStore,
+    Sequential,
+    StatefulWrapper,
+)
 from libero.libero.envs.robots import *
 from libero.libero.envs.utils import *
 from libero.libero.envs.object_states import *
 from libero.libero.envs.objects import *
 from libero.libero.envs.regions import *
 from libero.libero.envs.arenas import *
-from libero.libero.envs.predicates import eval_predicate_fn, VALIDATE_PREDICATE_FN_DICT
-from libero.libero.envs.debug import print_states
+from libero.libero.envs.predicates import (
+    eval_predicate_fn,
+    GoalProgram,
+    VALIDATE_PREDICATE_FN_DICT,
+)
+from libero.libero.envs.debug import DEBUG, print_states
+from libero.libero.envs.problems import PROBLEM_MODULES
+from libero.libero.utils.registry_utils import LazyRegistry
 
 
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 
-TASK_MAPPING = {}
+# the problem classes, imported from libero.libero.envs.problems on demand
+TASK_MAPPING = LazyRegistry(
+    {
+        problem_name: f"libero.libero.envs.problems.{problem_name}"
+        for problem_name in PROBLEM_MODULES
+    }
+)
+
+# Compiled MuJoCo models of this process, keyed by the hash of their xml.
+# Hard resets and envs of an already loaded bddl file rebuild the same xml, so
+# they start from a copy of the cached model instead of compiling it again.
+COMPILED_MODEL_CACHE = OrderedDict()
+COMPILED_MODEL_CACHE_SIZE = int(os.getenv("LIBERO_COMPILED_MODEL_CACHE_SIZE", 8))
+
+# Compiled models persisted across processes as MuJoCo binaries, so that a new
+# process (e.g. an evaluation or data collection worker) loads the meshes and
+# textures of a scene it has seen before instead of compiling them. A binary is
+# keyed by the xml, the MuJoCo version and the mtime and size of every asset
+# file the xml references, so edited assets are compiled again by the next
+# process; a running process has to call clear_model_cache after editing them.
+# The binaries embed the decoded meshes and textures, so the cache is only
+# used when LIBERO_MODEL_CACHE_DIR is set, e.g. to <libero config>/model_cache.
+MODEL_CACHE_DIR = os.getenv("LIBERO_MODEL_CACHE_DIR", "")
+MODEL_CACHE_MAX_FILES = int(os.getenv("LIBERO_MODEL_CACHE_MAX_FILES", 256))
+ASSET_FILE_PATTERN = re.compile(r'\bfile="([^"]+)"')
+
+
+def get_model_key(xml):
+    """The key of a compiled model: its xml, MuJoCo version and asset files."""
+    hasher = hashlib.sha1(xml.encode("utf-8"))
+    hasher.update(mujoco.mj_versionString().encode("utf-8"))
+    for file_name in sorted(set(ASSET_FILE_PATTERN.findall(xml))):
+        stamp = None
+        if os.path.exists(file_name):
+            stat = os.stat(file_name)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        hasher.update(f"{file_name}:{stamp}".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def prune_model_cache():
+    """Remove the least recently used binaries beyond MODEL_CACHE_MAX_FILES."""
+    model_files = glob.glob(os.path.join(MODEL_CACHE_DIR, "*.mjb"))
+    if len(model_files) <= MODEL_CACHE_MAX_FILES:
+        return
+    model_files.sort(key=lambda model_file: os.stat(model_file).st_mtime)
+    for model_file in model_files[: len(model_files) - MODEL_CACHE_MAX_FILES]:
+        try:
+            os.remove(model_file)
+        except OSError:
+            pass
+
+
+def load_compiled_model(xml):
+    """
+    Compile an xml string into a MjModel, or load its compilation from
+    MODEL_CACHE_DIR.
+    """
+    if not MODEL_CACHE_DIR:
+        return mujoco.MjModel.from_xml_string(xml, {})
+    model_file = os.path.join(MODEL_CACHE_DIR, f"{get_model_key(xml)}.mjb")
+    if os.path.exists(model_file):
+        try:
+            model = mujoco.MjModel.from_binary_path(model_file)
+            # mark it as recently used
+            os.utime(model_file)
+            return model
+        except Exception:
+            print(f"[warning] ignoring corrupted {model_file}")
+
+    model = mujoco.MjModel.from_xml_string(xml, {})
+    try:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        tmp_file = f"{model_file}.{os.getpid()}.tmp"
+        mujoco.mj_saveModel(model, tmp_file, None)
+        os.replace(tmp_file, model_file)
+        prune_model_cache()
+    except OSError as e:
+        print(f"[warning] could not cache the compiled model in {model_file}: {e}")
+    return model
+
+
+def compile_model(xml):
+    """Compile an xml string into a MjModel, reusing cached compilations."""
+    key = hashlib.sha1(xml.encode("utf-8")).hexdigest()
+    if key not in COMPILED_MODEL_CACHE:
+        COMPILED_MODEL_CACHE[key] = load_compiled_model(xml)
+        while len(COMPILED_MODEL_CACHE) > COMPILED_MODEL_CACHE_SIZE:
+            COMPILED_MODEL_CACHE.popitem(last=False)
+    COMPILED_MODEL_CACHE.move_to_end(key)
+    # the sim mutates its model (e.g. fixture placements), so never share it
+    return copy(COMPILED_MODEL_CACHE[key])
+
+
+def clear_model_cache(disk=False):
+    """
+    Forget the parsed bddl files and compiled models of this process, e.g.
+    after editing assets while it runs. With disk=True, also remove the
+    binaries in MODEL_CACHE_DIR.
+    """
+    COMPILED_MODEL_CACHE.clear()
+    BDDLUtils.PARSED_PROBLEM_CACHE.clear()
+    if disk and MODEL_CACHE_DIR:
+        for model_file in glob.glob(os.path.join(MODEL_CACHE_DIR, "*.mjb")):
+            try:
+                os.remove(model_file)
+            except OSError:
+                # e.g. pruned by another process
+                pass
 
 
 def register_problem(target_class):
@@ -145,8 +269,15 @@ class BDDLBaseDomain(SingleArmEnv):
 
         self.debug_time = 0
 
-        # deep copy VALIDATE_PREDICATE_FN_DICT
-        self.VALIDATE_PREDICATE_FN_DICT = deepcopy(VALIDATE_PREDICATE_FN_DICT)
+        # predicates are shared, their per-episode state lives in predicate_states
+        self.VALIDATE_PREDICATE_FN_DICT = VALIDATE_PREDICATE_FN_DICT
+        self.predicate_states = PredicateStateStore()
+        # compiled goal_state, rebuilt when the object states change
+        self.goal_program = None
+        # poses of the tracked bodies and sites, shared by all object states
+        self.geom_snapshot = None
+        # contacts between objects and robot components, rebuilt once per step
+        self.contact_index = None
 
         super().__init__(
             robots=robots,
@@ -413,6 +544,25 @@ class BDDLBaseDomain(SingleArmEnv):
         for fixture in self.fixtures:
             self.model.merge_assets(fixture)
 
+    def _initialize_sim(self, xml_string=None):
+        """
+        Creates a MjSim object and stores it in self.sim, compiling the model
+        through the per-process cache of compiled models.
+        """
+        xml = xml_string if xml_string else self.model.get_xml()
+
+        # process the xml before initializing sim
+        if getattr(self, "_xml_processor", None) is not None:
+            xml = self._xml_processor(xml)
+
+        self.sim = MjSim(compile_model(xml))
+
+        # run a single step to make sure changes have propagated through sim state
+        self.sim.forward()
+
+        # Setup sim time based on control frequency
+        self.initialize_time(self.control_freq)
+
     def _setup_placement_initializer(self, mujoco_arena):
         self.placement_initializer = SequentialCompositeSampler(name="ObjectSampler")
         self.conditional_placement_initializer = SiteSequentialCompositeSampler(
@@ -447,6 +597,45 @@ class BDDLBaseDomain(SingleArmEnv):
         # Initialize robot states for gripper components
         self._setup_robot_states()
 
+        self._setup_geom_snapshot()
+        self._setup_contact_index()
+
+    def _setup_geom_snapshot(self):
+        """
+        Track the bodies of all objects and robot components and all object
+        sites in one snapshot, so predicates read their poses from sim.data once
+        per step.
+        """
+        body_ids = list(self.obj_body_id.values())
+        for robot_state in self.robot_states_dict.values():
+            geom_id = self.sim.model.geom_name2id(robot_state.geom_name)
+            body_ids.append(self.sim.model.geom_bodyid[geom_id])
+        self.geom_snapshot = GeomSnapshot(
+            self.sim, body_ids, list(self.object_sites_dict.keys())
+        )
+
+    def _setup_contact_index(self):
+        """
+        Map the contact geoms of all objects, fixtures and robot components to
+        their owners, so contact predicates are answered from one pass over
+        sim.data.contact per step.
+        """
+        geom_groups = OrderedDict()
+        for object_name, object_body in self.objects_dict.items():
+            geom_groups[object_name] = object_body.contact_geoms
+        for fixture_name, fixture_body in self.fixtures_dict.items():
+            geom_groups[fixture_name] = fixture_body.contact_geoms
+        for robot_state in self.robot_states_dict.values():
+            geom_groups[robot_state.geom_name] = [robot_state.geom_name]
+        self.contact_index = ContactIndex(self.sim, geom_groups)
+
+    def invalidate_step_caches(self):
+        """Drop the per-step geometry snapshot and contact index."""
+        if self.geom_snapshot is not None:
+            self.geom_snapshot.invalidate()
+        if self.contact_index is not None:
+            self.contact_index.invalidate()
+
     def _setup_robot_states(self):
         """
         Initialize robot states for gripper components that can be used in predicates
@@ -805,7 +994,12 @@ class BDDLBaseDomain(SingleArmEnv):
         super()._reset_internal()
         self.debug_time = 0
 
-        self.VALIDATE_PREDICATE_FN_DICT = deepcopy(VALIDATE_PREDICATE_FN_DICT)
+        self.predicate_states.reset()
+        if (
+            self.goal_program is None
+            or self.goal_program.object_states_dict is not self.object_states_dict
+        ):
+            self._compile_goal_program()
 
         # Reset all object positions using initializer sampler if we're not directly loading from an xml
         if not self.deterministic_reset:
@@ -849,33 +1043,45 @@ class BDDLBaseDomain(SingleArmEnv):
                     self.sim.model.body_pos[body_id] = obj_pos
                     self.sim.model.body_quat[body_id] = obj_quat
 
+    def _compile_goal_program(self):
+        """
+        Compile the goal state into self.goal_program, binding the object states
+        and the predicate functions. The program is kept across resets as long
+        as the object states are the same.
+        """
+        self.goal_program = GoalProgram(
+            self.parsed_problem["goal_state"],
+            self.object_states_dict,
+            self.VALIDATE_PREDICATE_FN_DICT,
+            self.predicate_states,
+        )
+
     def _check_success(self):
         """
         Check if the goal is achieved. Consider conjunction goals at the moment
         """
-        goal_state = self.parsed_problem["goal_state"]
-        results = []
-        for state in goal_state:
-            result = self._eval_predicate(state)
-            results.append(result)
-
-        print_states(goal_state, results, self.object_states_dict, self.debug_time)  # debug print function
+        if self.goal_program is None:
+            self._compile_goal_program()
+
+        if DEBUG:
+            goal_state = self.parsed_problem["goal_state"]
+            results = self.goal_program.evaluate_clauses()
+            print_states(goal_state, results, self.object_states_dict, self.debug_time)  # debug print function
+            success = all(results)
+        else:
+            success = self.goal_program.evaluate()
         self.debug_time += 1
 
-        return all(results)
+        return success
     
     def _check_success_without_neuraljudge(self):
         """
         Check if the goal is achieved without considering neuraljudge predicates.
         """
-        goal_state = self.parsed_problem["goal_state"]
-        results = []
-        for state in goal_state:
-            if state[0] == "neuraljudge":
-                continue
-            result = self._eval_predicate(state)
-            results.append(result)
-        
+        if self.goal_program is None:
+            self._compile_goal_program()
+
+        results = self.goal_program.evaluate_clauses(skip=("neuraljudge",))
         return all(results)
 
     
@@ -941,13 +1147,13 @@ class BDDLBaseDomain(SingleArmEnv):
         evaluated_args = []
 
         if isinstance(predicate_fn, Sequential):
-            predicate_str = f"{str(state)}"
-            predicate_fn.init_by_name(predicate_str)
-            expected_index = predicate_fn.state[predicate_str]["NextExpectedIndex"]
+            predicate_state = self.predicate_states.get(f"{str(state)}")
+            predicate_fn.init_state(predicate_state)
+            expected_index = predicate_state["NextExpectedIndex"]
             val = self._eval_predicate(arg_exprs[0][expected_index])
             evaluated_args = [False] * len(arg_exprs[0])
             evaluated_args[expected_index] = val
-            return predicate_fn(predicate_str, evaluated_args)
+            return predicate_fn(predicate_state, evaluated_args)
 
 
         # unwrap arguments for variable-length truth predicates, e.g., Any, All, ...
@@ -972,8 +1178,8 @@ class BDDLBaseDomain(SingleArmEnv):
             evaluated_args = (tuple(evaluated_args),)
 
         if isinstance(predicate_fn, StatefulWrapper):
-            predicate_str = f"{str(state)}"
-            return predicate_fn(predicate_str, *evaluated_args)
+            predicate_state = self.predicate_states.get(f"{str(state)}")
+            return predicate_fn(predicate_state, *evaluated_args)
         
         return predicate_fn(*evaluated_args)
         
@@ -1002,10 +1208,18 @@ class BDDLBaseDomain(SingleArmEnv):
 
         return obs, reward, done, info
 
+    def reset(self):
+        obs = super().reset()
+        # the sim has been forwarded after the caches were set up
+        self.invalidate_step_caches()
+        return obs
+
     def _pre_action(self, action, policy_step=False):
         super()._pre_action(action, policy_step=policy_step)
 
     def _post_action(self, action):
+        # physics has been stepped, the reward below already checks success
+        self.invalidate_step_caches()
         reward, done, info = super()._post_action(action)
 
         self._post_process()
@@ -1019,9 +1233,62 @@ class BDDLBaseDomain(SingleArmEnv):
 
     def get_robot_state_vector(self, obs):
         return np.concatenate(
-            [obs["robot0_gripper_qpos"], obs["robot0_eef_pos"], obs["robot0_eef_quat"]]
+            [obs["robot0_gripper_qpos"], obs["robot0_eef_pos"], obs["robot0_eef_quat"]],
+            axis=-1,
         )
 
+    def render_states(self, states, cameras=None):
+        """
+        The observations of a sequence of flattened sim states, e.g. the
+        recorded states of a demo, without running the controller or stepping
+        the physics: every state is set and forwarded, and the observables are
+        read from it.
+
+        Args:
+            states (np.array): The flattened sim states.
+            cameras (None or list): The cameras to render, defaults to all the
+                camera_names of the env. The observables of the other cameras
+                are left out.
+        Returns:
+            OrderedDict: The observations, stacked along the first dimension.
+        """
+        disabled = []
+        if cameras is not None:
+            assert set(cameras) <= set(
+                self.camera_names
+            ), f"[error] cameras {cameras} are not all in {self.camera_names}"
+            for camera_name in self.camera_names:
+                if camera_name in cameras:
+                    continue
+                for name, observable in self._observables.items():
+                    if (
+                        observable.modality == "image"
+                        and name.startswith(f"{camera_name}_")
+                        and observable.is_enabled()
+                    ):
+                        observable.set_enabled(False)
+                        disabled.append(observable)
+
+        observations = OrderedDict()
+        try:
+            for i, state in enumerate(states):
+                self.sim.set_state_from_flattened(state)
+                self.sim.forward()
+                self.invalidate_step_caches()
+                self._post_process()
+                self._update_observables(force=True)
+                for name, value in self._get_observations().items():
+                    if name not in observations:
+                        value = np.asarray(value)
+                        observations[name] = np.empty(
+                            (len(states),) + value.shape, dtype=value.dtype
+                        )
+                    observations[name][i] = value
+        finally:
+            for observable in disabled:
+                observable.set_enabled(True)
+        return observations
+
     def is_fixture(self, object_name):
         """
         Check if an object is defined as a fixture in the task
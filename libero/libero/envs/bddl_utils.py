@@ -1,10 +1,26 @@
 from bddl.parsing import *
 
+import hashlib
 import itertools
 import numpy as np
+from copy import deepcopy
 
 pi = np.pi
 
+# Parsed bddl files of this process, keyed by the parser and the hash of the
+# file content, so that envs of an already loaded task do not tokenize it again
+# while an edited file is parsed again.
+PARSED_PROBLEM_CACHE = {}
+
+
+def parse_cached(parse_fn, problem_filename):
+    with open(problem_filename, "rb") as f:
+        key = (parse_fn.__name__, hashlib.sha1(f.read()).hexdigest())
+    if key not in PARSED_PROBLEM_CACHE:
+        PARSED_PROBLEM_CACHE[key] = parse_fn(problem_filename)
+    # the envs modify the parsed problem, e.g. to join neuraljudge goals
+    return deepcopy(PARSED_PROBLEM_CACHE[key])
+
 
 def get_regions(t, regions, group):
     group.pop(0)
@@ -61,6 +77,10 @@ def get_scenes(t, scene_properties, group):
 
 
 def get_problem_info(problem_filename):
+    return parse_cached(_get_problem_info, problem_filename)
+
+
+def _get_problem_info(problem_filename):
     domain_name = "unknown"
     problem_filename = problem_filename
     tokens = scan_tokens(filename=problem_filename)
@@ -85,6 +105,10 @@ def get_problem_info(problem_filename):
 
 
 def robosuite_parse_problem(problem_filename):
+    return parse_cached(_robosuite_parse_problem, problem_filename)
+
+
+def _robosuite_parse_problem(problem_filename):
     domain_name = "robosuite"
     problem_filename = problem_filename
     tokens = scan_tokens(filename=problem_filename)
@@ -6,7 +6,7 @@ import matplotlib.cm as cm
 from robosuite.utils.errors import RandomizationError
 
 import libero.libero.envs.bddl_utils as BDDLUtils
-from libero.libero.envs import *
+from libero.libero.envs.bddl_base_domain import TASK_MAPPING
 
 
 class ControlEnv:
@@ -103,6 +103,10 @@ class ControlEnv:
     def check_success(self):
         return self.env._check_success()
 
+    @property
+    def goal_program(self):
+        return self.env.goal_program
+
     @property
     def _visualizations(self):
         return self.env._visualizations
@@ -126,6 +130,7 @@ class ControlEnv:
 
     def set_state(self, mujoco_state):
         self.env.sim.set_state_from_flattened(mujoco_state)
+        self.env.invalidate_step_caches()
 
     def reset_from_xml_string(self, xml_string):
         self.env.reset_from_xml_string(xml_string)
@@ -139,11 +144,19 @@ class ControlEnv:
     def regenerate_obs_from_state(self, mujoco_state):
         self.set_state(mujoco_state)
         self.env.sim.forward()
+        self.env.invalidate_step_caches()
         self.check_success()
         self._post_process()
         self._update_observables(force=True)
         return self.env._get_observations()
 
+    def render_states(self, states, cameras=None):
+        """
+        The observations of a sequence of flattened sim states, rendered
+        without stepping the physics. See BDDLBaseDomain.render_states.
+        """
+        return self.env.render_states(states, cameras=cameras)
+
     def close(self):
         self.env.close()
         del self.env
@@ -1 +1,3 @@
 from .base_object_states import *
+from .geom_snapshot import GeomSnapshot, batch_mat2quat
+from .contact_index import ContactIndex
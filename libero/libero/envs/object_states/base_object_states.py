@@ -48,16 +48,19 @@ class ObjectState(BaseObjectState):
         )
 
     def get_geom_state(self):
-        object_pos = self.env.sim.data.body_xpos[self.env.obj_body_id[self.object_name]]
-        object_quat = self.env.sim.data.body_xquat[
+        return self.env.geom_snapshot.get_body_state(
             self.env.obj_body_id[self.object_name]
-        ]
-        return {"pos": object_pos, "quat": object_quat}
+        )
 
     def check_contact(self, other):
         if isinstance(other, RobotObjectState):
             # If the other object is a robot component, use its check_contact method
             return other.check_contact(self)
+        in_contact = self.env.contact_index.in_contact(
+            self.object_name, other.object_name
+        )
+        if in_contact is not None:
+            return in_contact
         object_1 = self.env.get_object(self.object_name)
         object_2 = self.env.get_object(other.object_name)
         return self.env.check_contact(object_1, object_2)
@@ -163,11 +166,7 @@ class SiteObjectState(BaseObjectState):
         self.object_state_type = "site"
 
     def get_geom_state(self):
-        object_pos = self.env.sim.data.get_site_xpos(self.object_name)
-        object_quat = transform_utils.mat2quat(
-            self.env.sim.data.get_site_xmat(self.object_name)
-        )
-        return {"pos": object_pos, "quat": object_quat}
+        return self.env.geom_snapshot.get_site_state(self.object_name)
 
     def check_contain(self, other):
         this_object = self.env.object_sites_dict[self.object_name]
@@ -206,9 +205,16 @@ class SiteObjectState(BaseObjectState):
                     this_object_position, this_object_mat, other_object_position
                 )
             else:
-                return this_object.under(
+                if not this_object.under(
                     this_object_position, this_object_mat, other_object_position
-                ) and self.env.check_contact(parent_object, other_object)
+                ):
+                    return False
+                in_contact = self.env.contact_index.in_contact(
+                    self.parent_name, other.object_name
+                )
+                if in_contact is not None:
+                    return in_contact
+                return self.env.check_contact(parent_object, other_object)
         else:
             return True
 
@@ -261,13 +267,15 @@ class RobotObjectState(BaseObjectState):
         body_id = self.env.sim.model.geom_bodyid[geom_id]
         
         # Get position and orientation from the body
-        object_pos = self.env.sim.data.body_xpos[body_id]
-        object_quat = self.env.sim.data.body_xquat[body_id]
-        
-        return {"pos": object_pos, "quat": object_quat}
+        return self.env.geom_snapshot.get_body_state(body_id)
     
     def check_contact(self, other):
         """Check if this robot component is in contact with another object"""
+        other_name = getattr(other, "geom_name", None) or other.object_name
+        in_contact = self.env.contact_index.in_contact(self.geom_name, other_name)
+        if in_contact is not None:
+            return in_contact
+
         # Get the geom id for this robot component
         geom_id = self.env.sim.model.geom_name2id(self.geom_name)
         
@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class ContactIndex:
+    """
+    A per-step index of which tracked entities are in contact. Each entity (an
+    object, a fixture or a robot component) owns a group of geoms; the geom to
+    entity map is computed once, and the contact matrix between entities is
+    built from sim.data.contact with one vectorized pass the first time it is
+    queried after the index was invalidated. Like GeomSnapshot, the index is
+    invalidated by the env after physics steps and state changes, and is also
+    rebuilt whenever the simulation time moved.
+
+    Args:
+        sim (MjSim): The simulation the index reads from.
+        geom_groups (dict): Maps entity names to the names of their contact
+            geoms. Geoms missing from the model are ignored.
+    """
+
+    def __init__(self, sim, geom_groups):
+        self.sim = sim
+        self.index = {name: i for i, name in enumerate(geom_groups.keys())}
+        self.geom_to_entity = np.full(sim.model.ngeom, -1, dtype=np.int64)
+        for name, geom_names in geom_groups.items():
+            for geom_name in geom_names:
+                try:
+                    geom_id = sim.model.geom_name2id(geom_name)
+                except Exception:
+                    continue
+                self.geom_to_entity[geom_id] = self.index[name]
+        n_entities = len(self.index)
+        self.contact_matrix = np.zeros((n_entities, n_entities), dtype=bool)
+        self._stamp = None
+
+    def invalidate(self):
+        self._stamp = None
+
+    def refresh(self):
+        data = self.sim.data
+        self.contact_matrix[...] = False
+        ncon = data.ncon
+        if ncon > 0:
+            contact = data.contact
+            entity_1 = self.geom_to_entity[np.asarray(contact.geom1[:ncon])]
+            entity_2 = self.geom_to_entity[np.asarray(contact.geom2[:ncon])]
+            valid = (entity_1 >= 0) & (entity_2 >= 0)
+            entity_1, entity_2 = entity_1[valid], entity_2[valid]
+            self.contact_matrix[entity_1, entity_2] = True
+            self.contact_matrix[entity_2, entity_1] = True
+        self._stamp = data.time
+
+    def in_contact(self, name_1, name_2):
+        """
+        Whether any geom of name_1 touches any geom of name_2.
+
+        Returns:
+            bool or None: None if either entity is not tracked by the index.
+        """
+        i = self.index.get(name_1)
+        j = self.index.get(name_2)
+        if i is None or j is None:
+            return None
+        if self._stamp is None or self._stamp != self.sim.data.time:
+            self.refresh()
+        return bool(self.contact_matrix[i, j])
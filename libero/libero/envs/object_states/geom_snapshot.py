@@ -0,0 +1,133 @@
+import numpy as np
+
+
+def batch_mat2quat(rmats):
+    """
+    Converts a stack of rotation matrices into quaternions, matching
+    robosuite.utils.transform_utils.mat2quat for each matrix.
+
+    Args:
+        rmats (np.array): (N, 3, 3) rotation matrices
+
+    Returns:
+        np.array: (N, 4) (x,y,z,w) float quaternion angles
+    """
+    M = np.asarray(rmats).astype(np.float32)[:, :3, :3]
+    n = M.shape[0]
+    if n == 0:
+        return np.zeros((0, 4), dtype=np.float32)
+
+    m00, m01, m02 = M[:, 0, 0], M[:, 0, 1], M[:, 0, 2]
+    m10, m11, m12 = M[:, 1, 0], M[:, 1, 1], M[:, 1, 2]
+    m20, m21, m22 = M[:, 2, 0], M[:, 2, 1], M[:, 2, 2]
+    # symmetric matrix K, only the lower triangle is used by eigh
+    K = np.zeros((n, 4, 4), dtype=np.float32)
+    K[:, 0, 0] = m00 - m11 - m22
+    K[:, 1, 0] = m01 + m10
+    K[:, 1, 1] = m11 - m00 - m22
+    K[:, 2, 0] = m02 + m20
+    K[:, 2, 1] = m12 + m21
+    K[:, 2, 2] = m22 - m00 - m11
+    K[:, 3, 0] = m21 - m12
+    K[:, 3, 1] = m02 - m20
+    K[:, 3, 2] = m10 - m01
+    K[:, 3, 3] = m00 + m11 + m22
+    K /= 3.0
+    # quaternion is Eigen vector of K that corresponds to largest eigenvalue
+    w, V = np.linalg.eigh(K)
+    q = V[np.arange(n), :, np.argmax(w, axis=-1)]
+    # the eigen vector is (x, y, z, w), make w non-negative
+    q[q[:, 3] < 0.0] *= -1.0
+    return q
+
+
+class GeomSnapshot:
+    """
+    A per-step snapshot of the poses of the bodies and sites tracked by the
+    object states. All positions, quaternions and rotation matrices are read
+    from sim.data at once with one gather per field, the first time they are
+    queried after the snapshot was invalidated. The env invalidates the
+    snapshot after physics steps and state changes; as a safety net the
+    snapshot is also refreshed whenever the simulation time moved.
+
+    Args:
+        sim (MjSim): The simulation the snapshot reads from.
+        body_ids (list): Ids of the bodies to track.
+        site_names (list): Names of the sites to track.
+    """
+
+    def __init__(self, sim, body_ids, site_names):
+        self.sim = sim
+        self.body_ids = np.array(sorted(set(body_ids)), dtype=np.int64)
+        self.body_index = {
+            int(body_id): i for i, body_id in enumerate(self.body_ids)
+        }
+        site_ids = []
+        self.site_index = {}
+        for site_name in site_names:
+            try:
+                site_id = sim.model.site_name2id(site_name)
+            except Exception:
+                continue
+            self.site_index[site_name] = len(site_ids)
+            site_ids.append(site_id)
+        self.site_ids = np.array(site_ids, dtype=np.int64)
+        self._stamp = None
+
+    def invalidate(self):
+        self._stamp = None
+
+    def refresh(self):
+        data = self.sim.data
+        self.body_pos = data.body_xpos[self.body_ids]
+        self.body_quat = data.body_xquat[self.body_ids]
+        self.body_mat = data.body_xmat[self.body_ids].reshape(-1, 3, 3)
+        self.site_pos = data.site_xpos[self.site_ids]
+        self.site_mat = data.site_xmat[self.site_ids].reshape(-1, 3, 3)
+        self.site_quat = batch_mat2quat(self.site_mat)
+        self._stamp = data.time
+
+    def _ensure_fresh(self):
+        if self._stamp is None or self._stamp != self.sim.data.time:
+            self.refresh()
+
+    def get_body_state(self, body_id):
+        """
+        Returns the pose of a body as {"pos", "quat", "mat"}, where quat is in
+        MuJoCo's (w,x,y,z) convention.
+        """
+        i = self.body_index.get(int(body_id))
+        if i is None:
+            data = self.sim.data
+            return {
+                "pos": data.body_xpos[body_id],
+                "quat": data.body_xquat[body_id],
+                "mat": data.body_xmat[body_id].reshape(3, 3),
+            }
+        self._ensure_fresh()
+        return {
+            "pos": self.body_pos[i],
+            "quat": self.body_quat[i],
+            "mat": self.body_mat[i],
+        }
+
+    def get_site_state(self, site_name):
+        """
+        Returns the pose of a site as {"pos", "quat", "mat"}, where quat is
+        computed with mat2quat, i.e. in the (x,y,z,w) convention.
+        """
+        i = self.site_index.get(site_name)
+        if i is None:
+            data = self.sim.data
+            xmat = data.get_site_xmat(site_name)
+            return {
+                "pos": data.get_site_xpos(site_name),
+                "quat": batch_mat2quat(xmat[None])[0],
+                "mat": xmat,
+            }
+        self._ensure_fresh()
+        return {
+            "pos": self.site_pos[i],
+            "quat": self.site_quat[i],
+            "mat": self.site_mat[i],
+        }
@@ -1,15 +1,18 @@
+import importlib
 import re
 
-from libero.libero.envs.base_object import OBJECTS_DICT, VISUAL_CHANGE_OBJECTS_DICT
+from libero.libero.envs.base_object import (
+    OBJECT_MODULES,
+    OBJECTS_DICT,
+    VISUAL_CHANGE_OBJECTS_DICT,
+)
 
-from .hope_objects import *
-from .google_scanned_objects import *
-from .articulated_objects import *
-from .turbosquid_objects import *
 from .site_object import SiteObject
-from .robosuite_objects import *
 from .target_zones import *
 
+# the modules of the objects (hope, google scanned, articulated, turbosquid and
+# robosuite objects) are imported on demand, see OBJECTS_DICT
+
 
 def get_object_fn(category_name):
     return OBJECTS_DICT[category_name.lower()]
@@ -17,3 +20,14 @@ def get_object_fn(category_name):
 
 def get_object_dict():
     return OBJECTS_DICT
+
+
+def __getattr__(name):
+    # the object classes used to be imported here, e.g. objects.WhiteBowl
+    if name.startswith("__"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    for module in OBJECT_MODULES:
+        module = importlib.import_module(f"{__name__}.{module}")
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,6 @@
 from .base_predicates import *
 from .predicate_wrapper import *
+from .goal_program import GoalProgram
 
 
 VALIDATE_PREDICATE_FN_DICT = {
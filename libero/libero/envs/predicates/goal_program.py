@@ -0,0 +1,265 @@
+from .base_predicates import And, All, Or, Any
+from .predicate_wrapper import PredicateStateStore, Sequential, StatefulWrapper
+
+
+class GoalNode:
+    """
+    A compiled predicate expression. Calling the node evaluates the expression
+    against the current simulation state.
+
+    Args:
+        fn: A zero-argument callable that evaluates the expression.
+        stateful: Whether the expression contains a stateful wrapper, in which
+            case it has to be evaluated on every step and cannot be skipped by
+            short-circuiting.
+    """
+
+    __slots__ = ("fn", "stateful")
+
+    def __init__(self, fn, stateful=False):
+        self.fn = fn
+        self.stateful = stateful
+
+    def __call__(self):
+        return self.fn()
+
+
+def _short_circuit(children, conjunction):
+    """
+    Build the evaluation function of a conjunction (And/All) or disjunction
+    (Or/Any). Stateful children are always evaluated so that their state keeps
+    being updated; the remaining children are evaluated lazily.
+    """
+    stateful = [c.fn for c in children if c.stateful]
+    stateless = [c.fn for c in children if not c.stateful]
+
+    if conjunction:
+
+        def evaluate():
+            result = True
+            for child in stateful:
+                result = bool(child()) and result
+            if not result:
+                return False
+            for child in stateless:
+                if not child():
+                    return False
+            return True
+
+    else:
+
+        def evaluate():
+            result = False
+            for child in stateful:
+                result = bool(child()) or result
+            if result:
+                return True
+            for child in stateless:
+                if child():
+                    return True
+            return False
+
+    return evaluate
+
+
+def _raise_on_evaluate(error):
+    def evaluate():
+        raise error
+
+    return evaluate
+
+
+class GoalProgramCompiler:
+    """
+    Turns a parsed goal expression into a tree of GoalNode closures. Object
+    states, literals and the states of stateful wrappers are resolved once, so
+    evaluating the tree only calls the predicate functions.
+
+    Args:
+        object_states_dict: The mapping from object names to object states.
+        predicate_fn_dict: The mapping from predicate names to predicate
+            functions, usually VALIDATE_PREDICATE_FN_DICT.
+        state_store: The PredicateStateStore holding the state of the stateful
+            nodes, which are keyed by the order in which they are compiled.
+    """
+
+    def __init__(self, object_states_dict, predicate_fn_dict, state_store):
+        self.object_states_dict = object_states_dict
+        self.predicate_fn_dict = predicate_fn_dict
+        self.state_store = state_store
+        self.num_stateful_nodes = 0
+
+    def new_node_state(self):
+        """The state dict of a new stateful node."""
+        node_id = self.num_stateful_nodes
+        self.num_stateful_nodes += 1
+        return self.state_store.get(node_id)
+
+    def resolve(self, expr):
+        """Resolve a leaf of the goal expression to an object state or a literal."""
+        if expr in self.object_states_dict:
+            return self.object_states_dict[expr]
+        return expr
+
+    def compile_arg(self, expr, expected_type):
+        if isinstance(expr, list):
+            node = self.compile(expr)
+            node_fn = node.fn
+
+            def evaluate():
+                val = node_fn()
+                if isinstance(val, expected_type):
+                    return val
+                try:
+                    return expected_type(val)
+                except Exception:
+                    raise TypeError(f"Cannot convert '{val}' to {expected_type}")
+
+            return GoalNode(evaluate, node.stateful)
+
+        val = self.resolve(expr)
+        if not isinstance(val, expected_type):
+            try:
+                val = expected_type(val)
+            except Exception:
+                return GoalNode(
+                    _raise_on_evaluate(
+                        TypeError(f"Cannot convert '{val}' to {expected_type}")
+                    )
+                )
+        return GoalNode(lambda: val)
+
+    def compile(self, expr):
+        """Compile a goal expression, mirroring BDDLBaseDomain._eval_predicate."""
+        if not isinstance(expr, list):
+            val = self.resolve(expr)
+            return GoalNode(lambda: val)
+
+        predicate_fn_name, *arg_exprs = expr
+        if predicate_fn_name not in self.predicate_fn_dict:
+            raise ValueError(f"Unknown predicate: {predicate_fn_name}")
+
+        predicate_fn = self.predicate_fn_dict[predicate_fn_name]
+        expected_types = predicate_fn.expected_arg_types()
+
+        if len(arg_exprs) != len(expected_types):
+            raise ValueError(
+                f"Predicate {predicate_fn_name} expects {len(expected_types)} arguments, but got {len(arg_exprs)}"
+            )
+
+        if isinstance(predicate_fn, Sequential):
+            # only the next expected sub-goal is evaluated
+            state = self.new_node_state()
+            children = [self.compile(arg_expr).fn for arg_expr in arg_exprs[0]]
+            n_children = len(children)
+
+            def evaluate():
+                predicate_fn.init_state(state)
+                expected_index = state["NextExpectedIndex"]
+                evaluated_args = [False] * n_children
+                evaluated_args[expected_index] = children[expected_index]()
+                return predicate_fn(state, evaluated_args)
+
+            return GoalNode(evaluate, stateful=True)
+
+        # unwrap arguments for variable-length truth predicates, e.g., Any, All, ...
+        variable_len_predicate = False
+        if len(expected_types) == 1 and expected_types[0] == tuple:
+            arg_exprs = arg_exprs[0]
+            expected_types = [bool] * len(arg_exprs)
+            variable_len_predicate = True
+
+        children = [
+            self.compile_arg(arg_expr, expected_type)
+            for arg_expr, expected_type in zip(arg_exprs, expected_types)
+        ]
+        stateful = any(child.stateful for child in children)
+        child_fns = [child.fn for child in children]
+
+        if isinstance(predicate_fn, StatefulWrapper):
+            state = self.new_node_state()
+
+            def evaluate():
+                return predicate_fn(state, *[fn() for fn in child_fns])
+
+            return GoalNode(evaluate, stateful=True)
+
+        if type(predicate_fn) in (And, All, Or, Any):
+            conjunction = type(predicate_fn) in (And, All)
+            return GoalNode(_short_circuit(children, conjunction), stateful)
+
+        if variable_len_predicate:
+
+            def evaluate():
+                return predicate_fn(tuple([fn() for fn in child_fns]))
+
+        else:
+
+            def evaluate():
+                return predicate_fn(*[fn() for fn in child_fns])
+
+        return GoalNode(evaluate, stateful)
+
+    def compile_clause(self, expr):
+        """
+        Compile a top-level goal clause. Errors are raised when the clause is
+        evaluated, as they would be without compilation.
+        """
+        try:
+            return self.compile(expr)
+        except (ValueError, TypeError) as e:
+            return GoalNode(_raise_on_evaluate(e))
+
+
+class GoalProgram:
+    """
+    The compiled goal of a problem: a conjunction of top-level goal clauses.
+
+    Args:
+        goal_state: The parsed goal, i.e., parsed_problem["goal_state"].
+        object_states_dict: The mapping from object names to object states.
+        predicate_fn_dict: The mapping from predicate names to predicate functions.
+        state_store: The PredicateStateStore of the stateful predicates, a new
+            one is created if None.
+    """
+
+    def __init__(
+        self, goal_state, object_states_dict, predicate_fn_dict, state_store=None
+    ):
+        if state_store is None:
+            state_store = PredicateStateStore()
+        self.state_store = state_store
+        compiler = GoalProgramCompiler(
+            object_states_dict, predicate_fn_dict, state_store
+        )
+        self.goal_state = goal_state
+        self.object_states_dict = object_states_dict
+        self.clause_names = [
+            state[0] if isinstance(state, list) and state else None
+            for state in goal_state
+        ]
+        self.clauses = [compiler.compile_clause(state) for state in goal_state]
+        self._evaluate = _short_circuit(self.clauses, conjunction=True)
+
+    def reset(self):
+        """Start a new episode, clearing the state of the stateful predicates."""
+        self.state_store.reset()
+
+    def evaluate(self):
+        """Whether all goal clauses hold."""
+        return self._evaluate()
+
+    def evaluate_clauses(self, skip=()):
+        """
+        Evaluate every goal clause without short-circuiting.
+
+        Args:
+            skip: Names of top-level predicates to leave out, e.g. ("neuraljudge",).
+        Returns:
+            list: The raw result of each evaluated clause.
+        """
+        return [
+            clause()
+            for name, clause in zip(self.clause_names, self.clauses)
+            if name not in skip
+        ]
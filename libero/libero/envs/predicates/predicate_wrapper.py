@@ -44,16 +44,36 @@ class Watch(PredicateWrapper):
         return [bool]
 
 
-class StatefulWrapper(PredicateWrapper):
+class PredicateStateStore:
+    """
+    The per-episode state of stateful predicates. Every stateful node of a
+    goal gets its own state dict, created on first use and kept across
+    episodes, so compiled goals can bind it once. reset() empties the state
+    dicts in place, which only costs the number of stateful nodes.
+    """
+
     def __init__(self):
-        super().__init__()
-        self.state = {}
+        self.states = {}
+
+    def get(self, key):
+        if key not in self.states:
+            self.states[key] = {}
+        return self.states[key]
 
-    def __call__(self, name, *arg):
-        raise NotImplementedError("Subclasses should implement this method.")
-    
     def reset(self):
-        self.state.clear()
+        for state in self.states.values():
+            state.clear()
+
+
+class StatefulWrapper(PredicateWrapper):
+    """
+    Base class of predicates that depend on the previous steps of an episode.
+    The predicate objects are shared and hold no state themselves: each call
+    receives the state dict of the evaluated node from a PredicateStateStore.
+    """
+
+    def __call__(self, state, *arg):
+        raise NotImplementedError("Subclasses should implement this method.")
     
     def expected_arg_types(self):
         raise NotImplementedError("Subclasses should implement this method.")
@@ -65,97 +85,97 @@ class Constraint(StatefulWrapper):
 
 
 class ConstraintAlways(Constraint):
-    def __call__(self, name, *arg):
+    def __call__(self, state, *arg):
         if len(arg) != 1:
             raise ValueError("ConstraintAlways expects exactly one argument.")
-        if name not in self.state:
-            self.state[name] = True
-        self.state[name] = arg[0] and self.state[name]
-        return self.state[name]
+        if "value" not in state:
+            state["value"] = True
+        state["value"] = arg[0] and state["value"]
+        return state["value"]
 
 
 class ConstraintNever(Constraint):
-    def __call__(self, name, *arg):
+    def __call__(self, state, *arg):
         if len(arg) != 1:
             raise ValueError("ConstraintNever expects exactly one argument.")
-        if name not in self.state:
-            self.state[name] = True
-        self.state[name] = not arg[0] and self.state[name]
-        return self.state[name]
+        if "value" not in state:
+            state["value"] = True
+        state["value"] = not arg[0] and state["value"]
+        return state["value"]
 
 
 class ConstraintAlwaysAfter(Constraint):
-    def __call__(self, name, *arg):
+    def __call__(self, state, *arg):
         if len(arg) != 2:
             raise ValueError("ConstraintAlwaysAfter expects exactly two arguments.")
-        if name not in self.state:
-            self.state[name] = (False, True)
-        if not self.state[name][0]:
-            self.state[name] = (arg[0], self.state[name][1])
+        if "value" not in state:
+            state["value"] = (False, True)
+        if not state["value"][0]:
+            state["value"] = (arg[0], state["value"][1])
         else:
-            self.state[name] = (self.state[name][0], arg[1] and self.state[name][1])
-        return self.state[name][0] and self.state[name][1]
+            state["value"] = (state["value"][0], arg[1] and state["value"][1])
+        return state["value"][0] and state["value"][1]
     
     def expected_arg_types(self):
         return [bool, bool]  # Expecting a tuple of (name, arg)
 
 class ConstraintOnce(Constraint):
-    def __call__(self, name, *arg):
-        if name not in self.state:
-            self.state[name] = False
-        self.state[name] = arg[0] or self.state[name]
-        return self.state[name]
+    def __call__(self, state, *arg):
+        if "value" not in state:
+            state["value"] = False
+        state["value"] = arg[0] or state["value"]
+        return state["value"]
 
 class Sequential(StatefulWrapper):
     """
     A wrapper for predicates that enforces sequential progression without persistence.
     Only requires that new True values appear in sequential order (starting from arg[0]).
     """
-    def init_by_name(self, name):
+    def init_state(self, state):
         """
-        Initialize the state for a given predicate name.
+        Initialize the state of a node.
         This method is called when the predicate is first used.
         """
-        if name not in self.state:
-            self.state[name] = {
+        if not state:
+            state.update({
                 "Sequential": True,
                 "LastState": [],
                 "NextExpectedIndex": 0
-            }
+            })
 
-    def __call__(self, name, *arg):
+    def __call__(self, state, *arg):
         """
         Check if new True values appear in sequential order.
 
         Args:
-            name (str): The name of the predicate.
+            state (dict): The state of the evaluated node.
             arg (tuple): tuple of bool objects representing the current state.
         """
         arg = arg[0]
 
-        self.init_by_name(name)
-        if self.state[name]["LastState"] == []:
-            self.state[name]["LastState"] = [False] * len(arg)
+        self.init_state(state)
+        if state["LastState"] == []:
+            state["LastState"] = [False] * len(arg)
 
-        if not self.state[name]["Sequential"]:
+        if not state["Sequential"]:
             return BoolResultWrapper(False, f"{arg} Failed")
         
         # RelaxedSequential means: once a position becomes True, it can become False again,
         # and new True values can only appear at the next expected position
-        for i in range(self.state[name]["NextExpectedIndex"], len(arg)):
+        for i in range(state["NextExpectedIndex"], len(arg)):
             # If a new True appears, it must be at the next expected sequential position
-            if not self.state[name]["LastState"][i] and arg[i]:
-                if i != self.state[name]["NextExpectedIndex"]:
-                    self.state[name]["Sequential"] = False
+            if not state["LastState"][i] and arg[i]:
+                if i != state["NextExpectedIndex"]:
+                    state["Sequential"] = False
                     return BoolResultWrapper(False, f"{arg} Failed")
                 if i < len(arg)-1:
-                    self.state[name]["NextExpectedIndex"] += 1
+                    state["NextExpectedIndex"] += 1
                 
         
         # Update the last state
-        self.state[name]["LastState"] = list(arg)
+        state["LastState"] = list(arg)
 
-        return BoolResultWrapper(arg[-1], f"Is Sequential; Current index: {self.state[name]['NextExpectedIndex']}")
+        return BoolResultWrapper(arg[-1], f"Is Sequential; Current index: {state['NextExpectedIndex']}")
 
     def expected_arg_types(self):
         return [tuple]
\ No newline at end of file
@@ -1,8 +1,19 @@
-from .libero_tabletop_manipulation import Libero_Tabletop_Manipulation
-from .libero_coffee_table_manipulation import Libero_Coffee_Table_Manipulation
-from .libero_floor_manipulation import Libero_Floor_Manipulation
-from .libero_study_tabletop_manipulation import Libero_Study_Tabletop_Manipulation
-from .libero_living_room_tabletop_manipulation import (
-    Libero_Living_Room_Tabletop_Manipulation,
-)
-from .libero_kitchen_tabletop_manipulation import Libero_Kitchen_Tabletop_Manipulation
+import importlib
+
+# the modules of the problems, each registering the problem class of the same
+# name in TASK_MAPPING. They are imported when their problem is requested.
+PROBLEM_MODULES = [
+    "libero_tabletop_manipulation",
+    "libero_coffee_table_manipulation",
+    "libero_floor_manipulation",
+    "libero_study_tabletop_manipulation",
+    "libero_living_room_tabletop_manipulation",
+    "libero_kitchen_tabletop_manipulation",
+]
+
+
+def __getattr__(name):
+    if name.lower() in PROBLEM_MODULES:
+        module = importlib.import_module(f"{__name__}.{name.lower()}")
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
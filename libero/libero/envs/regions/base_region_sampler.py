@@ -11,6 +11,89 @@ from robosuite.utils.transform_utils import quat_multiply
 import robosuite.utils.transform_utils as T
 
 
+# Placement candidates are drawn and checked in fixed-size batches, so the
+# numbers drawn from np.random only depend on the seed, not on timing.
+PLACEMENT_BATCH_SIZE = 64
+PLACEMENT_MAX_TRIES = 5000
+
+
+def _sample_valid_position(
+    sampler,
+    horizontal_radius,
+    bottom_offset,
+    offset,
+    placed_objects,
+    on_top=True,
+    range_margin=None,
+):
+    """
+    Rejection-samples the position of an object for the region sampler @sampler.
+    Candidates are drawn PLACEMENT_BATCH_SIZE at a time and checked against all
+    placed objects at once; the first valid candidate of a batch is used.
+    Args:
+        sampler: The region sampler, providing x_ranges, y_ranges and the
+            placement options.
+        horizontal_radius (float): Horizontal radius of the sampled object
+        bottom_offset (3-array): Bottom offset of the sampled object
+        offset (3-array): Offset added to the sampled (x, y, z_offset)
+        placed_objects (dict): Current placements, mapping names to (pos, quat, obj)
+        on_top (bool): Whether to subtract the bottom offset of the object from z
+        range_margin (None or float): Margin kept from the region boundaries if
+            ensure_object_boundary_in_range is set, defaults to @horizontal_radius
+    Returns:
+        None or 3-tuple: The sampled (x, y, z), or None if no valid position was
+            found within PLACEMENT_MAX_TRIES candidates. sampler.idx is set to
+            the region of the returned position.
+    """
+    if range_margin is None:
+        range_margin = horizontal_radius
+    object_z = sampler.z_offset + offset[2]
+    if on_top:
+        object_z -= bottom_offset[-1]
+
+    # the height test does not depend on the candidate, keep only the objects
+    # that can block the sampled one
+    other_xy = []
+    min_dist = []
+    if sampler.ensure_valid_placement:
+        for (x, y, z), _, other_obj in placed_objects.values():
+            if object_z - z <= other_obj.top_offset[-1] - bottom_offset[-1]:
+                other_xy.append((x, y))
+                min_dist.append(other_obj.horizontal_radius + horizontal_radius)
+    other_xy = np.array(other_xy, dtype=np.float64).reshape(-1, 2)
+    min_dist = np.array(min_dist, dtype=np.float64)
+
+    x_ranges = np.array(sampler.x_ranges, dtype=np.float64).reshape(-1, 2)
+    y_ranges = np.array(sampler.y_ranges, dtype=np.float64).reshape(-1, 2)
+    x_low, x_high = x_ranges[:, 0], x_ranges[:, 1]
+    y_low, y_high = y_ranges[:, 0], y_ranges[:, 1]
+    if sampler.ensure_object_boundary_in_range:
+        x_low, x_high = x_low + range_margin, x_high - range_margin
+        y_low, y_high = y_low + range_margin, y_high - range_margin
+
+    n_tries = 0
+    while n_tries < PLACEMENT_MAX_TRIES:
+        n = min(PLACEMENT_BATCH_SIZE, PLACEMENT_MAX_TRIES - n_tries)
+        n_tries += n
+        idx = np.random.randint(sampler.num_ranges, size=n)
+        object_x = np.random.uniform(high=x_high[idx], low=x_low[idx]) + offset[0]
+        object_y = np.random.uniform(high=y_high[idx], low=y_low[idx]) + offset[1]
+
+        # objects cannot overlap
+        if len(other_xy) > 0:
+            candidates = np.stack([object_x, object_y], axis=-1)
+            dist = np.linalg.norm(candidates[:, None] - other_xy[None], axis=-1)
+            valid = np.all(dist > min_dist, axis=-1)
+        else:
+            valid = np.ones(n, dtype=bool)
+
+        if valid.any():
+            i = int(np.argmax(valid))
+            sampler.idx = int(idx[i])
+            return object_x[i], object_y[i], object_z
+    return None
+
+
 class MultiRegionRandomSampler(ObjectPositionSampler):
     """
     Places all objects within the table uniformly random.
@@ -175,45 +258,27 @@ class MultiRegionRandomSampler(ObjectPositionSampler):
 
             horizontal_radius = obj.horizontal_radius
             bottom_offset = obj.bottom_offset
-            success = False
-            for i in range(5000):  # 5000 retries
-                self.idx = np.random.randint(self.num_ranges)
-                object_x = self._sample_x(horizontal_radius) + base_offset[0]
-                object_y = self._sample_y(horizontal_radius) + base_offset[1]
-                object_z = self.z_offset + base_offset[2]
-                if on_top:
-                    object_z -= bottom_offset[-1]
-
-                # objects cannot overlap
-                location_valid = True
-                if self.ensure_valid_placement:
-                    for (x, y, z), _, other_obj in placed_objects.values():
-                        if (
-                            np.linalg.norm((object_x - x, object_y - y))
-                            <= other_obj.horizontal_radius + horizontal_radius
-                        ) and (
-                            object_z - z <= other_obj.top_offset[-1] - bottom_offset[-1]
-                        ):
-                            location_valid = False
-                            break
-
-                if location_valid:
-                    # random rotation
-                    quat = self._sample_quat()
-
-                    # multiply this quat by the object's initial rotation if it has the attribute specified
-                    if hasattr(obj, "init_quat"):
-                        quat = quat_multiply(quat, obj.init_quat)
-
-                    # location is valid, put the object down
-                    pos = (object_x, object_y, object_z)
-                    placed_objects[obj.name] = (pos, quat, obj)
-                    success = True
-                    break
-
-            if not success:
+            pos = _sample_valid_position(
+                self,
+                horizontal_radius,
+                bottom_offset,
+                base_offset,
+                placed_objects,
+                on_top=on_top,
+            )
+            if pos is None:
                 raise RandomizationError("Cannot place all objects ):")
 
+            # random rotation
+            quat = self._sample_quat()
+
+            # multiply this quat by the object's initial rotation if it has the attribute specified
+            if hasattr(obj, "init_quat"):
+                quat = quat_multiply(quat, obj.init_quat)
+
+            # location is valid, put the object down
+            placed_objects[obj.name] = (pos, quat, obj)
+
         return placed_objects
 
 
@@ -412,47 +477,29 @@ class SiteRegionRandomSampler(ObjectPositionSampler):
 
             horizontal_radius = obj.horizontal_radius
             bottom_offset = obj.bottom_offset
-            success = False
             site_x, site_y, site_z = T.quat2mat(
                 T.convert_quat(ref_quat, to="xyzw")
             ) @ sim.data.get_site_xpos(site_name)
-            for i in range(5000):  # 5000 retries
-                self.idx = np.random.randint(self.num_ranges)
-                object_x = self._sample_x(horizontal_radius) + base_offset[0] + site_x
-                object_y = self._sample_y(horizontal_radius) + base_offset[1] + site_y
-                object_z = self.z_offset + base_offset[2] + site_z
-                if on_top:
-                    object_z -= bottom_offset[-1]
-
-                # objects cannot overlap
-                location_valid = True
-                if self.ensure_valid_placement:
-                    for (x, y, z), _, other_obj in placed_objects.values():
-                        if (
-                            np.linalg.norm((object_x - x, object_y - y))
-                            <= other_obj.horizontal_radius + horizontal_radius
-                        ) and (
-                            object_z - z <= other_obj.top_offset[-1] - bottom_offset[-1]
-                        ):
-                            location_valid = False
-                            break
-
-                if location_valid:
-                    # random rotation
-                    quat = self._sample_quat()
-                    # multiply this quat by the object's initial rotation if it has the attribute specified
-                    if hasattr(obj, "init_quat"):
-                        quat = quat_multiply(quat, obj.init_quat)
-
-                    # location is valid, put the object down
-                    pos = (object_x, object_y, object_z)
-                    placed_objects[obj.name] = (pos, quat, obj)
-                    success = True
-                    break
-
-            if not success:
+            pos = _sample_valid_position(
+                self,
+                horizontal_radius,
+                bottom_offset,
+                base_offset + np.array((site_x, site_y, site_z)),
+                placed_objects,
+                on_top=on_top,
+            )
+            if pos is None:
                 raise RandomizationError("Cannot place all objects ):")
 
+            # random rotation
+            quat = self._sample_quat()
+            # multiply this quat by the object's initial rotation if it has the attribute specified
+            if hasattr(obj, "init_quat"):
+                quat = quat_multiply(quat, obj.init_quat)
+
+            # location is valid, put the object down
+            placed_objects[obj.name] = (pos, quat, obj)
+
         return placed_objects
 
 
@@ -619,51 +666,31 @@ class InSiteRegionRandomSampler(SiteRegionRandomSampler):
 
             horizontal_radius = obj.horizontal_radius
             bottom_offset = obj.bottom_offset
-            success = False
             site_x, site_y, site_z = T.quat2mat(
                 T.convert_quat(ref_quat, to="xyzw")
             ) @ sim.data.get_site_xpos(site_name)
-            for i in range(5000):  # 5000 retries
-                self.idx = np.random.randint(self.num_ranges)
-                object_x = self._sample_x(0) + base_offset[0] + site_x
-                object_y = self._sample_y(0) + base_offset[1] + site_y
-                object_z = self.z_offset + base_offset[2] + site_z
-                if on_top:
-                    object_z -= bottom_offset[-1]
-
-                # objects cannot overlap
-                location_valid = True
-                if self.ensure_valid_placement:
-                    for (x, y, z), _, other_obj in placed_objects.values():
-                        if (
-                            np.linalg.norm((object_x - x, object_y - y))
-                            <= other_obj.horizontal_radius + horizontal_radius
-                        ) and (
-                            object_z - z <= other_obj.top_offset[-1] - bottom_offset[-1]
-                        ):
-                            location_valid = False
-                            break
-
-                if location_valid:
-                    # random rotation
-                    quat = self._sample_quat()
-
-                    # multiply this quat by the object's initial rotation if it has the attribute specified
-                    if hasattr(obj, "init_quat"):
-                        quat = quat_multiply(quat, obj.init_quat)
-
-                    # location is valid, put the object down
-                    pos = (object_x, object_y, object_z)
-                    placed_objects[obj.name] = (pos, quat, obj)
-                    success = True
-                    break
-
-            if not success:
-                import pdb
-
-                pdb.set_trace()
+            pos = _sample_valid_position(
+                self,
+                horizontal_radius,
+                bottom_offset,
+                base_offset + np.array((site_x, site_y, site_z)),
+                placed_objects,
+                on_top=on_top,
+                range_margin=0,
+            )
+            if pos is None:
                 raise RandomizationError("Cannot place all objects ):")
 
+            # random rotation
+            quat = self._sample_quat()
+
+            # multiply this quat by the object's initial rotation if it has the attribute specified
+            if hasattr(obj, "init_quat"):
+                quat = quat_multiply(quat, obj.init_quat)
+
+            # location is valid, put the object down
+            placed_objects[obj.name] = (pos, quat, obj)
+
         return placed_objects
 
 
@@ -10,6 +10,7 @@ from abc import ABC, abstractmethod
 from collections import OrderedDict
 from multiprocessing import Array, Pipe, connection
 from multiprocessing.context import Process
+from multiprocessing.shared_memory import SharedMemory
 from typing import Any, Callable, List, Optional, Tuple, Union
 
 
@@ -197,6 +198,51 @@ class ShArray:
         return np.frombuffer(obj, dtype=self.dtype).reshape(self.shape)  # type: ignore
 
 
+class ShmArray:
+    """Wrapper of multiprocessing SharedMemory that can be attached by name.
+
+    Unlike :class:`ShArray`, the block does not need to exist before the
+    worker process is started: pickling a ShmArray only sends its name, and
+    unpickling it in another process attaches to the same memory. The
+    process that created the block owns it and unlinks it on ``close``.
+    """
+
+    def __init__(
+        self, dtype: np.dtype, shape: Tuple[int], name: Optional[str] = None
+    ) -> None:
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self._attach(name)
+
+    def _attach(self, name: Optional[str]) -> None:
+        self._owner = name is None
+        nbytes = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.shm = SharedMemory(name=name, create=self._owner, size=nbytes)
+        self.arr = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    def __getstate__(self) -> Tuple[str, Tuple[int], str]:
+        return self.dtype.str, self.shape, self.shm.name
+
+    def __setstate__(self, state: Tuple[str, Tuple[int], str]) -> None:
+        dtype, shape, name = state
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self._attach(name)
+
+    def save(self, ndarray: np.ndarray) -> None:
+        np.copyto(self.arr, ndarray)
+
+    def get(self) -> np.ndarray:
+        return self.arr
+
+    def close(self) -> None:
+        # drop the view first, otherwise the mmap cannot be released
+        self.arr = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
 def _setup_buf(space: gym.Space) -> Union[dict, tuple, ShArray]:
     if isinstance(space, gym.spaces.Dict):
         assert isinstance(space.spaces, OrderedDict)
@@ -208,16 +254,42 @@ def _setup_buf(space: gym.Space) -> Union[dict, tuple, ShArray]:
         return ShArray(space.dtype, space.shape)  # type: ignore
 
 
+def _setup_buf_from_obs(
+    obs: Union[dict, tuple, np.ndarray]
+) -> Union[dict, tuple, ShmArray]:
+    """Build shared buffers with the same structure as an observation."""
+    if isinstance(obs, dict):
+        return OrderedDict((k, _setup_buf_from_obs(v)) for k, v in obs.items())
+    elif isinstance(obs, tuple):
+        return tuple([_setup_buf_from_obs(o) for o in obs])
+    else:
+        obs = np.asarray(obs)
+        return ShmArray(obs.dtype, obs.shape)
+
+
+def _close_buf(buffer: Optional[Union[dict, tuple, ShArray, ShmArray]]) -> None:
+    if isinstance(buffer, ShmArray):
+        buffer.close()
+    elif isinstance(buffer, tuple):
+        for b in buffer:
+            _close_buf(b)
+    elif isinstance(buffer, dict):
+        for b in buffer.values():
+            _close_buf(b)
+
+
 def _worker(
     parent: connection.Connection,
     p: connection.Connection,
     env_fn_wrapper: CloudpickleWrapper,
     obs_bufs: Optional[Union[dict, tuple, ShArray]] = None,
+    problem_key: Optional[str] = None,
 ) -> None:
     def _encode_obs(
-        obs: Union[dict, tuple, np.ndarray], buffer: Union[dict, tuple, ShArray]
+        obs: Union[dict, tuple, np.ndarray],
+        buffer: Union[dict, tuple, ShArray, ShmArray],
     ) -> None:
-        if isinstance(obs, np.ndarray) and isinstance(buffer, ShArray):
+        if isinstance(buffer, (ShArray, ShmArray)):
             buffer.save(obs)
         elif isinstance(obs, tuple) and isinstance(buffer, tuple):
             for o, b in zip(obs, buffer):
@@ -229,6 +301,8 @@ def _worker(
 
     parent.close()
     env = env_fn_wrapper.data()
+    # envs of recently loaded problems, the last one is the active env
+    env_cache = OrderedDict([(problem_key, env)])
     try:
         while True:
             try:
@@ -261,8 +335,13 @@ def _worker(
                 else:
                     p.send(obs)
             elif cmd == "close":
-                p.send(env.close())
+                ret = env.close()
+                for cached_env in env_cache.values():
+                    if cached_env is not env:
+                        cached_env.close()
+                p.send(ret)
                 p.close()
+                _close_buf(obs_bufs)
                 break
             elif cmd == "render":
                 p.send(env.render(**data) if hasattr(env, "render") else None)
@@ -284,7 +363,26 @@ def _worker(
                 p.send(env.get_sim_state())
             elif cmd == "set_init_state":
                 obs = env.set_init_state(data)
+                if obs_bufs is not None:
+                    _encode_obs(obs, obs_bufs)
+                    obs = None
                 p.send(obs)
+            elif cmd == "load_problem":
+                key, fn_wrapper, max_cached_envs = data
+                if key not in env_cache:
+                    env_cache[key] = fn_wrapper.data()
+                env_cache.move_to_end(key)
+                env = env_cache[key]
+                while len(env_cache) > max(max_cached_envs, 1):
+                    env_cache.popitem(last=False)[1].close()
+                # observation keys depend on the objects of the problem
+                _close_buf(obs_bufs)
+                obs_bufs = None
+                p.send(None)
+            elif cmd == "attach_buf":
+                # shared buffers allocated by the parent from the first
+                # observation, all following observations go through them
+                obs_bufs = data
             else:
                 p.close()
                 raise NotImplementedError
@@ -295,8 +393,11 @@ def _worker(
 class DummyEnvWorker(EnvWorker):
     """Dummy worker used in sequential vector environments."""
 
-    def __init__(self, env_fn: Callable[[], gym.Env]) -> None:
+    def __init__(
+        self, env_fn: Callable[[], gym.Env], problem_key: Optional[str] = None
+    ) -> None:
         self.env = env_fn()
+        self.env_cache = OrderedDict([(problem_key, self.env)])
         super().__init__(env_fn)
 
     def get_env_attr(self, key: str) -> Any:
@@ -335,7 +436,21 @@ class DummyEnvWorker(EnvWorker):
         return self.env.render(**kwargs)
 
     def close_env(self) -> None:
-        self.env.close()
+        for env in self.env_cache.values():
+            env.close()
+
+    def send_load_problem(
+        self, key: str, env_fn: Callable[[], gym.Env], max_cached_envs: int
+    ) -> None:
+        if key not in self.env_cache:
+            self.env_cache[key] = env_fn()
+        self.env_cache.move_to_end(key)
+        self.env = self.env_cache[key]
+        while len(self.env_cache) > max(max_cached_envs, 1):
+            self.env_cache.popitem(last=False)[1].close()
+
+    def recv_load_problem(self) -> None:
+        return None
 
     def check_success(self):
         return self.env.check_success()
@@ -351,25 +466,32 @@ class DummyEnvWorker(EnvWorker):
 
 
 class SubprocEnvWorker(EnvWorker):
-    """Subprocess worker used in SubprocVectorEnv and ShmemVectorEnv."""
+    """Subprocess worker used in SubprocVectorEnv and ShmemVectorEnv.
+
+    With ``share_memory=True`` the first observation returned by the env is
+    still pickled through the pipe; it is used to allocate shared buffers
+    that are then attached in the subprocess. Every later observation is
+    written into those buffers and only the scalars (reward, done, info) are
+    sent over the pipe. The returned observations are zero-copy views into
+    the buffers and are overwritten by the next call that returns
+    observations, so copy them if they need to outlive a step.
+    """
 
     def __init__(
-        self, env_fn: Callable[[], gym.Env], share_memory: bool = False
+        self,
+        env_fn: Callable[[], gym.Env],
+        share_memory: bool = False,
+        problem_key: Optional[str] = None,
     ) -> None:
         self.parent_remote, self.child_remote = Pipe()
         self.share_memory = share_memory
-        self.buffer: Optional[Union[dict, tuple, ShArray]] = None
-        if self.share_memory:
-            dummy = env_fn()
-            obs_space = dummy.observation_space
-            dummy.close()
-            del dummy
-            self.buffer = _setup_buf(obs_space)
+        self.buffer: Optional[Union[dict, tuple, ShmArray]] = None
         args = (
             self.parent_remote,
             self.child_remote,
             CloudpickleWrapper(env_fn),
-            self.buffer,
+            None,
+            problem_key,
         )
         self.process = Process(target=_worker, args=args, daemon=True)
         self.process.start()
@@ -385,9 +507,9 @@ class SubprocEnvWorker(EnvWorker):
 
     def _decode_obs(self) -> Union[dict, tuple, np.ndarray]:
         def decode_obs(
-            buffer: Optional[Union[dict, tuple, ShArray]]
+            buffer: Optional[Union[dict, tuple, ShArray, ShmArray]]
         ) -> Union[dict, tuple, np.ndarray]:
-            if isinstance(buffer, ShArray):
+            if isinstance(buffer, (ShArray, ShmArray)):
                 return buffer.get()
             elif isinstance(buffer, tuple):
                 return tuple([decode_obs(b) for b in buffer])
@@ -398,6 +520,18 @@ class SubprocEnvWorker(EnvWorker):
 
         return decode_obs(self.buffer)
 
+    def _recv_obs(
+        self, obs: Optional[Union[dict, tuple, np.ndarray]]
+    ) -> Union[dict, tuple, np.ndarray]:
+        if not self.share_memory:
+            return obs
+        if obs is None:
+            return self._decode_obs()
+        if self.buffer is None:
+            self.buffer = _setup_buf_from_obs(obs)
+            self.parent_remote.send(["attach_buf", self.buffer])
+        return obs
+
     @staticmethod
     def wait(  # type: ignore
         workers: List["SubprocEnvWorker"],
@@ -438,18 +572,10 @@ class SubprocEnvWorker(EnvWorker):
         if isinstance(result, tuple):
             if len(result) == 2:
                 obs, info = result
-                if self.share_memory:
-                    obs = self._decode_obs()
-                return obs, info
-            obs = result[0]
-            if self.share_memory:
-                obs = self._decode_obs()
-            return (obs, *result[1:])  # type: ignore
+                return self._recv_obs(obs), info
+            return (self._recv_obs(result[0]), *result[1:])  # type: ignore
         else:
-            obs = result
-            if self.share_memory:
-                obs = self._decode_obs()
-            return obs
+            return self._recv_obs(result)
 
     def reset(self, **kwargs: Any) -> Union[np.ndarray, Tuple[np.ndarray, dict]]:
         if "seed" in kwargs:
@@ -459,14 +585,9 @@ class SubprocEnvWorker(EnvWorker):
         result = self.parent_remote.recv()
         if isinstance(result, tuple):
             obs, info = result
-            if self.share_memory:
-                obs = self._decode_obs()
-            return obs, info
+            return self._recv_obs(obs), info
         else:
-            obs = result
-            if self.share_memory:
-                obs = self._decode_obs()
-            return obs
+            return self._recv_obs(result)
 
     def seed(self, seed: Optional[int] = None) -> Optional[List[int]]:
         super().seed(seed)
@@ -488,6 +609,22 @@ class SubprocEnvWorker(EnvWorker):
             pass
         # ensure the subproc is terminated
         self.process.terminate()
+        _close_buf(self.buffer)
+        self.buffer = None
+
+    def send_load_problem(
+        self, key: str, env_fn: Callable[[], gym.Env], max_cached_envs: int
+    ) -> None:
+        self.parent_remote.send(
+            ["load_problem", (key, CloudpickleWrapper(env_fn), max_cached_envs)]
+        )
+        # the subprocess drops its buffers as well, they are set up again
+        # from the first observation of the new problem
+        _close_buf(self.buffer)
+        self.buffer = None
+
+    def recv_load_problem(self) -> None:
+        return self.parent_remote.recv()
 
     def check_success(self):
         self.parent_remote.send(["check_success", None])
@@ -503,10 +640,7 @@ class SubprocEnvWorker(EnvWorker):
 
     def set_init_state(self, init_state):
         self.parent_remote.send(["set_init_state", init_state])
-        obs = self.parent_remote.recv()
-        if self.share_memory:
-            obs = self._decode_obs()
-        return obs
+        return self._recv_obs(self.parent_remote.recv())
 
 
 ################################################################################
@@ -861,6 +995,37 @@ class BaseVectorEnv(object):
             )
         return [w.render(**kwargs) for w in self.workers]
 
+    def load_problem(
+        self,
+        key: str,
+        env_fns: List[Callable[[], gym.Env]],
+        max_cached_envs: int = 1,
+        id: Optional[Union[int, List[int], np.ndarray]] = None,
+    ) -> None:
+        """Swap the envs of some workers in place, keeping the workers alive.
+
+        Each worker keeps the envs of its ``max_cached_envs`` most recently
+        loaded problems, keyed by ``key``. Loading a cached problem only
+        switches the active env; otherwise ``env_fns[i]()`` builds a new one
+        inside the worker and the least recently used env is closed. All
+        workers load in parallel.
+
+        :param str key: the identifier of the problem, e.g. the bddl file
+            together with the env arguments.
+        :param env_fns: a list of callable envs, one per env in ``id``.
+        :param int max_cached_envs: the number of envs each worker keeps.
+        :param id: Indice(s) of the worker(s). Default to None for all env_id.
+        """
+        self._assert_is_not_closed()
+        id = self._wrap_id(id)
+        if self.is_async:
+            self._assert_id(id)
+        assert len(env_fns) == len(id)
+        for fn, j in zip(env_fns, id):
+            self.workers[j].send_load_problem(key, fn, max_cached_envs)
+        for j in id:
+            self.workers[j].recv_load_problem()
+
     def close(self) -> None:
         """Close all of the environments.
 
@@ -881,8 +1046,16 @@ class DummyVectorEnv(BaseVectorEnv):
         Please refer to :class:`~tianshou.env.BaseVectorEnv` for other APIs' usage.
     """
 
-    def __init__(self, env_fns: List[Callable[[], gym.Env]], **kwargs: Any) -> None:
-        super().__init__(env_fns, DummyEnvWorker, **kwargs)
+    def __init__(
+        self,
+        env_fns: List[Callable[[], gym.Env]],
+        problem_key: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        def worker_fn(fn: Callable[[], gym.Env]) -> DummyEnvWorker:
+            return DummyEnvWorker(fn, problem_key=problem_key)
+
+        super().__init__(env_fns, worker_fn, **kwargs)
 
     def check_success(self):
         return [w.check_success() for w in self.workers]
@@ -893,8 +1066,8 @@ class DummyVectorEnv(BaseVectorEnv):
             for w, img in zip(self.workers, segmentation_images)
         ]
 
-    def get_sim_state(self):
-        return [w.get_sim_state() for w in self.workers]
+    def get_sim_state(self, id=None):
+        return [self.workers[i].get_sim_state() for i in self._wrap_id(id)]
 
     def set_init_state(
         self,
@@ -924,14 +1097,29 @@ class DummyVectorEnv(BaseVectorEnv):
 class SubprocVectorEnv(BaseVectorEnv):
     """Vectorized environment wrapper based on subprocess.
 
+    :param bool share_memory: transport observations through shared memory
+        instead of pickling them through the pipes. The observations returned
+        in this mode are views that are overwritten by the next step, see
+        :class:`SubprocEnvWorker`. Default to False.
+    :param str problem_key: the key of the envs built by ``env_fns``, used by
+        :meth:`load_problem` to switch back to them. Default to None.
+
     .. seealso::
 
         Please refer to :class:`~tianshou.env.BaseVectorEnv` for other APIs' usage.
     """
 
-    def __init__(self, env_fns: List[Callable[[], gym.Env]], **kwargs: Any) -> None:
+    def __init__(
+        self,
+        env_fns: List[Callable[[], gym.Env]],
+        share_memory: bool = False,
+        problem_key: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
         def worker_fn(fn: Callable[[], gym.Env]) -> SubprocEnvWorker:
-            return SubprocEnvWorker(fn, share_memory=False)
+            return SubprocEnvWorker(
+                fn, share_memory=share_memory, problem_key=problem_key
+            )
 
         super().__init__(env_fns, worker_fn, **kwargs)
 
@@ -944,8 +1132,8 @@ class SubprocVectorEnv(BaseVectorEnv):
             for w, img in zip(self.workers, segmentation_images)
         ]
 
-    def get_sim_state(self):
-        return [w.get_sim_state() for w in self.workers]
+    def get_sim_state(self, id=None):
+        return [self.workers[i].get_sim_state() for i in self._wrap_id(id)]
 
     def set_init_state(
         self,
@@ -0,0 +1,190 @@
+"""
+Utilities for building banks of initial simulation states.
+
+Evaluation resets each env to one of a fixed set of initial states stored in
+`<init_states>/<suite>/<task>.pruned_init`. The functions below sample such
+states for arbitrary bddl files: every state is placed by the env's own
+placement samplers, settled with a few zero-action steps, and rejected if the
+goal of the task already holds.
+"""
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import torch
+
+from libero.libero.envs.env_wrapper import ControlEnv
+
+
+MANIFEST_FILE = "manifest.json"
+
+
+def get_init_states_file(bddl_file, output_folder, suite=None):
+    """
+    The init state file of a bddl file, following the layout of the benchmark:
+    `<output_folder>/<suite>/<task>.pruned_init`. The suite defaults to the name
+    of the folder containing the bddl file.
+    """
+    if suite is None:
+        suite = os.path.basename(os.path.dirname(os.path.abspath(bddl_file)))
+    task = os.path.splitext(os.path.basename(bddl_file))[0]
+    return os.path.join(output_folder, suite, f"{task}.pruned_init")
+
+
+def sample_init_states(
+    bddl_file, num_states, seed=0, settle_steps=10, max_attempts=None
+):
+    """
+    Sample valid initial states of a task in the current process.
+
+    Args:
+        bddl_file (str): The bddl file of the task.
+        num_states (int): The number of states to return.
+        seed (int): Seed of the placement samplers.
+        settle_steps (int): Zero-action steps run after placing the objects.
+        max_attempts (None or int): Maximum number of sampled states, defaults
+            to 10 * num_states.
+    Returns:
+        states (list): The flattened sim states.
+        num_rejected (int): The number of states rejected because the goal was
+            already satisfied.
+    """
+    if max_attempts is None:
+        max_attempts = 10 * num_states
+    env = ControlEnv(
+        bddl_file_name=bddl_file,
+        use_camera_obs=False,
+        has_offscreen_renderer=False,
+    )
+    env.seed(seed)
+    dummy_action = np.zeros(env.env.action_dim)
+
+    states = []
+    num_rejected = 0
+    for _ in range(max_attempts):
+        if len(states) == num_states:
+            break
+        env.reset()
+        for _ in range(settle_steps):
+            env.step(dummy_action)
+        if env.check_success():
+            num_rejected += 1
+            continue
+        states.append(env.get_sim_state())
+    env.close()
+    return states, num_rejected
+
+
+def _sample_init_states_job(job):
+    bddl_file, num_states, seed, settle_steps = job
+    return bddl_file, sample_init_states(
+        bddl_file, num_states, seed=seed, settle_steps=settle_steps
+    )
+
+
+def get_chunk_seeds(seed, n_chunks):
+    """
+    Independent seeds of the chunks of a bank, spawned from its base seed, so
+    that banks with different base seeds do not share chunks.
+    """
+    return [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(n_chunks)
+    ]
+
+
+def load_manifest(output_folder):
+    manifest_path = os.path.join(output_folder, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def generate_init_states(
+    bddl_files,
+    output_folder,
+    num_states=50,
+    num_workers=8,
+    chunk_size=10,
+    seed=0,
+    settle_steps=10,
+    suite=None,
+    overwrite=False,
+):
+    """
+    Generate the init state files of several tasks with a process pool and
+    record them in `<output_folder>/manifest.json`.
+
+    The states of every task are sampled in chunks of @chunk_size, each chunk
+    with its own seed spawned from @seed (see get_chunk_seeds), so the result
+    does not depend on @num_workers.
+
+    Args:
+        bddl_files (list): The bddl files of the tasks.
+        output_folder (str): The root folder of the init state files.
+        num_states (int): The number of states per task.
+        num_workers (int): The number of worker processes.
+        chunk_size (int): The number of states sampled by one job.
+        seed (int): The base seed.
+        settle_steps (int): Zero-action steps run after placing the objects.
+        suite (None or str): The suite folder, defaults to the folder name of
+            each bddl file.
+        overwrite (bool): Whether to regenerate existing init state files.
+    Returns:
+        dict: The manifest entries of the generated files.
+    """
+    jobs = []
+    init_states_files = {}
+    for bddl_file in bddl_files:
+        init_states_file = get_init_states_file(bddl_file, output_folder, suite)
+        if os.path.exists(init_states_file) and not overwrite:
+            print(f"[info] skipping {init_states_file}, it already exists")
+            continue
+        init_states_files[bddl_file] = init_states_file
+        starts = range(0, num_states, chunk_size)
+        chunk_seeds = get_chunk_seeds(seed, len(starts))
+        for start, chunk_seed in zip(starts, chunk_seeds):
+            n = min(chunk_size, num_states - start)
+            jobs.append((bddl_file, n, chunk_seed, settle_steps))
+
+    states = {bddl_file: [] for bddl_file in init_states_files}
+    num_rejected = {bddl_file: 0 for bddl_file in init_states_files}
+    # robosuite and MuJoCo state should not be inherited by forked workers
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(num_workers) as pool:
+        # imap keeps the chunk order, so the banks are reproducible
+        for bddl_file, (chunk_states, chunk_rejected) in pool.imap(
+            _sample_init_states_job, jobs
+        ):
+            states[bddl_file].extend(chunk_states)
+            num_rejected[bddl_file] += chunk_rejected
+
+    entries = {}
+    for bddl_file, init_states_file in init_states_files.items():
+        if len(states[bddl_file]) < num_states:
+            print(
+                f"[warning] only {len(states[bddl_file])}/{num_states} valid "
+                f"init states for {bddl_file}"
+            )
+        if len(states[bddl_file]) == 0:
+            continue
+        os.makedirs(os.path.dirname(init_states_file), exist_ok=True)
+        torch.save(np.stack(states[bddl_file]), init_states_file)
+        entries[os.path.relpath(init_states_file, output_folder)] = {
+            "bddl_file": os.path.abspath(bddl_file),
+            "num_states": len(states[bddl_file]),
+            "num_rejected": num_rejected[bddl_file],
+            "seed": seed,
+            "chunk_size": chunk_size,
+            "settle_steps": settle_steps,
+        }
+        print(f"[info] saved {len(states[bddl_file])} init states to {init_states_file}")
+
+    manifest = load_manifest(output_folder)
+    manifest.update(entries)
+    os.makedirs(output_folder, exist_ok=True)
+    with open(os.path.join(output_folder, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    return entries
@@ -11,6 +11,9 @@ MU_DICT = {}
 
 SCENE_DICT = {}
 
+# the scene instances of this process, see get_scene
+SCENE_INSTANCES = {}
+
 
 def register_mu(scene_type="general"):
     def _func(target_class):
@@ -38,6 +41,13 @@ def get_scene_class(scene_name):
     return MU_DICT[scene_name.lower()]
 
 
+def get_scene(scene_name):
+    """An instance of a registered scene, created once per process."""
+    if scene_name.lower() not in SCENE_INSTANCES:
+        SCENE_INSTANCES[scene_name.lower()] = get_scene_class(scene_name)()
+    return SCENE_INSTANCES[scene_name.lower()]
+
+
 class InitialSceneTemplates:
     def __init__(
         self, workspace_name="main_table", fixture_num_info={}, object_num_info={}
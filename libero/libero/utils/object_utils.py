@@ -1,8 +1,21 @@
 # This is a util file for various functions that retrieve object information
+import inspect
+import json
+import os
 from xml.etree import ElementTree
 
+from libero.libero import libero_config_path
 from libero.libero.envs.objects import OBJECTS_DICT, get_object_fn
 
+# The site names of the registered objects, persisted across runs to find their
+# affordance regions. An entry is reused as long as the module defining the
+# object and its xml file are unchanged (same mtime and size); a changed xml
+# file is parsed again without building the object.
+AFFORDANCE_INDEX_FILE = os.path.join(libero_config_path, "affordance_regions.json")
+AFFORDANCE_INDEX = None
+# the objects whose entry was checked in this process
+CHECKED_OBJECTS = set()
+
 EXCEPTION_DICT = {"flat_stove": "flat_stove_burner"}
 
 
@@ -16,6 +29,121 @@ def update_exception_dict(object_name, site_name):
     EXCEPTION_DICT[object_name] = site_name
 
 
+def get_file_stamp(file_name):
+    """The mtime and size of a file, None if it does not exist."""
+    if not os.path.exists(file_name):
+        return None
+    stat = os.stat(file_name)
+    return [stat.st_mtime, stat.st_size]
+
+
+def get_source_file(object_class):
+    """The file defining a class, None if there is none, e.g. for a class
+    defined in a notebook or registered from __main__."""
+    try:
+        return inspect.getfile(object_class)
+    except (TypeError, OSError):
+        return None
+
+
+def parse_site_names(xml_file, naming_prefix):
+    """
+    The site names of an object, read from its xml file the way its
+    MujocoXMLObject would expose them in obj.root: sites outside the default
+    classes, prefixed with the naming prefix of the object.
+
+    Args:
+        xml_file (str): The xml file of the object.
+        naming_prefix (str): The prefix of the names in the object.
+
+    Returns:
+        list: The site names.
+    """
+    root = ElementTree.parse(xml_file).getroot()
+    for default in root.findall("default"):
+        root.remove(default)
+    site_names = []
+    for site in root.findall(".//site"):
+        site_name = site.get("name")
+        if not site_name.startswith(naming_prefix):
+            site_name = naming_prefix + site_name
+        site_names.append(site_name)
+    return site_names
+
+
+def get_object_affordance(object_name, site_names):
+    object_affordance = []
+    for site_name in site_names:
+        if "site" not in site_name and (
+            object_name not in EXCEPTION_DICT
+            or object_name in EXCEPTION_DICT
+            and site_name not in EXCEPTION_DICT[object_name]
+        ):
+            # object name is already added as prefix when the object is initialized. remove them for consistency in bddl files
+            object_affordance.append(site_name.replace(f"{object_name}_", ""))
+    return object_affordance
+
+
+def index_affordance_regions(object_name, entry=None):
+    """
+    The affordance index entry of an object, updated if its files changed.
+    The object is only built if the module defining it changed, to find its xml
+    file and name.
+    """
+    object_class = get_object_fn(object_name)
+    module_file = get_source_file(object_class)
+    module_stamp = [module_file, get_file_stamp(module_file)]
+    if entry is None or entry["module"] != module_stamp:
+        entry = {
+            "module": module_stamp,
+            "xml": None,
+            "naming_prefix": None,
+            "site_names": None,
+        }
+        try:
+            obj = object_class()
+            entry["xml"] = [obj.file, None]
+            entry["naming_prefix"] = obj.naming_prefix
+        except:
+            # e.g. missing assets, try again in the next process
+            entry["module"] = None
+            return entry
+    elif entry["xml"] is None or entry["xml"][1] == get_file_stamp(entry["xml"][0]):
+        return entry
+
+    entry = dict(entry, xml=[entry["xml"][0], get_file_stamp(entry["xml"][0])])
+    try:
+        entry["site_names"] = parse_site_names(entry["xml"][0], entry["naming_prefix"])
+    except:
+        entry["site_names"] = None
+    return entry
+
+
+def load_affordance_index():
+    """
+    The affordance index of this process, loaded from AFFORDANCE_INDEX_FILE
+    once.
+    """
+    global AFFORDANCE_INDEX
+    if AFFORDANCE_INDEX is None:
+        AFFORDANCE_INDEX = {}
+        if os.path.exists(AFFORDANCE_INDEX_FILE):
+            try:
+                with open(AFFORDANCE_INDEX_FILE, "r") as f:
+                    AFFORDANCE_INDEX = json.load(f)
+            except ValueError:
+                print(f"[warning] ignoring corrupted {AFFORDANCE_INDEX_FILE}")
+    return AFFORDANCE_INDEX
+
+
+def save_affordance_index():
+    os.makedirs(os.path.dirname(AFFORDANCE_INDEX_FILE), exist_ok=True)
+    tmp_file = f"{AFFORDANCE_INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(AFFORDANCE_INDEX, f, indent=4, sort_keys=True)
+    os.replace(tmp_file, AFFORDANCE_INDEX_FILE)
+
+
 def get_affordance_regions(objects, verbose=False):
     """_summary_
 
@@ -26,26 +154,37 @@ def get_affordance_regions(objects, verbose=False):
     Returns:
         dict: a dictionary of object names and their affordance regions.
     """
+    index = load_affordance_index()
+    changed = False
     affordances = {}
     for object_name in objects.keys():
         try:
-            obj = get_object_fn(object_name)()
-            # print(obj.root.findall(".//site"))
-            object_affordance = []
-            for site in obj.root.findall(".//site"):
-                site_name = site.get("name")
-                if "site" not in site_name and (
-                    object_name not in EXCEPTION_DICT
-                    or object_name in EXCEPTION_DICT
-                    and site_name not in EXCEPTION_DICT[object_name]
-                ):
-                    # print(site_name)
-                    # object name is already added as prefix when the object is initialized. remove them for consistency in bddl files
-                    object_affordance.append(site_name.replace(f"{object_name}_", ""))
-            if len(object_affordance) > 0:
-                affordances[object_name] = object_affordance
+            object_class = get_object_fn(object_name)
+            if get_source_file(object_class) is None:
+                # no files to check an index entry against, build the object
+                obj = object_class()
+                site_names = [site.get("name") for site in obj.root.findall(".//site")]
+            else:
+                if object_name not in CHECKED_OBJECTS:
+                    entry = index_affordance_regions(
+                        object_name, index.get(object_name)
+                    )
+                    changed = changed or entry != index.get(object_name)
+                    index[object_name] = entry
+                    CHECKED_OBJECTS.add(object_name)
+                site_names = index[object_name]["site_names"]
         except:
             if verbose:
                 print(f"Skipping {object_name}")
+            continue
+        if site_names is None:
+            if verbose:
+                print(f"Skipping {object_name}")
+            continue
+        object_affordance = get_object_affordance(object_name, site_names)
+        if len(object_affordance) > 0:
+            affordances[object_name] = object_affordance
+    if changed:
+        save_affordance_index()
 
     return affordances
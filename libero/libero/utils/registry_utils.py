@@ -0,0 +1,135 @@
+"""
+Registries whose entries are only imported when they are looked up.
+
+The problem classes, objects, algorithms and policies register themselves in a
+dict when their module is imported. A LazyRegistry knows which module
+registers each key, so importing a package does not have to import every
+module: a module is imported the first time one of its keys is requested, and
+iterating over the registry imports all of them.
+"""
+import ast
+import importlib
+import importlib.util
+import os
+import re
+
+
+class LazyRegistry(dict):
+    """
+    A dict of registered classes that imports the module of a key when the key
+    is requested.
+
+    Args:
+        index (dict or callable): The module of every key, or a function
+            returning it, called once at the first lookup of a missing key.
+    """
+
+    def __init__(self, index=None):
+        super().__init__()
+        self._index = index
+        self._lazy_modules = None
+
+    @property
+    def lazy_modules(self):
+        if self._lazy_modules is None:
+            index = self._index() if callable(self._index) else self._index
+            self._lazy_modules = {
+                key: module
+                for key, module in (index or {}).items()
+                if not dict.__contains__(self, key)
+            }
+        return self._lazy_modules
+
+    def is_registered(self, key):
+        """Whether a key is already registered, without importing anything."""
+        return dict.__contains__(self, key)
+
+    def load(self, key):
+        module = self.lazy_modules.pop(key, None)
+        if module is not None:
+            importlib.import_module(module)
+
+    def load_all(self):
+        for module in sorted(set(self.lazy_modules.values())):
+            importlib.import_module(module)
+        self.lazy_modules.clear()
+
+    def __setitem__(self, key, value):
+        if self._lazy_modules is not None:
+            self._lazy_modules.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key):
+            self.load(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.lazy_modules
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __iter__(self):
+        self.load_all()
+        return super().__iter__()
+
+    def __len__(self):
+        self.load_all()
+        return super().__len__()
+
+    def __repr__(self):
+        self.load_all()
+        return super().__repr__()
+
+    def keys(self):
+        self.load_all()
+        return super().keys()
+
+    def values(self):
+        self.load_all()
+        return super().values()
+
+    def items(self):
+        self.load_all()
+        return super().items()
+
+    def copy(self):
+        self.load_all()
+        return dict(super().items())
+
+
+def index_registered_classes(package, modules, decorators, get_key):
+    """
+    Find the classes registered by decorators in the modules of a package by
+    parsing their source, without importing them.
+
+    Args:
+        package (str): The package of the modules, e.g. "libero.libero.envs.objects".
+        modules (list): The module names in the package.
+        decorators (list): The names of the registering decorators.
+        get_key (callable): The registry key of a class name.
+    Returns:
+        dict: The module of every key.
+    """
+    folder = os.path.dirname(importlib.util.find_spec(package).origin)
+    index = {}
+    for module in modules:
+        with open(os.path.join(folder, f"{module}.py"), "r") as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            names = {
+                decorator.id
+                for decorator in node.decorator_list
+                if isinstance(decorator, ast.Name)
+            }
+            if names & set(decorators):
+                index[get_key(node.name)] = f"{package}.{module}"
+    return index
+
+
+def snake_case_key(class_name):
+    """The registry key of an object class, e.g. AkitaBlackBowl -> akita_black_bowl."""
+    return "_".join(re.sub(r"([A-Z0-9])", r" \1", class_name).split()).lower()
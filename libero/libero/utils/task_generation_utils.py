@@ -1,7 +1,7 @@
 import os
 from collections import namedtuple
 
-from libero.libero.utils.mu_utils import get_scene_class
+from libero.libero.utils.mu_utils import get_scene
 from libero.libero.utils.bddl_generation_utils import *
 
 TASK_INFO = {}
@@ -16,7 +16,7 @@ def register_task_info(language, scene_name, objects_of_interest=[], goal_states
     if scene_name not in TASK_INFO:
         TASK_INFO[scene_name] = []
 
-    scene = get_scene_class(scene_name)()
+    scene = get_scene(scene_name)
     possible_objects_of_interest = scene.possible_objects_of_interest
     for object_name in objects_of_interest:
         if object_name not in possible_objects_of_interest:
@@ -64,7 +64,7 @@ def generate_bddl_from_task_info(folder="/tmp/pddl"):
             language = task_info_tuple.language
             objects_of_interest = task_info_tuple.objects_of_interest
             goal_states = task_info_tuple.goal_states
-            scene = get_scene_class(scene_name)()
+            scene = get_scene(scene_name)
 
             try:
                 result = get_suite_generator_func(scene.workspace_name)(
@@ -1,7 +1,15 @@
-from libero.lifelong.algos.base import Sequential, get_algo_class, get_algo_list
-from libero.lifelong.algos.multitask import Multitask
-from libero.lifelong.algos.er import ER
-from libero.lifelong.algos.agem import AGEM
-from libero.lifelong.algos.ewc import EWC
-from libero.lifelong.algos.packnet import PackNet
-from libero.lifelong.algos.single_task import SingleTask
+import importlib
+
+from libero.lifelong.algos.base import (
+    REGISTERED_ALGOS,
+    Sequential,
+    get_algo_class,
+    get_algo_list,
+)
+
+
+def __getattr__(name):
+    # the algorithms are imported on demand, see REGISTERED_ALGOS
+    if name.lower() in REGISTERED_ALGOS:
+        return get_algo_class(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
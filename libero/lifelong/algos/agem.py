@@ -9,62 +9,27 @@ from libero.lifelong.utils import *
 
 
 def project(gxy: torch.Tensor, ger: torch.Tensor) -> torch.Tensor:
-    corr = torch.dot(gxy, ger) / torch.dot(ger, ger)
-    return gxy - corr * ger
-
-
-def store_grad(params, grads, grad_dims):
     """
-    This stores parameter gradients of past tasks.
-    pp: parameters
-    grads: gradients
-    grad_dims: list with number of parameters per layers
+    Project gxy in place onto the half-space where it does not increase the
+    loss of the memory, i.e. remove its component along ger if their dot
+    product is negative. Does not synchronize with the device.
     """
-    # store the gradients
-    grads.fill_(0.0)
-    count = 0
-    for param in params():
-        if param.grad is not None:
-            begin = 0 if count == 0 else sum(grad_dims[:count])
-            end = np.sum(grad_dims[: count + 1])
-            grads[begin:end].copy_(param.grad.data.view(-1))
-        count += 1
+    corr = torch.dot(gxy, ger).clamp(max=0.0) / torch.dot(ger, ger).clamp(min=1e-12)
+    return gxy.sub_(corr * ger)
 
 
-def store_grad(params, grads, grad_dims):
+def point_grads(params, flat_grad):
     """
-    This stores parameter gradients of past tasks.
-    pp: parameters
-    grads: gradients
-    grad_dims: list with number of parameters per layers
+    Point the gradients of params to consecutive views of flat_grad, so that
+    backward accumulates into flat_grad directly.
+    params: parameters
+    flat_grad: flat tensor with as many elements as params
     """
-    # store the gradients
-    grads.fill_(0.0)
-    count = 0
-    for param in params():
-        if param.grad is not None:
-            begin = 0 if count == 0 else sum(grad_dims[:count])
-            end = np.sum(grad_dims[: count + 1])
-            grads[begin:end].copy_(param.grad.data.view(-1))
-        count += 1
-
-
-def overwrite_grad(params, newgrad, grad_dims):
-    """
-    This is used to overwrite the gradients with a new gradient
-    vector, whenever violations occur.
-    pp: parameters
-    newgrad: corrected gradient
-    grad_dims: list storing number of parameters at each layer
-    """
-    count = 0
-    for param in params():
-        if param.grad is not None:
-            begin = 0 if count == 0 else sum(grad_dims[:count])
-            end = sum(grad_dims[: count + 1])
-            this_grad = newgrad[begin:end].contiguous().view(param.grad.data.size())
-            param.grad.data.copy_(this_grad)
-        count += 1
+    offset = 0
+    for param in params:
+        numel = param.numel()
+        param.grad = flat_grad[offset : offset + numel].view_as(param)
+        offset += numel
 
 
 class AGEM(ER):
@@ -75,35 +40,41 @@ class AGEM(ER):
 
     def __init__(self, n_tasks, cfg, **policy_kwargs):
         super().__init__(n_tasks=n_tasks, cfg=cfg, **policy_kwargs)
-
-        self.grad_dims = []
-        for pp in self.policy.parameters():
-            self.grad_dims.append(pp.data.numel())
-        self.grad_xy = torch.Tensor(np.sum(self.grad_dims)).to(self.cfg.device)
-        self.grad_er = torch.Tensor(np.sum(self.grad_dims)).to(self.cfg.device)
+        # the trainable parameters and two flat buffers their gradients point
+        # to: one for the current batch and one for the memory. created at the
+        # first step, once the policy is on its device
+        self.grad_params = None
+        self.grad_xy = None
+        self.grad_er = None
+
+    def init_grad_buffers(self):
+        self.grad_params = [p for p in self.policy.parameters() if p.requires_grad]
+        numel = sum(p.numel() for p in self.grad_params)
+        device = self.grad_params[0].device
+        self.grad_xy = torch.zeros(numel, device=device)
+        self.grad_er = torch.zeros(numel, device=device)
 
     def observe(self, data):
         data = self.map_tensor_to_device(data)
         self.optimizer.zero_grad()
+        if self.grad_params is None:
+            self.init_grad_buffers()
+        point_grads(self.grad_params, self.grad_xy)
+        self.grad_xy.zero_()
         loss = self.policy.compute_loss(data)
         (loss * self.loss_scale).backward()
 
-        if self.buffer is not None:
-            store_grad(self.policy.parameters, self.grad_xy, self.grad_dims)
-            buf_data = next(self.buffer)
-            self.policy.zero_grad()
+        if len(self.memory) > 0:
+            point_grads(self.grad_params, self.grad_er)
+            self.grad_er.zero_()
+            buf_data = self.memory.sample(self.cfg.train.batch_size)
 
             buf_data = self.map_tensor_to_device(buf_data)
             buf_loss = self.policy.compute_loss(buf_data)
             buf_loss.backward()
-            store_grad(self.policy.parameters, self.grad_er, self.grad_dims)
 
-            dot_prod = torch.dot(self.grad_xy, self.grad_er)
-            if dot_prod.item() < 0:
-                g_tilde = project(gxy=self.grad_xy, ger=self.grad_er)
-                overwrite_grad(self.policy.parameters, g_tilde, self.grad_dims)
-            else:
-                overwrite_grad(self.policy.parameters, self.grad_xy, self.grad_dims)
+            project(gxy=self.grad_xy, ger=self.grad_er)
+            point_grads(self.grad_params, self.grad_xy)
 
         if self.cfg.train.grad_clip is not None:
             grad_norm = nn.utils.clip_grad_norm_(
@@ -1,4 +1,5 @@
 import os
+import shutil
 import time
 
 import numpy as np
@@ -8,17 +9,28 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.data import DataLoader, RandomSampler
 
+from libero.libero.utils.registry_utils import LazyRegistry
 from libero.lifelong.metric import *
 from libero.lifelong.models import *
 from libero.lifelong.utils import *
 
-REGISTERED_ALGOS = {}
+# the algorithms of libero.lifelong.algos, imported when they are requested
+REGISTERED_ALGOS = LazyRegistry(
+    {
+        "multitask": "libero.lifelong.algos.multitask",
+        "er": "libero.lifelong.algos.er",
+        "agem": "libero.lifelong.algos.agem",
+        "ewc": "libero.lifelong.algos.ewc",
+        "packnet": "libero.lifelong.algos.packnet",
+        "singletask": "libero.lifelong.algos.single_task",
+    }
+)
 
 
 def register_algo(policy_class):
     """Register a policy class with the registry."""
     policy_name = policy_class.__name__.lower()
-    if policy_name in REGISTERED_ALGOS:
+    if REGISTERED_ALGOS.is_registered(policy_name):
         raise ValueError("Cannot register duplicate policy ({})".format(policy_name))
 
     REGISTERED_ALGOS[policy_name] = policy_class
@@ -72,6 +84,8 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
 
         self.policy = get_policy_class(cfg.policy.policy_type)(cfg, cfg.shape_meta)
         self.current_task = -1
+        # if set, an EvalService evaluating the checkpoints in the background
+        self.eval_service = None
 
     def end_task(self, dataset, task_id, benchmark, env=None):
         """
@@ -125,6 +139,30 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
             loss = self.policy.compute_loss(data)
         return loss.item()
 
+    def select_best_checkpoint(self, checkpoints, model_checkpoint_name, remove=True):
+        """
+        Wait for the background evaluation of the checkpoints saved while
+        learning a task, and copy the first one with the best success rate to
+        model_checkpoint_name. With remove, the evaluated checkpoints are
+        deleted afterwards.
+        """
+        successes = []
+        for checkpoint in checkpoints:
+            success_rate = float(np.mean(self.eval_service.wait(checkpoint)))
+            successes.append(success_rate)
+            ci = confidence_interval(success_rate, self.cfg.eval.n_eval)
+            print(
+                f"[info] {os.path.basename(checkpoint)} | succ: {success_rate:4.2f} ± {ci:4.2f}",
+                flush=True,
+            )
+        idx_at_best_succ = int(np.argmax(successes))
+        shutil.copyfile(checkpoints[idx_at_best_succ], model_checkpoint_name)
+        if remove:
+            for checkpoint in checkpoints:
+                os.remove(checkpoint)
+        print(f"[info] best succ: {successes[idx_at_best_succ]}")
+        return successes, idx_at_best_succ
+
     def learn_one_task(self, dataset, task_id, benchmark, result_summary):
 
         self.start_task(task_id)
@@ -154,6 +192,7 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
         idx_at_best_succ = 0
         successes = []
         losses = []
+        checkpoints = []
 
         task = benchmark.get_task(task_id)
         task_emb = benchmark.get_task_emb(task_id)
@@ -182,7 +221,23 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
                 f"[info] Epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
             )
 
-            if epoch % self.cfg.eval.eval_every == 0:  # evaluate BC loss
+            if epoch % self.cfg.eval.eval_every == 0 and self.eval_service is not None:
+                # only save the checkpoint, the EvalService evaluates it while
+                # the training goes on and the best one is picked at the end
+                losses.append(training_loss)
+                checkpoints.append(
+                    os.path.join(self.experiment_dir, f"task{task_id}_model_ep{epoch}.pth")
+                )
+                # PackNet evaluates the policy with its masks applied
+                torch_save_model(
+                    self.policy,
+                    checkpoints[-1],
+                    cfg=self.cfg,
+                    previous_masks=getattr(self, "previous_masks", None),
+                )
+                cumulated_counter += 1.0
+
+            elif epoch % self.cfg.eval.eval_every == 0:  # evaluate BC loss
                 # every eval_every epoch, we evaluate the agent on the current task,
                 # then we pick the best performant agent on the current task as
                 # if it stops learning after that specific epoch. So the stopping
@@ -197,6 +252,16 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
                 sim_states = (
                     result_summary[task_str] if self.cfg.eval.save_sim_states else None
                 )
+                # stop the evaluation once the checkpoint cannot beat the best
+                # one so far. A checkpoint that beats it runs all n_eval
+                # episodes, so the best success rate is never a partial one
+                stopper = None
+                if self.cfg.eval.get("early_stop", False) and prev_success_rate >= 0:
+                    stopper = SuccessRateStopper(
+                        prev_success_rate,
+                        self.cfg.eval.n_eval,
+                        alpha=self.cfg.eval.get("early_stop_alpha", 0.05),
+                    )
                 success_rate = evaluate_one_task_success(
                     cfg=self.cfg,
                     algo=self,
@@ -205,6 +270,7 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
                     task_id=task_id,
                     sim_states=sim_states,
                     task_str="",
+                    stopper=stopper,
                 )
                 successes.append(success_rate)
 
@@ -228,6 +294,11 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
             if self.scheduler is not None and epoch > 0:
                 self.scheduler.step()
 
+        if self.eval_service is not None:
+            successes, idx_at_best_succ = self.select_best_checkpoint(
+                checkpoints, model_checkpoint_name
+            )
+
         # load the best performance agent on the current task
         self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
 
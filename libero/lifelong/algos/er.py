@@ -1,35 +1,197 @@
 import collections
 
 import numpy as np
+import robomimic.utils.obs_utils as ObsUtils
 import robomimic.utils.tensor_utils as TensorUtils
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import ConcatDataset, RandomSampler
 
 from libero.lifelong.algos.base import Sequential
-from libero.lifelong.datasets import TruncatedSequenceDataset
+from libero.lifelong.datasets import get_demo_ranges
 from libero.lifelong.utils import *
 
 
-def cycle(dl):
-    while True:
-        for data in dl:
-            yield data
-
+class ReplayMemory:
+    """
+    The episodic memory of ER and AGEM. For every learned task, whole demos
+    are drawn uniformly at random until n_memories sequences (one per
+    timestep) are stored. Their frames are kept once in preallocated tensors
+    (images as uint8, pinned if pin_memory), and the seq_len windows, padded
+    like the datasets do, are gathered when sampling.
+
+    Args:
+        n_memories (int): The number of sequences stored per task.
+        pin_memory (bool): Whether to keep the memory and the sampled batches
+            in pinned memory.
+    """
 
-def merge_datas(x, y):
-    if isinstance(x, (dict, collections.OrderedDict)):
-        if isinstance(x, dict):
-            new_x = dict()
+    def __init__(self, n_memories, pin_memory=False):
+        self.n_memories = n_memories
+        self.pin_memory = pin_memory
+        self.actions = None
+        self.obs = {}
+        self.task_embs = []
+        # the stored demos, and the demo and timestep of every stored sequence
+        self.demo_offsets = torch.zeros(0, dtype=torch.long)
+        self.demo_lengths = torch.zeros(0, dtype=torch.long)
+        self.demo_tasks = torch.zeros(0, dtype=torch.long)
+        self.seq_demos = torch.zeros(0, dtype=torch.long)
+        self.seq_steps = torch.zeros(0, dtype=torch.long)
+        self.batch = None
+
+    def __len__(self):
+        return len(self.seq_demos)
+
+    def _pin(self, x):
+        return x.pin_memory() if self.pin_memory else x
+
+    def select_demos(self, lengths):
+        chosen = []
+        n = 0
+        for demo in np.random.permutation(len(lengths)):
+            if n > 0 and n + lengths[demo] > self.n_memories:
+                continue
+            chosen.append(demo)
+            n += lengths[demo]
+            if n >= self.n_memories:
+                break
+        return sorted(chosen)
+
+    def add_task(self, dataset):
+        """
+        Store demos of a task.
+
+        Args:
+            dataset (SequenceVLDataset): The dataset of the task.
+        """
+        sequence_dataset = dataset.sequence_dataset
+        n_frame_stack = sequence_dataset.n_frame_stack
+        seq_length = sequence_dataset.seq_length
+        # the obs of a sequence start n_frame_stack - 1 frames before its actions
+        self.obs_steps = torch.arange(-(n_frame_stack - 1), seq_length)
+        self.action_steps = torch.arange(seq_length)
+
+        starts, lengths = get_demo_ranges(sequence_dataset)
+        demos = self.select_demos(lengths)
+
+        # read every frame once, from the sequences starting every seq_length
+        actions = []
+        obs = collections.defaultdict(list)
+        for demo in demos:
+            for t in range(0, lengths[demo], seq_length):
+                item = sequence_dataset[int(starts[demo] + t)]
+                n = min(seq_length, lengths[demo] - t)
+                actions.append(item["actions"][:n])
+                for k, x in item["obs"].items():
+                    obs[k].append(x[n_frame_stack - 1 : n_frame_stack - 1 + n])
+
+        offset = 0 if self.actions is None else len(self.actions)
+        actions = torch.from_numpy(np.concatenate(actions))
+        task_obs = {}
+        for k, x in obs.items():
+            x = torch.from_numpy(np.concatenate(x))
+            if ObsUtils.OBS_KEYS_TO_MODALITIES.get(k) == "rgb":
+                # the processed images are uint8 frames divided by 255
+                x = x.mul(255.0).round_().to(torch.uint8)
+            task_obs[k] = x
+
+        # grow the memory once per task
+        if self.actions is None:
+            self.actions = self._pin(actions)
+            self.obs = {k: self._pin(x) for k, x in task_obs.items()}
         else:
-            new_x = collections.OrderedDict()
-
-        for k in x.keys():
-            new_x[k] = merge_datas(x[k], y[k])
-        return new_x
-    elif isinstance(x, torch.FloatTensor) or isinstance(x, torch.LongTensor):
-        return torch.cat([x, y], 0)
+            self.actions = self._pin(torch.cat([self.actions, actions]))
+            self.obs = {
+                k: self._pin(torch.cat([self.obs[k], task_obs[k]])) for k in self.obs
+            }
+
+        task = len(self.task_embs)
+        self.task_embs.append(dataset.task_emb.float())
+        self.task_emb_table = torch.stack(self.task_embs)
+
+        demo_lengths = torch.tensor(lengths[demos], dtype=torch.long)
+        demo_offsets = offset + torch.cumsum(demo_lengths, 0) - demo_lengths
+        demo_ids = len(self.demo_lengths) + torch.arange(len(demos))
+        self.seq_demos = torch.cat(
+            [self.seq_demos, torch.repeat_interleave(demo_ids, demo_lengths)]
+        )
+        self.seq_steps = torch.cat(
+            [self.seq_steps]
+            + [torch.arange(length) for length in demo_lengths.tolist()]
+        )
+        self.demo_offsets = torch.cat([self.demo_offsets, demo_offsets])
+        self.demo_lengths = torch.cat([self.demo_lengths, demo_lengths])
+        self.demo_tasks = torch.cat(
+            [self.demo_tasks, torch.full((len(demos),), task, dtype=torch.long)]
+        )
+        self.batch = None
+
+    def _allocate(self, n_data, batch_size):
+        n = n_data + batch_size
+        T = len(self.action_steps)
+        T_obs = len(self.obs_steps)
+        self.batch = {
+            "actions": self._pin(torch.empty((n, T) + self.actions.shape[1:])),
+            "obs": {
+                k: self._pin(torch.empty((n, T_obs) + x.shape[1:]))
+                for k, x in self.obs.items()
+            },
+            "task_emb": self._pin(torch.empty((n,) + self.task_emb_table.shape[1:])),
+        }
+        self.frames = {
+            k: self._pin(torch.empty((batch_size * T_obs,) + x.shape[1:], dtype=x.dtype))
+            for k, x in self.obs.items()
+            if x.dtype == torch.uint8
+        }
+        self.batch_sizes = (n_data, batch_size)
+
+    def sample(self, batch_size, data=None):
+        """
+        Sample stored sequences, collated like the batches of the DataLoader
+        over the task datasets. If data is such a batch, the samples are
+        appended to it.
+
+        NOTE: the returned tensors are reused, they are overwritten by the next call.
+        """
+        n_data = 0 if data is None else len(data["actions"])
+        if self.batch is None or self.batch_sizes != (n_data, batch_size):
+            self._allocate(n_data, batch_size)
+
+        idx = torch.randint(len(self), (batch_size,))
+        demos = self.seq_demos[idx]
+        steps = self.seq_steps[idx].unsqueeze(1)
+        offsets = self.demo_offsets[demos].unsqueeze(1)
+        last = self.demo_lengths[demos].unsqueeze(1) - 1
+        action_idx = offsets + torch.minimum(steps + self.action_steps, last)
+        obs_idx = offsets + (steps + self.obs_steps).clamp(min=0).minimum(last)
+
+        if data is not None:
+            self.batch["actions"][:n_data].copy_(data["actions"])
+            for k in self.batch["obs"]:
+                self.batch["obs"][k][:n_data].copy_(data["obs"][k])
+            self.batch["task_emb"][:n_data].copy_(data["task_emb"])
+
+        out = self.batch["actions"][n_data:]
+        torch.index_select(
+            self.actions, 0, action_idx.flatten(), out=out.view(-1, *out.shape[2:])
+        )
+        for k, x in self.obs.items():
+            out = self.batch["obs"][k][n_data:]
+            if k in self.frames:
+                torch.index_select(x, 0, obs_idx.flatten(), out=self.frames[k])
+                out.copy_(self.frames[k].view(out.shape)).div_(255.0)
+            else:
+                torch.index_select(
+                    x, 0, obs_idx.flatten(), out=out.view(-1, *out.shape[2:])
+                )
+        torch.index_select(
+            self.task_emb_table,
+            0,
+            self.demo_tasks[demos],
+            out=self.batch["task_emb"][n_data:],
+        )
+        return self.batch
 
 
 class ER(Sequential):
@@ -39,39 +201,19 @@ class ER(Sequential):
 
     def __init__(self, n_tasks, cfg, **policy_kwargs):
         super().__init__(n_tasks=n_tasks, cfg=cfg, **policy_kwargs)
-        # we truncate each sequence dataset to a buffer, when replay is used,
-        # concate all buffers to form a single replay buffer for replay.
-        self.datasets = []
+        # we store demos of every learned task in a memory, and append a batch
+        # sampled from it to every batch of the current task.
         self.descriptions = []
-        self.buffer = None
-
-    def start_task(self, task):
-        super().start_task(task)
-        if self.current_task > 0:
-            # WARNING: currently we have a fixed size memory for each task.
-            buffers = [
-                TruncatedSequenceDataset(dataset, self.cfg.lifelong.n_memories)
-                for dataset in self.datasets
-            ]
-
-            buf = ConcatDataset(buffers)
-            self.buffer = cycle(
-                DataLoader(
-                    buf,
-                    batch_size=self.cfg.train.batch_size,
-                    num_workers=self.cfg.train.num_workers,
-                    sampler=RandomSampler(buf),
-                    persistent_workers=True,
-                )
-            )
+        self.memory = ReplayMemory(
+            cfg.lifelong.n_memories, pin_memory="cuda" in cfg.device
+        )
 
     def end_task(self, dataset, task_id, benchmark):
-        self.datasets.append(dataset)
+        self.memory.add_task(dataset)
 
     def observe(self, data):
-        if self.buffer is not None:
-            buf_data = next(self.buffer)
-            data = merge_datas(data, buf_data)
+        if len(self.memory) > 0:
+            data = self.memory.sample(self.cfg.train.batch_size, data)
 
         data = self.map_tensor_to_device(data)
 
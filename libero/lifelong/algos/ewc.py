@@ -3,7 +3,7 @@ import robomimic.utils.tensor_utils as TensorUtils
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
 
 from libero.lifelong.algos.base import Sequential
 from libero.lifelong.utils import *
@@ -16,32 +16,42 @@ class EWC(Sequential):
 
     def __init__(self, n_tasks, cfg, **policy_kwargs):
         super().__init__(n_tasks=n_tasks, cfg=cfg, **policy_kwargs)
+        # the fisher information and the anchor of every trainable policy
+        # parameter are registered as buffers fish_{i} and checkpoint_{i}
+        # after the first task
         self.checkpoint = None
         self.fish = None
 
-    def get_params(self):
-        return torch.cat([p.reshape(-1) for p in self.policy.parameters()])
-
-    def get_grads(self):
-        return torch.cat(
-            [
-                p.grad.reshape(-1)
-                if p.grad is not None
-                else torch.zeros_like(p).reshape(-1)
-                for p in self.policy.parameters()
-            ]
-        )
+    def trainable_parameters(self):
+        """The policy parameters the penalty applies to, e.g. without a frozen
+        image encoder."""
+        return [p for p in self.policy.parameters() if p.requires_grad]
 
     def penalty(self):
         if self.checkpoint is None:
             return safe_device(torch.tensor(0.0), self.cfg.device)
         else:
-            penalty = (self.fish * ((self.get_params() - self.checkpoint) ** 2)).sum()
-            return penalty
+            return sum(
+                (f * (p - c).square()).sum()
+                for p, c, f in zip(
+                    self.trainable_parameters(), self.checkpoint, self.fish
+                )
+            )
 
-    def end_task(self, dataset, task_id, benchmark):
-        self.policy.train()
-        fish = torch.zeros_like(self.get_params())
+    def estimate_fisher(self, dataset):
+        """
+        Estimate the diagonal fisher information of the policy parameters on
+        a dataset, from the squared gradients of the nll of either each batch
+        (the default) or each sample (lifelong.fisher_per_sample). With
+        lifelong.fisher_budget, only that many random samples are used.
+        """
+        params = self.trainable_parameters()
+        fish = [torch.zeros_like(p) for p in params]
+
+        budget = self.cfg.lifelong.get("fisher_budget", None)
+        if budget is not None and budget < len(dataset):
+            dataset = Subset(dataset, torch.randperm(len(dataset))[:budget].tolist())
+        per_sample = self.cfg.lifelong.get("fisher_per_sample", False)
 
         dataloader = DataLoader(
             dataset,
@@ -50,25 +60,49 @@ class EWC(Sequential):
             num_workers=self.cfg.train.num_workers,
         )
 
+        n = 0
         for data in dataloader:
             data = TensorUtils.map_tensor(
                 data, lambda x: safe_device(x, device=self.cfg.device)
             )
-            self.policy.zero_grad()
             nll = self.policy.compute_loss(data, reduction="none")
-            (-nll).mean().backward()
-            grads = self.get_grads()
-            fish += grads**2
+            if per_sample:
+                nll = nll.reshape(len(nll), -1).mean(1)
+                losses = [nll[i] for i in range(len(nll))]
+            else:
+                losses = [nll.mean()]
+            for i, loss in enumerate(losses):
+                grads = torch.autograd.grad(
+                    loss,
+                    params,
+                    retain_graph=i < len(losses) - 1,
+                    allow_unused=True,
+                )
+                for f, g in zip(fish, grads):
+                    if g is not None:
+                        f.addcmul_(g, g)
+            n += len(losses)
 
-        fish /= len(dataloader)
+        for f in fish:
+            f.div_(max(n, 1))
+        return fish
+
+    def end_task(self, dataset, task_id, benchmark):
+        self.policy.train()
+        fish = self.estimate_fisher(dataset)
 
         if self.fish is None:
-            self.fish = fish
+            for i, (p, f) in enumerate(zip(self.trainable_parameters(), fish)):
+                self.register_buffer(f"fish_{i}", f)
+                self.register_buffer(f"checkpoint_{i}", p.detach().clone())
+            self.fish = [getattr(self, f"fish_{i}") for i in range(len(fish))]
+            self.checkpoint = [getattr(self, f"checkpoint_{i}") for i in range(len(fish))]
         else:
-            self.fish *= self.cfg.lifelong.gamma
-            self.fish += fish
-
-        self.checkpoint = self.get_params().data.clone()
+            for p, c, f_old, f in zip(
+                self.trainable_parameters(), self.checkpoint, self.fish, fish
+            ):
+                f_old.mul_(self.cfg.lifelong.gamma).add_(f)
+                c.copy_(p.detach())
 
     def observe(self, data):
         data = self.map_tensor_to_device(data)
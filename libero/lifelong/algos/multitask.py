@@ -4,9 +4,10 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import ConcatDataset, DataLoader, RandomSampler
+from torch.utils.data import DataLoader, RandomSampler
 
 from libero.lifelong.algos.base import Sequential
+from libero.lifelong.datasets import ConcatSequenceDataset
 from libero.lifelong.metric import *
 from libero.lifelong.models import *
 from libero.lifelong.utils import *
@@ -22,7 +23,7 @@ class Multitask(Sequential):
 
     def learn_all_tasks(self, datasets, benchmark, result_summary):
         self.start_task(-1)
-        concat_dataset = ConcatDataset(datasets)
+        concat_dataset = ConcatSequenceDataset(datasets)
 
         # learn on all tasks, only used in multitask learning
         model_checkpoint_name = os.path.join(
@@ -47,6 +48,7 @@ class Multitask(Sequential):
         idx_at_best_succ = 0
         successes = []
         losses = []
+        checkpoints = []
 
         # start training
         for epoch in range(0, self.cfg.train.n_epochs + 1):
@@ -71,7 +73,22 @@ class Multitask(Sequential):
                 f"[info] Epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
             )
 
-            if epoch % self.cfg.eval.eval_every == 0:  # evaluate BC loss
+            if (
+                epoch % self.cfg.eval.eval_every == 0
+                and self.cfg.lifelong.eval_in_train
+                and self.eval_service is not None
+            ):
+                # only save the checkpoint, the EvalService evaluates it while
+                # the training goes on and the best one is picked at the end
+                model_checkpoint_name_ep = os.path.join(
+                    self.experiment_dir, f"multitask_model_ep{epoch}.pth"
+                )
+                torch_save_model(self.policy, model_checkpoint_name_ep, cfg=self.cfg)
+                losses.append(training_loss)
+                checkpoints.append(model_checkpoint_name_ep)
+                cumulated_counter += 1.0
+
+            elif epoch % self.cfg.eval.eval_every == 0:  # evaluate BC loss
                 t0 = time.time()
                 self.policy.eval()
 
@@ -116,6 +133,13 @@ class Multitask(Sequential):
             if self.scheduler is not None and epoch > 0:
                 self.scheduler.step()
 
+        if self.cfg.lifelong.eval_in_train and self.eval_service is not None:
+            # the epoch checkpoints are kept for evaluate.py, as in the
+            # synchronous evaluation
+            successes, idx_at_best_succ = self.select_best_checkpoint(
+                checkpoints, model_checkpoint_name, remove=False
+            )
+
         # load the best policy if there is any
         if self.cfg.lifelong.eval_in_train:
             self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
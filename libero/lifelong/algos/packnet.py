@@ -6,7 +6,7 @@ import torch.nn.functional as F
 from torch.utils.data import DataLoader
 
 from libero.libero.benchmark import *
-from libero.lifelong.algos.base import Sequential
+from libero.lifelong.algos.base import Sequential, get_algo_class
 from libero.lifelong.metric import *
 from libero.lifelong.utils import *
 
@@ -248,23 +248,14 @@ class PackNet(Sequential):
             self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
 
     def get_eval_algo(self, task_id):
-        # TODO: find a better way to do this
-        # save and load a new model and set all params where mask > current_task + 1 to 0
-        torch_save_model(
-            self.policy,
-            os.path.join(self.experiment_dir, "tmp_model.pth"),
-            cfg=self.cfg,
-        )
+        # copy the policy to a new algo and set all params where mask > current_task + 1 to 0
         eval_algo = safe_device(
-            eval(self.cfg.lifelong.algo)(
+            get_algo_class(self.cfg.lifelong.algo)(
                 eval(self.cfg.benchmark_name)().n_tasks, self.cfg
             ),
             self.cfg.device,
         )
-        model_state_dict, _, _ = torch_load_model(
-            os.path.join(self.experiment_dir, "tmp_model.pth")
-        )
-        eval_algo.policy.load_state_dict(model_state_dict)
+        eval_algo.policy.load_state_dict(self.policy.state_dict())
 
         eval_algo.previous_masks = self.previous_masks
         eval_algo.pruning_mask = self.pruning_mask
@@ -1,5 +1,10 @@
 import copy
+import json
+import os
+import shutil
+from collections import OrderedDict
 
+import h5py
 import numpy as np
 import robomimic.utils.file_utils as FileUtils
 import robomimic.utils.obs_utils as ObsUtils
@@ -24,6 +29,7 @@ def get_dataset(
     frame_stack=1,
     filter_key=None,
     hdf5_cache_mode="low_dim",
+    use_memmap=False,
     *args,
     **kwargs
 ):
@@ -34,6 +40,21 @@ def get_dataset(
     all_obs_keys = []
     for modality_name, modality_list in obs_modality.items():
         all_obs_keys += modality_list
+
+    if use_memmap:
+        # serve the same sequences from the memory-mapped copy of the file
+        memmap_path = get_memmap_path(dataset_path)
+        if not os.path.exists(memmap_path):
+            convert_hdf5_to_memmap(dataset_path, memmap_path)
+        dataset = MemmapSequenceDataset(
+            memmap_path,
+            obs_keys=all_obs_keys,
+            frame_stack=frame_stack,
+            seq_length=seq_len,
+            filter_by_attribute=filter_key,
+        )
+        return dataset, dataset.get_shape_meta()
+
     shape_meta = FileUtils.get_shape_metadata_from_dataset(
         dataset_path=dataset_path, all_obs_keys=all_obs_keys, verbose=False
     )
@@ -59,6 +80,192 @@ def get_dataset(
     return dataset, shape_meta
 
 
+MEMMAP_META_FILE = "meta.json"
+
+
+def get_memmap_path(dataset_path):
+    """The default location of the memory-mapped copy of a hdf5 demo file."""
+    return os.path.splitext(dataset_path)[0] + ".mmap"
+
+
+def convert_hdf5_to_memmap(dataset_path, output_path=None, overwrite=False):
+    """
+    Convert a hdf5 demo file into the layout read by MemmapSequenceDataset:
+        meta.json          the demos (sorted as robomimic does), the filter
+                           masks and the dtype and shape of every array
+        demo_offsets.npy   the first timestep of every demo in the arrays,
+                           followed by the total number of timesteps
+        actions.npy        the actions of all demos, concatenated
+        obs/<key>.npy      the observations of all demos, concatenated, in
+                           their original dtype (uint8 for images)
+    """
+    if output_path is None:
+        output_path = get_memmap_path(dataset_path)
+    if os.path.exists(output_path):
+        if not overwrite:
+            return output_path
+        shutil.rmtree(output_path)
+
+    # write next to the output first, so readers never see a partial copy
+    tmp_path = output_path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(os.path.join(tmp_path, "obs"))
+
+    with h5py.File(dataset_path, "r") as f:
+        demos = list(f["data"].keys())
+        demos = [demos[i] for i in np.argsort([int(demo[5:]) for demo in demos])]
+        lengths = [f[f"data/{demo}/actions"].shape[0] for demo in demos]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        masks = {}
+        if "mask" in f:
+            for key in f["mask"]:
+                masks[key] = [x.decode("utf-8") for x in np.array(f[f"mask/{key}"][:])]
+
+        first = f[f"data/{demos[0]}"]
+        keys = ["actions"] + [f"obs/{k}" for k in first["obs"].keys()]
+        arrays = {}
+        for key in keys:
+            arrays[key] = {
+                "dtype": first[key].dtype.str,
+                "shape": list(first[key].shape[1:]),
+            }
+            out = np.lib.format.open_memmap(
+                os.path.join(tmp_path, f"{key}.npy"),
+                mode="w+",
+                dtype=first[key].dtype,
+                shape=(int(offsets[-1]),) + first[key].shape[1:],
+            )
+            for demo, start, end in zip(demos, offsets[:-1], offsets[1:]):
+                f[f"data/{demo}/{key}"].read_direct(out[start:end])
+            out.flush()
+            del out
+
+    np.save(os.path.join(tmp_path, "demo_offsets.npy"), offsets)
+    with open(os.path.join(tmp_path, MEMMAP_META_FILE), "w") as f:
+        json.dump({"demos": demos, "masks": masks, "arrays": arrays}, f, indent=4)
+    os.rename(tmp_path, output_path)
+    return output_path
+
+
+class MemmapSequenceDataset(Dataset):
+    """
+    The sequences of robomimic's SequenceDataset as created by get_dataset
+    (frame_stack and seq_length windows, both padded by repeating the first
+    and last timestep of the demo), read from the layout written by
+    convert_hdf5_to_memmap. Windows inside a demo are slices of the
+    memory-mapped arrays; the arrays are opened lazily in every process, so
+    DataLoader workers share the page cache instead of holding hdf5 handles
+    and decompressing chunks.
+    """
+
+    def __init__(
+        self,
+        path,
+        obs_keys,
+        dataset_keys=("actions",),
+        frame_stack=1,
+        seq_length=1,
+        filter_by_attribute=None,
+    ):
+        self.path = path
+        self.obs_keys = list(obs_keys)
+        self.dataset_keys = list(dataset_keys)
+        self.n_frame_stack = frame_stack
+        self.seq_length = seq_length
+        with open(os.path.join(path, MEMMAP_META_FILE), "r") as f:
+            self.meta = json.load(f)
+
+        demo_ids = np.arange(len(self.meta["demos"]))
+        if filter_by_attribute is not None:
+            keep = set(self.meta["masks"][filter_by_attribute])
+            demo_ids = np.array(
+                [i for i, demo in enumerate(self.meta["demos"]) if demo in keep]
+            )
+        self.demos = [self.meta["demos"][i] for i in demo_ids]
+        offsets = np.load(os.path.join(path, "demo_offsets.npy"))
+        self.demo_starts = offsets[demo_ids]
+        self.demo_lengths = offsets[demo_ids + 1] - offsets[demo_ids]
+        self.n_demos = len(self.demos)
+
+        # with padding, every timestep of a demo starts a sequence
+        self.total_num_sequences = int(self.demo_lengths.sum())
+        self._index_to_demo = np.repeat(np.arange(self.n_demos), self.demo_lengths)
+        self._demo_first_index = np.cumsum(self.demo_lengths) - self.demo_lengths
+        self._arrays = None
+
+    def __getstate__(self):
+        # memmaps are reopened in the unpickled copy (e.g. a DataLoader worker)
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            self._arrays = {
+                key: np.load(os.path.join(self.path, f"{key}.npy"), mmap_mode="r")
+                for key in self.dataset_keys + [f"obs/{k}" for k in self.obs_keys]
+            }
+        return self._arrays
+
+    def get_shape_meta(self):
+        """The shape metadata FileUtils.get_shape_metadata_from_dataset returns."""
+        all_shapes = OrderedDict()
+        for k in sorted(self.obs_keys):
+            all_shapes[k] = ObsUtils.get_processed_shape(
+                obs_modality=ObsUtils.OBS_KEYS_TO_MODALITIES[k],
+                input_shape=self.meta["arrays"][f"obs/{k}"]["shape"],
+            )
+        return {
+            "ac_dim": self.meta["arrays"]["actions"]["shape"][0],
+            "all_shapes": all_shapes,
+            "all_obs_keys": self.obs_keys,
+            "use_images": ObsUtils.has_modality("rgb", self.obs_keys),
+        }
+
+    def __len__(self):
+        return self.total_num_sequences
+
+    def get_window(self, key, demo, index_in_demo, num_frames_to_stack):
+        start = self.demo_starts[demo]
+        length = self.demo_lengths[demo]
+        begin = index_in_demo - num_frames_to_stack
+        end = index_in_demo + self.seq_length
+        if begin >= 0 and end <= length:
+            window = self.arrays[key][start + begin : start + end]
+        else:
+            window = self.arrays[key][start + np.clip(np.arange(begin, end), 0, length - 1)]
+        return window.astype("float32")
+
+    def __getitem__(self, index):
+        demo = self._index_to_demo[index]
+        index_in_demo = index - self._demo_first_index[demo]
+        item = {
+            key: self.get_window(key, demo, index_in_demo, 0)
+            for key in self.dataset_keys
+        }
+        obs = {
+            k: self.get_window(f"obs/{k}", demo, index_in_demo, self.n_frame_stack - 1)
+            for k in self.obs_keys
+        }
+        item["obs"] = ObsUtils.process_obs_dict(obs)
+        return item
+
+
+def get_demo_ranges(sequence_dataset):
+    """
+    The index of the first sequence and the length of every demo of a dataset
+    returned by get_dataset; with padding, every timestep starts a sequence.
+    """
+    if isinstance(sequence_dataset, MemmapSequenceDataset):
+        return sequence_dataset._demo_first_index, sequence_dataset.demo_lengths
+    demos = sequence_dataset.demos
+    starts = [sequence_dataset._demo_id_to_start_indices[demo] for demo in demos]
+    lengths = [sequence_dataset._demo_id_to_demo_length[demo] for demo in demos]
+    return np.array(starts), np.array(lengths)
+
+
 class SequenceVLDataset(Dataset):
     def __init__(self, sequence_dataset, task_emb):
         self.sequence_dataset = sequence_dataset
@@ -75,6 +282,28 @@ class SequenceVLDataset(Dataset):
         return return_dict
 
 
+def concat_index(lengths):
+    """
+    The index of datasets with the given lengths put one after another: the
+    i-th item is item item_ids[i] of dataset dataset_ids[i].
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    dataset_ids = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+    starts = np.cumsum(lengths) - lengths
+    item_ids = (np.arange(lengths.sum()) - np.repeat(starts, lengths)).astype(np.int32)
+    return item_ids, dataset_ids
+
+
+def interleave_index(lengths):
+    """
+    The index of datasets with the given lengths visited in turn, one item of
+    each dataset that is not exhausted yet per round, see GroupedTaskDataset.
+    """
+    item_ids, dataset_ids = concat_index(lengths)
+    order = np.lexsort((dataset_ids, item_ids))
+    return item_ids[order], dataset_ids[order]
+
+
 class GroupedTaskDataset(Dataset):
     def __init__(self, sequence_datasets, task_embs):
         self.sequence_datasets = sequence_datasets
@@ -87,7 +316,7 @@ class GroupedTaskDataset(Dataset):
         self.lengths = [len(x) for x in self.sequence_datasets]
         self.task_group_size = len(self.sequence_datasets)
 
-        # create a map that maps the current idx of dataloader to original task data idx
+        # map the current idx of dataloader to the original task data idx
         # imagine we have task 1,2,3, with sizes 3,5,4, then the idx looks like
         # task-1  task-2  task-3
         #   0       1       2
@@ -96,29 +325,14 @@ class GroupedTaskDataset(Dataset):
         #           9       10
         #           11
         # by doing so, when we concat the dataset, every task will have equal number of demos
-        self.map_dict = {}
-        sizes = np.array(self.lengths)
-        row = 0
-        col = 0
-        for i in range(sum(sizes)):
-            while sizes[col] == 0:
-                col = col + 1
-                if col >= self.task_group_size:
-                    col -= self.task_group_size
-                    row += 1
-            self.map_dict[i] = (row, col)
-            sizes[col] -= 1
-            col += 1
-            if col >= self.task_group_size:
-                col -= self.task_group_size
-                row += 1
+        self.item_ids, self.task_ids = interleave_index(self.lengths)
         self.n_total = sum(self.lengths)
 
     def __len__(self):
         return self.n_total
 
     def __get_original_task_idx(self, idx):
-        return self.map_dict[idx]
+        return int(self.item_ids[idx]), int(self.task_ids[idx])
 
     def __getitem__(self, idx):
         oi, oti = self.__get_original_task_idx(idx)
@@ -127,13 +341,24 @@ class GroupedTaskDataset(Dataset):
         return return_dict
 
 
-class TruncatedSequenceDataset(Dataset):
-    def __init__(self, sequence_dataset, buffer_size):
-        self.sequence_dataset = sequence_dataset
-        self.buffer_size = buffer_size
+class ConcatSequenceDataset(Dataset):
+    """
+    A replacement of torch's ConcatDataset indexed by two int32 arrays, the
+    dataset and the item within it of every index, instead of a bisection of
+    the cumulative sizes.
+    """
+
+    def __init__(self, datasets):
+        self.datasets = list(datasets)
+        self.lengths = [len(x) for x in self.datasets]
+        self.cumulative_sizes = np.cumsum(self.lengths).tolist()
+        self.item_ids, self.dataset_ids = concat_index(self.lengths)
 
     def __len__(self):
-        return self.buffer_size
+        return len(self.item_ids)
 
     def __getitem__(self, idx):
-        return self.sequence_dataset.__getitem__(idx)
+        if idx < 0:
+            idx += len(self)
+        return self.datasets[int(self.dataset_ids[idx])][int(self.item_ids[idx])]
+
@@ -0,0 +1,180 @@
+"""
+Evaluation of training checkpoints in the background.
+
+The trainer only saves checkpoints; an EvalService evaluates them in a pool of
+worker processes, each with its own evaluation envs, while the training goes
+on. The best checkpoint of a task is picked once its results are in, see
+Sequential.select_best_checkpoint.
+"""
+import json
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import robomimic.utils.obs_utils as ObsUtils
+
+from libero.libero.benchmark import get_benchmark
+from libero.lifelong.algos import get_algo_class
+from libero.lifelong.metric import evaluate_one_task_success
+from libero.lifelong.utils import safe_device, torch_load_model
+
+# the checkpoints saved during training, see Sequential.learn_one_task and
+# Multitask.learn_all_tasks
+CHECKPOINT_PATTERN = re.compile(
+    r"^(?:task(?P<task_id>\d+)|multitask)_model_ep(?P<epoch>\d+)\.pth$"
+)
+RESULTS_FILE = "eval_results.jsonl"
+
+
+def _init_worker(obs_modality):
+    ObsUtils.initialize_obs_utils_with_obs_specs({"obs": obs_modality})
+
+
+def evaluate_checkpoint(checkpoint, task_ids, task_embs, device=None):
+    """
+    Evaluate the success rates of a checkpoint on some tasks of its benchmark.
+
+    Args:
+        checkpoint (str): The path of a checkpoint saved by torch_save_model.
+        task_ids (list): The manipulation tasks to evaluate on.
+        task_embs (torch.Tensor): The task embeddings of the benchmark.
+        device (None or str): The device of the policy, defaults to the one
+            of the checkpoint's config.
+    Returns:
+        list: The success rate of each task.
+    """
+    state_dict, cfg, previous_masks = torch_load_model(checkpoint, map_location="cpu")
+    if device is not None:
+        cfg.device = device
+
+    benchmark = get_benchmark(cfg.benchmark_name)(cfg.data.task_order_index)
+    benchmark.set_task_embs(task_embs)
+    n_tasks = benchmark.n_tasks // cfg.data.task_group_size
+
+    algo = safe_device(get_algo_class(cfg.lifelong.algo)(n_tasks, cfg), cfg.device)
+    algo.policy.load_state_dict(state_dict)
+    # PackNet's get_eval_algo copies the training state of the algo
+    algo.optimizer, algo.scheduler = None, None
+    if previous_masks is not None:
+        algo.previous_masks = previous_masks
+        algo.current_masks = previous_masks
+    algo.eval()
+
+    return [
+        evaluate_one_task_success(
+            cfg,
+            algo,
+            benchmark.get_task(task_id),
+            benchmark.get_task_emb(task_id),
+            task_id,
+        )
+        for task_id in task_ids
+    ]
+
+
+class EvalService:
+    """
+    Evaluates checkpoints in worker processes while the training continues.
+
+    A watcher thread polls the experiment directory for the checkpoints saved
+    during training (task{i}_model_ep{e}.pth, evaluated on the manipulation
+    tasks of task i, and multitask_model_ep{e}.pth, evaluated on all tasks)
+    and submits every new one. Other checkpoints can be submitted directly.
+    The results are also appended to <experiment_dir>/eval_results.jsonl.
+
+    Args:
+        cfg (EasyDict): The experiment config.
+        task_embs (torch.Tensor): The task embeddings of the benchmark.
+        num_workers (int): The number of checkpoints evaluated at once.
+        poll_interval (float): Seconds between two scans of the directory.
+    """
+
+    def __init__(self, cfg, task_embs, num_workers=1, poll_interval=5.0):
+        self.experiment_dir = cfg.experiment_dir
+        self.task_embs = task_embs.cpu()
+        self.n_manip_tasks = len(task_embs)
+        self.task_group_size = cfg.data.task_group_size
+        self.device = cfg.eval.get("async_eval_device", None)
+        self.poll_interval = poll_interval
+
+        # MuJoCo and CUDA state should not be inherited by forked workers
+        self.executor = ProcessPoolExecutor(
+            num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(dict(cfg.data.obs.modality),),
+        )
+        self.futures = {}
+        # reentrant, a callback runs in the submitting thread if the future is done
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.watcher = threading.Thread(target=self._watch, daemon=True)
+        self.watcher.start()
+
+    def submit(self, checkpoint, task_ids):
+        """
+        Evaluate a checkpoint on some manipulation tasks. A checkpoint is only
+        evaluated once, later calls return the same future.
+        """
+        with self.lock:
+            if checkpoint not in self.futures:
+                future = self.executor.submit(
+                    evaluate_checkpoint,
+                    checkpoint,
+                    list(task_ids),
+                    self.task_embs,
+                    self.device,
+                )
+                future.add_done_callback(
+                    lambda f: self._record(checkpoint, list(task_ids), f)
+                )
+                self.futures[checkpoint] = future
+            return self.futures[checkpoint]
+
+    def scan(self):
+        """
+        Submit the new training checkpoints of the experiment directory.
+        """
+        for name in sorted(os.listdir(self.experiment_dir)):
+            match = CHECKPOINT_PATTERN.match(name)
+            if match is None:
+                continue
+            if match.group("task_id") is None:
+                task_ids = range(self.n_manip_tasks)
+            else:
+                task_id = int(match.group("task_id"))
+                gsz = self.task_group_size
+                task_ids = range(task_id * gsz, (task_id + 1) * gsz)
+            self.submit(os.path.join(self.experiment_dir, name), task_ids)
+
+    def wait(self, checkpoint):
+        """
+        Block until a training checkpoint is evaluated and return its success
+        rates.
+        """
+        self.scan()
+        return self.futures[checkpoint].result()
+
+    def _watch(self):
+        while not self.stopped.wait(self.poll_interval):
+            self.scan()
+
+    def _record(self, checkpoint, task_ids, future):
+        if future.exception() is not None:
+            print(f"[error] failed to evaluate {checkpoint}: {future.exception()}")
+            return
+        entry = {
+            "checkpoint": os.path.basename(checkpoint),
+            "task_ids": task_ids,
+            "success_rates": [float(x) for x in future.result()],
+        }
+        with self.lock:
+            with open(os.path.join(self.experiment_dir, RESULTS_FILE), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def close(self):
+        self.stopped.set()
+        self.watcher.join()
+        self.executor.shutdown(wait=True)
@@ -10,13 +10,11 @@ import numpy as np
 import pprint
 import time
 import torch
-import wandb
 import yaml
 from easydict import EasyDict
 from hydra.utils import get_original_cwd, to_absolute_path
 from omegaconf import DictConfig, OmegaConf
 from torch.utils.data import DataLoader
-from transformers import AutoModel, pipeline, AutoTokenizer, logging
 from pathlib import Path
 
 from libero.libero import get_libero_path
@@ -24,12 +22,12 @@ from libero.libero.benchmark import get_benchmark
 from libero.libero.envs import OffScreenRenderEnv, SubprocVectorEnv
 from libero.libero.utils.time_utils import Timer
 from libero.libero.utils.video_utils import VideoWriter
-from libero.lifelong.algos import *
+from libero.lifelong.algos import get_algo_class
 from libero.lifelong.datasets import get_dataset, SequenceVLDataset, GroupedTaskDataset
 from libero.lifelong.metric import (
     evaluate_loss,
     evaluate_success,
-    raw_obs_to_tensor_obs,
+    TensorObsConverter,
 )
 from libero.lifelong.utils import (
     control_seed,
@@ -161,7 +159,7 @@ def main():
     cfg.init_states_folder = get_libero_path("init_states")
 
     cfg.device = args.device_id
-    algo = safe_device(eval(algo_map[args.algo])(10, cfg), cfg.device)
+    algo = safe_device(get_algo_class(algo_map[args.algo])(10, cfg), cfg.device)
     algo.policy.previous_mask = previous_mask
 
     if cfg.lifelong.algo == "PackNet":
@@ -261,6 +259,7 @@ def main():
         task_emb = benchmark.get_task_emb(args.task_id)
 
         num_success = 0
+        obs_converter = TensorObsConverter(cfg)
         for _ in range(5):  # simulate the physics without any actions
             env.step(np.zeros((env_num, 7)))
 
@@ -268,7 +267,7 @@ def main():
             while steps < cfg.eval.max_steps:
                 steps += 1
 
-                data = raw_obs_to_tensor_obs(obs, task_emb, cfg)
+                data = obs_converter(obs, task_emb)
                 actions = algo.policy.get_action(data)
                 obs, reward, done, info = env.step(actions)
                 video_writer.append_vector_obs(
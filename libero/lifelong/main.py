@@ -22,6 +22,7 @@ from libero.libero.benchmark import get_benchmark
 from libero.lifelong.algos import get_algo_class, get_algo_list
 from libero.lifelong.models import get_policy_list
 from libero.lifelong.datasets import GroupedTaskDataset, SequenceVLDataset, get_dataset
+from libero.lifelong.eval_service import EvalService
 from libero.lifelong.metric import evaluate_loss, evaluate_success
 from libero.lifelong.utils import (
     NpEncoder,
@@ -29,6 +30,7 @@ from libero.lifelong.utils import (
     control_seed,
     safe_device,
     torch_load_model,
+    torch_save_model,
     create_experiment_dir,
     get_task_embs,
 )
@@ -76,6 +78,7 @@ def main(hydra_cfg):
                 obs_modality=cfg.data.obs.modality,
                 initialize_obs_utils=(i == 0),
                 seq_len=cfg.data.seq_len,
+                use_memmap=cfg.data.get("use_memmap", False),
             )
         except Exception as e:
             print(
@@ -174,6 +177,20 @@ def main(hydra_cfg):
     with open(os.path.join(cfg.experiment_dir, "config.json"), "w") as f:
         json.dump(cfg, f, cls=NpEncoder, indent=4)
 
+    # evaluate the checkpoints in background processes instead of blocking
+    # the training, the simulation states are not recorded in this mode
+    eval_service = None
+    if cfg.eval.get("async_eval", False):
+        eval_service = EvalService(
+            cfg, task_embs, num_workers=cfg.eval.get("async_eval_workers", 1)
+        )
+        algo.eval_service = eval_service
+        if cfg.eval.save_sim_states:
+            print(
+                "[warning] eval.save_sim_states is ignored by the evaluations "
+                "run in the background with eval.async_eval"
+            )
+
     if cfg.lifelong.algo == "Multitask":
 
         algo.train()
@@ -211,6 +228,30 @@ def main(hydra_cfg):
 
             torch.save(result_summary, os.path.join(cfg.experiment_dir, f"result.pt"))
     else:
+
+        def record_success(i, S):
+            result_summary["S_conf_mat"][i][: i + 1] = S
+            if cfg.use_wandb:
+                wandb.run.summary["success_confusion_matrix"] = result_summary[
+                    "S_conf_mat"
+                ]
+                wandb.run.summary["loss_confusion_matrix"] = result_summary[
+                    "L_conf_mat"
+                ]
+                wandb.run.summary["fwd_transfer_success"] = result_summary["S_fwd"]
+                wandb.run.summary["fwd_transfer_loss"] = result_summary["L_fwd"]
+                wandb.run.summary.update()
+            print(("[Task %2d succ.] " + " %4.2f |" * (i + 1)) % (i, *S))
+            torch.save(result_summary, os.path.join(cfg.experiment_dir, f"result.pt"))
+
+        def record_final_success(i, checkpoint, future):
+            # the final model of a task is only saved for its evaluation
+            S = future.result()
+            os.remove(checkpoint)
+            record_success(i, S)
+
+        # the success evaluations running in the EvalService
+        pending_evals = []
         for i in range(n_tasks):
             print(f"[info] start training on task {i}")
             algo.train()
@@ -226,28 +267,37 @@ def main(hydra_cfg):
             # evalute on all seen tasks at the end of learning each task
             if cfg.eval.eval:
                 L = evaluate_loss(cfg, algo, benchmark, datasets[: i + 1])
+                result_summary["L_conf_mat"][i][: i + 1] = L
                 t2 = time.time()
-                S = evaluate_success(
-                    cfg=cfg,
-                    algo=algo,
-                    benchmark=benchmark,
-                    task_ids=list(range((i + 1) * gsz)),
-                    result_summary=result_summary if cfg.eval.save_sim_states else None,
-                )
+                if eval_service is not None:
+                    # the final model of the task, end_task may have changed it
+                    checkpoint = os.path.join(
+                        cfg.experiment_dir, f"task{i}_final_model.pth"
+                    )
+                    torch_save_model(
+                        algo.policy,
+                        checkpoint,
+                        cfg=cfg,
+                        previous_masks=getattr(algo, "previous_masks", None),
+                    )
+                    pending_evals.append(
+                        (
+                            i,
+                            checkpoint,
+                            eval_service.submit(checkpoint, range((i + 1) * gsz)),
+                        )
+                    )
+                else:
+                    S = evaluate_success(
+                        cfg=cfg,
+                        algo=algo,
+                        benchmark=benchmark,
+                        task_ids=list(range((i + 1) * gsz)),
+                        result_summary=result_summary
+                        if cfg.eval.save_sim_states
+                        else None,
+                    )
                 t3 = time.time()
-                result_summary["L_conf_mat"][i][: i + 1] = L
-                result_summary["S_conf_mat"][i][: i + 1] = S
-
-                if cfg.use_wandb:
-                    wandb.run.summary["success_confusion_matrix"] = result_summary[
-                        "S_conf_mat"
-                    ]
-                    wandb.run.summary["loss_confusion_matrix"] = result_summary[
-                        "L_conf_mat"
-                    ]
-                    wandb.run.summary["fwd_transfer_success"] = result_summary["S_fwd"]
-                    wandb.run.summary["fwd_transfer_loss"] = result_summary["L_fwd"]
-                    wandb.run.summary.update()
 
                 print(
                     f"[info] train time (min) {(t1-t0)/60:.1f} "
@@ -255,10 +305,18 @@ def main(hydra_cfg):
                     + f"eval success time {(t3-t2)/60:.1f}"
                 )
                 print(("[Task %2d loss ] " + " %4.2f |" * (i + 1)) % (i, *L))
-                print(("[Task %2d succ.] " + " %4.2f |" * (i + 1)) % (i, *S))
-                torch.save(
-                    result_summary, os.path.join(cfg.experiment_dir, f"result.pt")
-                )
+                if eval_service is None:
+                    record_success(i, S)
+
+            # record the background evaluations finished so far
+            while len(pending_evals) > 0 and pending_evals[0][2].done():
+                record_final_success(*pending_evals.pop(0))
+
+        for k, checkpoint, future in pending_evals:
+            record_final_success(k, checkpoint, future)
+
+    if eval_service is not None:
+        eval_service.close()
 
     print("[info] finished learning\n")
     if cfg.use_wandb:
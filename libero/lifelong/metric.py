@@ -1,5 +1,8 @@
+import atexit
 import copy
+import functools
 import gc
+import json
 import numpy as np
 import os
 import robomimic.utils.obs_utils as ObsUtils
@@ -27,36 +30,371 @@ def raw_obs_to_tensor_obs(obs, task_emb, cfg):
         "task_emb": task_emb.repeat(env_num, 1),
     }
 
-    all_obs_keys = []
     for modality_name, modality_list in cfg.data.obs.modality.items():
         for obs_name in modality_list:
-            data["obs"][obs_name] = []
-        all_obs_keys += modality_list
-
-    for k in range(env_num):
-        for obs_name in all_obs_keys:
-            data["obs"][obs_name].append(
-                ObsUtils.process_obs(
-                    torch.from_numpy(obs[k][cfg.data.obs_key_mapping[obs_name]]),
-                    obs_key=obs_name,
-                ).float()
-            )
-
-    for key in data["obs"]:
-        data["obs"][key] = torch.stack(data["obs"][key])
+            raw_obs_name = cfg.data.obs_key_mapping[obs_name]
+            data["obs"][obs_name] = ObsUtils.process_obs(
+                torch.from_numpy(np.stack([obs[k][raw_obs_name] for k in range(env_num)])),
+                obs_key=obs_name,
+            ).float()
 
     data = TensorUtils.map_tensor(data, lambda x: safe_device(x, device=cfg.device))
     return data
 
 
+class TensorObsConverter:
+    """
+    The same conversion as raw_obs_to_tensor_obs for every step of a rollout,
+    without allocating new tensors. The observations of all envs are stacked
+    per key into preallocated host buffers (pinned if cfg.device is a GPU),
+    copied to preallocated tensors on the device and processed there in place.
+    task_emb is either the embedding of all envs, repeated and kept as long as
+    the same task_emb is passed, or one embedding per env.
+
+    NOTE: the returned tensors are reused, they are overwritten by the next call.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        if "cuda" in cfg.device and torch.cuda.is_available():
+            self.device = torch.device(cfg.device)
+        else:
+            self.device = torch.device("cpu")
+        self.obs_keys = []
+        for modality_name, modality_list in cfg.data.obs.modality.items():
+            self.obs_keys += modality_list
+        self.env_num = None
+        self.task_emb = None
+        self.task_embs = None
+
+    def _allocate(self, obs):
+        env_num = len(obs)
+        self.host_buffers = {}
+        self.host_arrays = {}
+        self.buffers = {}
+        for obs_name in self.obs_keys:
+            raw = np.asarray(obs[0][self.cfg.data.obs_key_mapping[obs_name]])
+            host = torch.from_numpy(np.zeros((env_num,) + raw.shape, dtype=raw.dtype))
+            if self.device.type == "cuda":
+                host = host.pin_memory()
+            self.host_buffers[obs_name] = host
+            self.host_arrays[obs_name] = host.numpy()
+            processed = ObsUtils.process_obs(host[:1], obs_key=obs_name)
+            self.buffers[obs_name] = torch.empty(
+                (env_num,) + tuple(processed.shape[1:]),
+                dtype=torch.float32,
+                device=self.device,
+            )
+        self.env_num = env_num
+
+    def __call__(self, obs, task_emb):
+        env_num = len(obs)
+        if self.env_num != env_num:
+            self._allocate(obs)
+
+        for obs_name in self.obs_keys:
+            raw_obs_name = self.cfg.data.obs_key_mapping[obs_name]
+            host = self.host_buffers[obs_name]
+            buffer = self.buffers[obs_name]
+            np.stack([obs[k][raw_obs_name] for k in range(env_num)], out=self.host_arrays[obs_name])
+            if ObsUtils.OBS_KEYS_TO_MODALITIES.get(obs_name) == "rgb":
+                # robomimic's rgb processing: (H, W, C) -> (C, H, W), scaled to [0, 1]
+                buffer.copy_(host.permute(0, 3, 1, 2), non_blocking=True)
+                buffer.div_(255.0).clamp_(0.0, 1.0)
+            else:
+                buffer.copy_(
+                    ObsUtils.process_obs(host, obs_key=obs_name), non_blocking=True
+                )
+
+        if task_emb is not self.task_emb or self.task_embs.shape[0] != env_num:
+            self.task_emb = task_emb
+            if task_emb.dim() == 1:
+                self.task_embs = task_emb.repeat(env_num, 1).to(self.device)
+            else:  # one embedding per env
+                self.task_embs = task_emb.to(self.device)
+
+        return {"obs": dict(self.buffers), "task_emb": self.task_embs}
+
+
+def create_eval_env(cfg, env_args, env_num, problem_key=None):
+    """
+    Create the vector env of OffScreenRenderEnv used for evaluation.
+    """
+    # Try to handle the frame buffer issue
+    env_creation = False
+
+    count = 0
+    while not env_creation and count < 5:
+        try:
+            if env_num == 1:
+                env = DummyVectorEnv(
+                    [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)],
+                    problem_key=problem_key,
+                )
+            else:
+                env = SubprocVectorEnv(
+                    [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)],
+                    share_memory=cfg.eval.get("share_memory", False),
+                    problem_key=problem_key,
+                )
+            env_creation = True
+        except:
+            time.sleep(5)
+            count += 1
+    if count >= 5:
+        raise Exception("Failed to create environment")
+    return env
+
+
+class EvalEnvPool:
+    """
+    A long-lived vector env for evaluation. The worker processes stay alive
+    across tasks and epochs; switching to another task loads its bddl file
+    inside the workers, and each worker keeps the envs of the
+    max_cached_envs most recently evaluated tasks.
+    """
+
+    def __init__(self, cfg, env_num):
+        self.cfg = cfg
+        self.env_num = env_num
+        self.max_cached_envs = cfg.eval.get("max_cached_envs", 1)
+        self.env = None
+        self.problem_key = None
+
+    def get(self, env_args):
+        problem_key = json.dumps(env_args, sort_keys=True)
+        if self.env is None:
+            self.env = create_eval_env(
+                self.cfg, env_args, self.env_num, problem_key=problem_key
+            )
+        elif problem_key != self.problem_key:
+            self.env.load_problem(
+                problem_key,
+                [lambda: OffScreenRenderEnv(**env_args) for _ in range(self.env_num)],
+                max_cached_envs=self.max_cached_envs,
+            )
+        self.problem_key = problem_key
+        return self.env
+
+    def close(self):
+        if self.env is not None:
+            self.env.close()
+            self.env = None
+            self.problem_key = None
+
+
+# the evaluation env pools of this process, keyed by their number of envs, so
+# that evaluations with different numbers of envs do not close each other's
+_EVAL_ENV_POOLS = {}
+
+
+def get_eval_env_pool(cfg, env_num):
+    """
+    Get the process-wide evaluation env pool of env_num envs, creating it on
+    the first call.
+    """
+    if not _EVAL_ENV_POOLS:
+        atexit.register(close_eval_env_pool)
+    if env_num not in _EVAL_ENV_POOLS:
+        _EVAL_ENV_POOLS[env_num] = EvalEnvPool(cfg, env_num)
+    return _EVAL_ENV_POOLS[env_num]
+
+
+def close_eval_env_pool():
+    for env_pool in _EVAL_ENV_POOLS.values():
+        env_pool.close()
+    _EVAL_ENV_POOLS.clear()
+    gc.collect()
+
+
+class SuccessRateStopper:
+    """
+    Anytime-valid early stopping of a success rate evaluation against a
+    threshold, e.g. the best success rate so far when selecting checkpoints.
+    Called with the results of the first n episodes, it returns True once
+    the success rate cannot be above the threshold:
+      - deterministically, whatever the remaining episodes of n_eval return;
+      - or statistically, the Wilson interval of the n results lying entirely
+        below the threshold. The interval after n results uses
+        alpha / (n * (n + 1)), so all the intervals hold at once with
+        probability 1 - alpha and stopping at any of them is valid.
+    It never stops a success rate that may be above the threshold, so a
+    success rate that beats it is always computed from all n_eval episodes,
+    and the rate of the episodes run before a stop is at most the threshold.
+    """
+
+    def __init__(self, threshold, n_eval, alpha=0.05, min_episodes=5):
+        self.threshold = threshold
+        self.n_eval = n_eval
+        self.alpha = alpha
+        self.min_episodes = min_episodes
+
+    def __call__(self, num_success, n):
+        if n >= self.n_eval:
+            return True
+        # settled whatever the remaining episodes return
+        if num_success + self.n_eval - n <= self.threshold * self.n_eval:
+            return True
+        if n < self.min_episodes:
+            return False
+        _, high = wilson_interval(num_success, n, self.alpha / (n * (n + 1)))
+        return high < self.threshold
+
+
+def run_slot_refill_rollouts(cfg, algo, env, env_num, tasks, obs_converter):
+    """
+    Run cfg.eval.n_eval rollouts of each task on the env_num envs of env,
+    episode j of a task starting from its init_states[j % len(init_states)].
+    Only the envs with a running episode are stepped, all of them through one
+    batched get_action call. As soon as an episode succeeds or reaches
+    cfg.eval.max_steps, its env (slot) takes the next pending episode and the
+    policy history of the slot is cleared, so the compute follows the episode
+    lengths instead of the slowest episode of each wave.
+    tasks:  a list of dicts, one per task, with the keys
+            init_states: the init states of the task
+            task_emb:    the task embedding
+            env_args:    (optional) the arguments of the OffScreenRenderEnv of
+                         the task, loaded by the envs before they run its
+                         episodes (see BaseVectorEnv.load_problem); without
+                         it, env must already run the task
+            sim_states:  (optional) if not None, the simulated states of
+                         episode j are appended to sim_states[j]
+            stopper:     (optional) if not None, called with the number of
+                         successes among the first n episodes of the task
+                         whenever n grows, the task stops once it returns
+                         True. Episodes are counted in order, not as they
+                         finish, since successful episodes finish first.
+    Returns the number of successful episodes and the number of episodes of
+    each task.
+    """
+    n_eval = cfg.eval.n_eval
+    pending = [(t, j) for t in range(len(tasks)) for j in range(n_eval)][::-1]
+    num_success = [0] * len(tasks)
+    num_results = [0] * len(tasks)
+    results = [{} for _ in tasks]
+    stopped = [False] * len(tasks)
+    slot_episode = {}
+    slot_obs = {}
+    slot_steps = {}
+    slot_problem = {}
+
+    def start_episodes(slots):
+        episodes = [pending.pop() for _ in slots]
+
+        # switch the envs to the tasks of their new episodes
+        for t in sorted(set(t for (t, _) in episodes)):
+            if tasks[t].get("env_args") is None:
+                continue
+            problem_key = json.dumps(tasks[t]["env_args"], sort_keys=True)
+            ids = [
+                slot
+                for slot, (t_, _) in zip(slots, episodes)
+                if t_ == t and slot_problem.get(slot) != problem_key
+            ]
+            if len(ids) > 0:
+                env_fn = functools.partial(OffScreenRenderEnv, **tasks[t]["env_args"])
+                env.load_problem(
+                    problem_key,
+                    [env_fn] * len(ids),
+                    max_cached_envs=cfg.eval.get("max_cached_envs", 1),
+                    id=ids,
+                )
+                slot_problem.update({slot: problem_key for slot in ids})
+
+        env.reset(id=slots)
+        init_states_ = np.stack(
+            [
+                tasks[t]["init_states"][j % tasks[t]["init_states"].shape[0]]
+                for (t, j) in episodes
+            ]
+        )
+        obs = env.set_init_state(init_states_, id=slots)
+
+        # dummy actions all zeros for initial physics simulation
+        dummy = np.zeros((len(slots), 7))
+        for _ in range(5):
+            obs, _, _, _ = env.step(dummy, id=slots)
+
+        if any(tasks[t].get("sim_states") is not None for (t, _) in episodes):
+            sim_state = env.get_sim_state(id=slots)
+        for k, (slot, (t, j)) in enumerate(zip(slots, episodes)):
+            slot_episode[slot] = (t, j)
+            slot_obs[slot] = obs[k]
+            slot_steps[slot] = 0
+            if tasks[t].get("sim_states") is not None:
+                tasks[t]["sim_states"][j].append(sim_state[k])
+
+    def refill(slots):
+        algo.policy.reset_slots(slots)
+        for slot in slots:
+            del slot_episode[slot]
+            del slot_obs[slot]
+        slots = slots[: len(pending)]
+        if len(slots) > 0:
+            start_episodes(slots)
+
+    algo.reset()
+    start_episodes(list(range(min(env_num, len(pending)))))
+    row_tasks, task_embs = None, None
+    while len(slot_episode) > 0:
+        slots = sorted(slot_episode.keys())
+        if row_tasks != [slot_episode[slot][0] for slot in slots]:
+            row_tasks = [slot_episode[slot][0] for slot in slots]
+            task_embs = torch.stack([tasks[t]["task_emb"] for t in row_tasks])
+        data = obs_converter([slot_obs[slot] for slot in slots], task_embs)
+        actions = algo.policy.get_action(data, slot_ids=slots)
+
+        obs, reward, done, info = env.step(actions, id=slots)
+
+        # record the sim states for replay purpose
+        sim_state = None
+        if any(tasks[t].get("sim_states") is not None for t in row_tasks):
+            sim_state = env.get_sim_state(id=slots)
+
+        finished = []
+        for k, slot in enumerate(slots):
+            t, j = slot_episode[slot]
+            slot_obs[slot] = obs[k]
+            slot_steps[slot] += 1
+            if sim_state is not None and tasks[t].get("sim_states") is not None:
+                tasks[t]["sim_states"][j].append(sim_state[k])
+            if done[k] or slot_steps[slot] >= cfg.eval.max_steps:
+                results[t][j] = bool(done[k])
+                finished.append(slot)
+
+        for t in sorted(set(slot_episode[slot][0] for slot in finished)):
+            n = num_results[t]
+            while num_results[t] in results[t]:
+                num_success[t] += int(results[t].pop(num_results[t]))
+                num_results[t] += 1
+            stopper = tasks[t].get("stopper")
+            if stopper is not None and num_results[t] > n:
+                if stopper(num_success[t], num_results[t]):
+                    # drop the pending and running episodes of the task
+                    stopped[t] = True
+                    pending = [(t_, j) for (t_, j) in pending if t_ != t]
+
+        finished += [
+            slot
+            for slot in slots
+            if stopped[slot_episode[slot][0]] and slot not in finished
+        ]
+        if len(finished) > 0:
+            refill(finished)
+    return list(zip(num_success, num_results))
+
+
 def evaluate_one_task_success(
-    cfg, algo, task, task_emb, task_id, sim_states=None, task_str=""
+    cfg, algo, task, task_emb, task_id, sim_states=None, task_str="", stopper=None
 ):
     """
     Evaluate a single task's success rate
     sim_states: if not None, will keep track of all simulated states during
                 evaluation, mainly for visualization and debugging purpose
     task_str:   the key to access sim_states dictionary
+    stopper:    if not None, a SuccessRateStopper, the evaluation stops as soon
+                as it returns True and the success rate is computed from the
+                episodes run so far, which is then at most its threshold
     """
     with Timer() as t:
         if cfg.lifelong.algo == "PackNet":  # need preprocess weights for PackNet
@@ -78,26 +416,10 @@ def evaluate_one_task_success(
         env_num = min(cfg.eval.num_procs, cfg.eval.n_eval) if cfg.eval.use_mp else 1
         eval_loop_num = (cfg.eval.n_eval + env_num - 1) // env_num
 
-        # Try to handle the frame buffer issue
-        env_creation = False
-
-        count = 0
-        while not env_creation and count < 5:
-            try:
-                if env_num == 1:
-                    env = DummyVectorEnv(
-                        [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)]
-                    )
-                else:
-                    env = SubprocVectorEnv(
-                        [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)]
-                    )
-                env_creation = True
-            except:
-                time.sleep(5)
-                count += 1
-        if count >= 5:
-            raise Exception("Failed to create environment")
+        if cfg.eval.get("persistent_env_pool", False):
+            env = get_eval_env_pool(cfg, env_num).get(env_args)
+        else:
+            env = create_eval_env(cfg, env_args, env_num)
 
         ### Evaluation loop
         # get fixed init states to control the experiment randomness
@@ -106,65 +428,165 @@ def evaluate_one_task_success(
         )
         init_states = torch.load(init_states_path)
         num_success = 0
-        for i in range(eval_loop_num):
-            env.reset()
-            indices = np.arange(i * env_num, (i + 1) * env_num) % init_states.shape[0]
-            init_states_ = init_states[indices]
-
-            dones = [False] * env_num
-            steps = 0
-            algo.reset()
-            obs = env.set_init_state(init_states_)
-
-            # dummy actions [env_num, 7] all zeros for initial physics simulation
-            dummy = np.zeros((env_num, 7))
-            for _ in range(5):
-                obs, _, _, _ = env.step(dummy)
-
-            if task_str != "":
-                sim_state = env.get_sim_state()
-                for k in range(env_num):
-                    if i * env_num + k < cfg.eval.n_eval and sim_states is not None:
-                        sim_states[i * env_num + k].append(sim_state[k])
-
-            while steps < cfg.eval.max_steps:
-                steps += 1
-
-                data = raw_obs_to_tensor_obs(obs, task_emb, cfg)
-                actions = algo.policy.get_action(data)
-
-                obs, reward, done, info = env.step(actions)
+        obs_converter = TensorObsConverter(cfg)
+        num_episodes = cfg.eval.n_eval
+        if cfg.eval.get("refill_env_slots", False):
+            task_spec = {
+                "init_states": init_states,
+                "task_emb": task_emb,
+                "sim_states": sim_states if task_str != "" else None,
+                "stopper": stopper,
+            }
+            [(num_success, num_episodes)] = run_slot_refill_rollouts(
+                cfg, algo, env, env_num, [task_spec], obs_converter
+            )
+        else:
+            for i in range(eval_loop_num):
+                env.reset()
+                indices = (
+                    np.arange(i * env_num, (i + 1) * env_num) % init_states.shape[0]
+                )
+                init_states_ = init_states[indices]
+
+                dones = [False] * env_num
+                steps = 0
+                algo.reset()
+                obs = env.set_init_state(init_states_)
+
+                # dummy actions [env_num, 7] all zeros for initial physics simulation
+                dummy = np.zeros((env_num, 7))
+                for _ in range(5):
+                    obs, _, _, _ = env.step(dummy)
 
-                # record the sim states for replay purpose
                 if task_str != "":
                     sim_state = env.get_sim_state()
                     for k in range(env_num):
                         if i * env_num + k < cfg.eval.n_eval and sim_states is not None:
                             sim_states[i * env_num + k].append(sim_state[k])
 
-                # check whether succeed
+                while steps < cfg.eval.max_steps:
+                    steps += 1
+
+                    data = obs_converter(obs, task_emb)
+                    actions = algo.policy.get_action(data)
+
+                    obs, reward, done, info = env.step(actions)
+
+                    # record the sim states for replay purpose
+                    if task_str != "":
+                        sim_state = env.get_sim_state()
+                        for k in range(env_num):
+                            if (
+                                i * env_num + k < cfg.eval.n_eval
+                                and sim_states is not None
+                            ):
+                                sim_states[i * env_num + k].append(sim_state[k])
+
+                    # check whether succeed
+                    for k in range(env_num):
+                        dones[k] = dones[k] or done[k]
+
+                    if all(dones):
+                        break
+
+                # a new form of success record
                 for k in range(env_num):
-                    dones[k] = dones[k] or done[k]
+                    if i * env_num + k < cfg.eval.n_eval:
+                        num_success += int(dones[k])
 
-                if all(dones):
+                num_episodes = min((i + 1) * env_num, cfg.eval.n_eval)
+                if stopper is not None and stopper(num_success, num_episodes):
                     break
 
-            # a new form of success record
-            for k in range(env_num):
-                if i * env_num + k < cfg.eval.n_eval:
-                    num_success += int(dones[k])
-
-        success_rate = num_success / cfg.eval.n_eval
-        env.close()
-        gc.collect()
+        success_rate = num_success / num_episodes
+        if num_episodes < cfg.eval.n_eval:
+            print(
+                f"[info] evaluation stopped after {num_episodes}/{cfg.eval.n_eval} episodes"
+            )
+        if not cfg.eval.get("persistent_env_pool", False):
+            env.close()
+            gc.collect()
     print(f"[info] evaluate task {task_id} takes {t.get_elapsed_time():.1f} seconds")
     return success_rate
 
 
+def evaluate_tasks_batched(cfg, algo, benchmark, task_ids, result_summary=None):
+    """
+    Evaluate the success rates of several tasks at once. The envs of
+    cfg.eval.batched_num_procs workers (defaults to cfg.eval.num_procs, at most
+    one per episode) run the episodes of all tasks, loading
+    each task when they switch to it, and the observations of all running
+    episodes go through one get_action call per step, every row with its own
+    task embedding and temporal context.
+    result_summary: if not None, keeps track of the simulated states of task
+                    i under the key f"k{task_ids[-1]}_p{i}"
+    """
+    with Timer() as t:
+        algo.eval()
+        if cfg.eval.use_mp:
+            env_num = min(
+                cfg.eval.get("batched_num_procs", None) or cfg.eval.num_procs,
+                len(task_ids) * cfg.eval.n_eval,
+            )
+        else:
+            env_num = 1
+
+        tasks = []
+        for i in task_ids:
+            task = benchmark.get_task(i)
+            init_states_path = os.path.join(
+                cfg.init_states_folder, task.problem_folder, task.init_states_file
+            )
+            sim_states = None
+            if result_summary is not None:
+                sim_states = result_summary[f"k{task_ids[-1]}_p{i}"]
+            tasks.append(
+                {
+                    "env_args": {
+                        "bddl_file_name": os.path.join(
+                            cfg.bddl_folder, task.problem_folder, task.bddl_file
+                        ),
+                        "camera_heights": cfg.data.img_h,
+                        "camera_widths": cfg.data.img_w,
+                    },
+                    "init_states": torch.load(init_states_path),
+                    "task_emb": benchmark.get_task_emb(i),
+                    "sim_states": sim_states,
+                }
+            )
+
+        if cfg.eval.get("persistent_env_pool", False):
+            env_pool = get_eval_env_pool(cfg, env_num)
+            env = env_pool.get(tasks[0]["env_args"])
+            # the workers end up with different tasks loaded
+            env_pool.problem_key = None
+        else:
+            env = create_eval_env(cfg, tasks[0]["env_args"], env_num)
+
+        results = run_slot_refill_rollouts(
+            cfg, algo, env, env_num, tasks, TensorObsConverter(cfg)
+        )
+        successes = np.array(
+            [num_success / num_episodes for (num_success, num_episodes) in results]
+        )
+
+        if not cfg.eval.get("persistent_env_pool", False):
+            env.close()
+            gc.collect()
+    print(
+        f"[info] evaluate {len(task_ids)} tasks batched takes {t.get_elapsed_time():.1f} seconds"
+    )
+    return successes
+
+
 def evaluate_success(cfg, algo, benchmark, task_ids, result_summary=None):
     """
     Evaluate the success rate for all task in task_ids.
     """
+    # PackNet evaluates each task with its own masked weights
+    if cfg.eval.get("batch_tasks", False) and cfg.lifelong.algo != "PackNet":
+        return evaluate_tasks_batched(cfg, algo, benchmark, task_ids, result_summary)
+
     algo.eval()
     successes = []
     for i in task_ids:
@@ -183,6 +605,9 @@ def evaluate_multitask_training_success(cfg, algo, benchmark, task_ids):
     """
     Evaluate the success rate for all task in task_ids.
     """
+    if cfg.eval.get("batch_tasks", False) and cfg.lifelong.algo != "PackNet":
+        return evaluate_tasks_batched(cfg, algo, benchmark, task_ids)
+
     algo.eval()
     successes = []
     for i in task_ids:
@@ -1,5 +1,12 @@
-from libero.lifelong.models.bc_rnn_policy import BCRNNPolicy
-from libero.lifelong.models.bc_transformer_policy import BCTransformerPolicy
-from libero.lifelong.models.bc_vilt_policy import BCViLTPolicy
+from libero.lifelong.models.base_policy import (
+    REGISTERED_POLICIES,
+    get_policy_class,
+    get_policy_list,
+)
 
-from libero.lifelong.models.base_policy import get_policy_class, get_policy_list
+
+def __getattr__(name):
+    # the policies are imported on demand, see REGISTERED_POLICIES
+    if name.lower() in REGISTERED_POLICIES:
+        return get_policy_class(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -11,13 +11,22 @@ from libero.lifelong.models.modules.data_augmentation import (
     DataAugGroup,
 )
 
-REGISTERED_POLICIES = {}
+from libero.libero.utils.registry_utils import LazyRegistry
+
+# the policies of libero.lifelong.models, imported when they are requested
+REGISTERED_POLICIES = LazyRegistry(
+    {
+        "bcrnnpolicy": "libero.lifelong.models.bc_rnn_policy",
+        "bctransformerpolicy": "libero.lifelong.models.bc_transformer_policy",
+        "bcviltpolicy": "libero.lifelong.models.bc_vilt_policy",
+    }
+)
 
 
 def register_policy(policy_class):
     """Register a policy class with the registry."""
     policy_name = policy_class.__name__.lower()
-    if policy_name in REGISTERED_POLICIES:
+    if REGISTERED_POLICIES.is_registered(policy_name):
         raise ValueError("Cannot register duplicate policy ({})".format(policy_name))
 
     REGISTERED_POLICIES[policy_name] = policy_class
@@ -78,9 +87,14 @@ class BasePolicy(nn.Module, metaclass=PolicyMeta):
         """
         raise NotImplementedError
 
-    def get_action(self, data):
+    def get_action(self, data, slot_ids=None):
         """
         The api to get policy's action.
+
+        slot_ids: if not None, the rows of the batch belong to independent
+                  rollouts, the i-th row to the rollout in slot slot_ids[i].
+                  The policy keeps the history of every slot separately, so
+                  the batch can be any subset of the slots.
         """
         raise NotImplementedError
 
@@ -123,3 +137,82 @@ class BasePolicy(nn.Module, metaclass=PolicyMeta):
         Clear all "history" of the policy if there exists any.
         """
         pass
+
+    def reset_slots(self, slot_ids):
+        """
+        Clear the "history" of the given rollout slots, see get_action.
+        """
+        pass
+
+
+class TemporalTransformerMixin:
+    """
+    The temporal encoding and rollout history of the policies encoding a window
+    of timesteps with a causal temporal_transformer, e.g. BCTransformerPolicy.
+    The policy provides spatial_encode, temporal_position_encoding_fn,
+    temporal_transformer and policy_head, and calls init_temporal_history.
+    """
+
+    def init_temporal_history(self, policy_cfg):
+        self.latent_queue = []
+        self.slot_queues = {}
+        self.max_seq_len = policy_cfg.transformer_max_seq_len
+
+    def temporal_encode(self, x):
+        pos_emb = self.temporal_position_encoding_fn(x)
+        x = x + pos_emb.unsqueeze(1)  # (B, T, num_modality, E)
+        sh = x.shape
+        self.temporal_transformer.compute_mask(x.shape)
+
+        x = TensorUtils.join_dimensions(x, 1, 2)  # (B, T*num_modality, E)
+        x = self.temporal_transformer(x)
+        x = x.reshape(*sh)
+        return x[:, :, 0]  # (B, T, E)
+
+    def temporal_encode_slots(self, x, slot_ids):
+        """
+        The temporal encoding of get_action when the rows of x belong to
+        different rollout slots. Every slot keeps its own window of latents, so
+        the windows can have different lengths; the rows are encoded in groups
+        of equal window length. Returns the encoding of the latest timesteps.
+        """
+        groups = {}
+        for row, slot in enumerate(slot_ids):
+            queue = self.slot_queues.setdefault(slot, [])
+            queue.append(x[row : row + 1])
+            if len(queue) > self.max_seq_len:
+                queue.pop(0)
+            groups.setdefault(len(queue), []).append(row)
+
+        out = x.new_empty(x.shape[0], x.shape[-1])  # (B, E)
+        for rows in groups.values():
+            window = torch.cat(
+                [torch.cat(self.slot_queues[slot_ids[row]], dim=1) for row in rows]
+            )  # (B', T, num_modality, E)
+            out[rows] = self.temporal_encode(window)[:, -1]
+        return out
+
+    def get_action(self, data, slot_ids=None):
+        self.eval()
+        with torch.no_grad():
+            data = self.preprocess_input(data, train_mode=False)
+            x = self.spatial_encode(data)
+            if slot_ids is not None:
+                x = self.temporal_encode_slots(x, slot_ids)
+            else:
+                self.latent_queue.append(x)
+                if len(self.latent_queue) > self.max_seq_len:
+                    self.latent_queue.pop(0)
+                x = torch.cat(self.latent_queue, dim=1)  # (B, T, H_all)
+                x = self.temporal_encode(x)[:, -1]
+            dist = self.policy_head(x)
+        action = dist.sample().detach().cpu()
+        return action.view(action.shape[0], -1).numpy()
+
+    def reset(self):
+        self.latent_queue = []
+        self.slot_queues = {}
+
+    def reset_slots(self, slot_ids):
+        for slot in slot_ids:
+            self.slot_queues.pop(slot, None)
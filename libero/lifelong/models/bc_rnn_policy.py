@@ -140,6 +140,7 @@ class BCRNNPolicy(BasePolicy):
         )
         self.eval_h0 = None
         self.eval_c0 = None
+        self.slot_states = {}
 
     def forward(self, data, train_mode=True):
         # 1. encode image
@@ -198,14 +199,41 @@ class BCRNNPolicy(BasePolicy):
         dist = self.policy_head(output)
         return dist
 
-    def get_action(self, data):
+    def _load_slot_states(self, slot_ids):
+        # gather the hidden states of the slots, zeros for new rollouts
+        zeros = torch.zeros(
+            self.D * self.cfg.policy.rnn_num_layers,
+            1,
+            self.cfg.policy.rnn_hidden_size,
+        ).to(self.device)
+        states = [self.slot_states.get(slot, (zeros, zeros)) for slot in slot_ids]
+        self.eval_h0 = torch.cat([h for (h, _) in states], dim=1)
+        self.eval_c0 = torch.cat([c for (_, c) in states], dim=1)
+
+    def _store_slot_states(self, slot_ids):
+        for i, slot in enumerate(slot_ids):
+            self.slot_states[slot] = (
+                self.eval_h0[:, i : i + 1],
+                self.eval_c0[:, i : i + 1],
+            )
+
+    def get_action(self, data, slot_ids=None):
         self.eval()
         data = self.preprocess_input(data, train_mode=False)
         with torch.no_grad():
+            if slot_ids is not None:
+                self._load_slot_states(slot_ids)
             dist = self.forward(data)
+            if slot_ids is not None:
+                self._store_slot_states(slot_ids)
         action = dist.sample().detach().cpu()
         return action.view(action.shape[0], -1).numpy()
 
     def reset(self):
         self.eval_h0 = None
         self.eval_c0 = None
+        self.slot_states = {}
+
+    def reset_slots(self, slot_ids):
+        for slot in slot_ids:
+            self.slot_states.pop(slot, None)
@@ -5,7 +5,7 @@ import torch.nn as nn
 from libero.lifelong.models.modules.rgb_modules import *
 from libero.lifelong.models.modules.language_modules import *
 from libero.lifelong.models.modules.transformer_modules import *
-from libero.lifelong.models.base_policy import BasePolicy
+from libero.lifelong.models.base_policy import BasePolicy, TemporalTransformerMixin
 from libero.lifelong.models.policy_head import *
 
 
@@ -168,7 +168,7 @@ class PerturbationAttention:
 ###############################################################################
 
 
-class BCTransformerPolicy(BasePolicy):
+class BCTransformerPolicy(TemporalTransformerMixin, BasePolicy):
     """
     Input: (o_{t-H}, ... , o_t)
     Output: a_t or distribution of a_t
@@ -239,19 +239,7 @@ class BCTransformerPolicy(BasePolicy):
             **policy_cfg.policy_head.network_kwargs
         )
 
-        self.latent_queue = []
-        self.max_seq_len = policy_cfg.transformer_max_seq_len
-
-    def temporal_encode(self, x):
-        pos_emb = self.temporal_position_encoding_fn(x)
-        x = x + pos_emb.unsqueeze(1)  # (B, T, num_modality, E)
-        sh = x.shape
-        self.temporal_transformer.compute_mask(x.shape)
-
-        x = TensorUtils.join_dimensions(x, 1, 2)  # (B, T*num_modality, E)
-        x = self.temporal_transformer(x)
-        x = x.reshape(*sh)
-        return x[:, :, 0]  # (B, T, E)
+        self.init_temporal_history(policy_cfg)
 
     def spatial_encode(self, data):
         # 1. encode extra
@@ -285,20 +273,3 @@ class BCTransformerPolicy(BasePolicy):
         x = self.temporal_encode(x)
         dist = self.policy_head(x)
         return dist
-
-    def get_action(self, data):
-        self.eval()
-        with torch.no_grad():
-            data = self.preprocess_input(data, train_mode=False)
-            x = self.spatial_encode(data)
-            self.latent_queue.append(x)
-            if len(self.latent_queue) > self.max_seq_len:
-                self.latent_queue.pop(0)
-            x = torch.cat(self.latent_queue, dim=1)  # (B, T, H_all)
-            x = self.temporal_encode(x)
-            dist = self.policy_head(x[:, -1])
-        action = dist.sample().detach().cpu()
-        return action.view(action.shape[0], -1).numpy()
-
-    def reset(self):
-        self.latent_queue = []
@@ -1,17 +1,19 @@
 import copy
+import hashlib
 import json
 import os
 import random
 from pathlib import Path
+from statistics import NormalDist
 
 import numpy as np
 import robomimic.utils.tensor_utils as TensorUtils
 import torch
 import torch.nn as nn
 from hydra.utils import to_absolute_path
-from thop import profile
 from torch.utils.data import DataLoader
-from transformers import AutoModel, AutoTokenizer, logging
+
+from libero.libero import get_libero_path
 
 
 def control_seed(seed):
@@ -45,14 +47,18 @@ class NpEncoder(json.JSONEncoder):
 
 
 def torch_save_model(model, model_path, cfg=None, previous_masks=None):
+    # write to a temporary file first, so readers (e.g. the EvalService) never
+    # see a partially written checkpoint
+    tmp_path = model_path + ".tmp"
     torch.save(
         {
             "state_dict": model.state_dict(),
             "cfg": cfg,
             "previous_masks": previous_masks,
         },
-        model_path,
+        tmp_path,
     )
+    os.replace(tmp_path, model_path)
 
 
 def torch_load_model(model_path, map_location=None):
@@ -94,7 +100,25 @@ def confidence_interval(p, n):
     return 1.96 * np.sqrt(p * (1 - p) / n)
 
 
+def wilson_interval(num_success, n, alpha=0.05):
+    """
+    The Wilson score interval of a success rate with confidence 1 - alpha.
+    Unlike confidence_interval, it stays inside [0, 1] and is usable for the
+    few episodes of an early stopped evaluation.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+    p = num_success / n
+    denom = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
 def compute_flops(algo, dataset, cfg):
+    from thop import profile
+
     model = copy.deepcopy(algo.policy)
     tmp_loader = DataLoader(dataset, batch_size=1, num_workers=0, shuffle=True)
     data = next(iter(tmp_loader))
@@ -149,16 +173,77 @@ def create_experiment_dir(cfg):
     return True
 
 
-def get_task_embs(cfg, descriptions):
-    logging.set_verbosity_error()
+# the pretrained model of every task embedding format
+TASK_EMB_MODELS = {
+    "bert": "bert-base-cased",
+    "one-hot": "bert-base-cased",
+    "gpt2": "gpt2",
+    "clip": "openai/clip-vit-base-patch32",
+    "roberta": "roberta-base",
+}
 
-    if cfg.task_embedding_format == "one-hot":
-        # offset defaults to 1, if we have pretrained another model, this offset
-        # starts from the pretrained number of tasks + 1
-        offset = cfg.task_embedding_one_hot_offset
-        descriptions = [f"Task {i+offset}" for i in range(len(descriptions))]
 
-    if cfg.task_embedding_format == "bert" or cfg.task_embedding_format == "one-hot":
+def get_task_emb_cache_file(task_embedding_format, max_word_len, folder=None):
+    """
+    The file caching the embeddings of one format, model and max_word_len,
+    under the task_embs path of the libero config (next to the datasets
+    folder if the config has no such key).
+    """
+    if folder is None:
+        try:
+            folder = get_libero_path("task_embs")
+        except AssertionError:
+            folder = os.path.join(
+                os.path.dirname(os.path.normpath(get_libero_path("datasets"))),
+                "task_embs",
+            )
+    model_id = TASK_EMB_MODELS[task_embedding_format].replace("/", "--")
+    return os.path.join(
+        folder, f"{task_embedding_format}_{model_id}_{max_word_len}.npz"
+    )
+
+
+def hash_description(description):
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+def load_cached_task_embs(cache_file):
+    """
+    The cached embeddings of a file, as a dict from description hashes to
+    numpy arrays.
+    """
+    if not os.path.exists(cache_file):
+        return {}
+    with np.load(cache_file) as f:
+        return dict(zip(f["keys"].tolist(), f["embs"]))
+
+
+def save_cached_task_embs(cache_file, descriptions, task_embs):
+    """
+    Add the embeddings of some descriptions to a cache file.
+    """
+    cache = load_cached_task_embs(cache_file)
+    for description, emb in zip(descriptions, task_embs):
+        cache[hash_description(description)] = np.asarray(emb, dtype=np.float32)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    # write to a temporary file first, other jobs may be reading the cache
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_file, keys=np.array(list(cache.keys())), embs=np.stack(list(cache.values()))
+    )
+    os.replace(tmp_file, cache_file)
+
+
+def encode_descriptions(task_embedding_format, descriptions, max_word_len):
+    """
+    Encode language descriptions with the pretrained model of a task
+    embedding format. transformers is only imported here.
+    """
+    from transformers import AutoModel, AutoTokenizer, logging
+
+    logging.set_verbosity_error()
+
+    if task_embedding_format == "bert" or task_embedding_format == "one-hot":
         tz = AutoTokenizer.from_pretrained(
             "bert-base-cased", cache_dir=to_absolute_path("./bert")
         )
@@ -168,7 +253,7 @@ def get_task_embs(cfg, descriptions):
         tokens = tz(
             text=descriptions,  # the sentence to be encoded
             add_special_tokens=True,  # Add [CLS] and [SEP]
-            max_length=cfg.data.max_word_len,  # maximum length of a sentence
+            max_length=max_word_len,  # maximum length of a sentence
             padding="max_length",
             return_attention_mask=True,  # Generate the attention mask
             return_tensors="pt",  # ask the function to return PyTorch tensors
@@ -178,43 +263,89 @@ def get_task_embs(cfg, descriptions):
         task_embs = model(tokens["input_ids"], tokens["attention_mask"])[
             "pooler_output"
         ].detach()
-    elif cfg.task_embedding_format == "gpt2":
+    elif task_embedding_format == "gpt2":
         tz = AutoTokenizer.from_pretrained("gpt2")
         tz.pad_token = tz.eos_token
         model = AutoModel.from_pretrained("gpt2")
         tokens = tz(
             text=descriptions,  # the sentence to be encoded
             add_special_tokens=True,  # Add [CLS] and [SEP]
-            max_length=cfg.data.max_word_len,  # maximum length of a sentence
+            max_length=max_word_len,  # maximum length of a sentence
             padding="max_length",
             return_attention_mask=True,  # Generate the attention mask
             return_tensors="pt",  # ask the function to return PyTorch tensors
         )
         task_embs = model(**tokens)["last_hidden_state"].detach()[:, -1]
-    elif cfg.task_embedding_format == "clip":
+    elif task_embedding_format == "clip":
         tz = AutoTokenizer.from_pretrained("openai/clip-vit-base-patch32")
         model = AutoModel.from_pretrained("openai/clip-vit-base-patch32")
         tokens = tz(
             text=descriptions,  # the sentence to be encoded
             add_special_tokens=True,  # Add [CLS] and [SEP]
-            max_length=cfg.data.max_word_len,  # maximum length of a sentence
+            max_length=max_word_len,  # maximum length of a sentence
             padding="max_length",
             return_attention_mask=True,  # Generate the attention mask
             return_tensors="pt",  # ask the function to return PyTorch tensors
         )
         task_embs = model.get_text_features(**tokens).detach()
-    elif cfg.task_embedding_format == "roberta":
+    elif task_embedding_format == "roberta":
         tz = AutoTokenizer.from_pretrained("roberta-base")
         tz.pad_token = tz.eos_token
         model = AutoModel.from_pretrained("roberta-base")
         tokens = tz(
             text=descriptions,  # the sentence to be encoded
             add_special_tokens=True,  # Add [CLS] and [SEP]
-            max_length=cfg.data.max_word_len,  # maximum length of a sentence
+            max_length=max_word_len,  # maximum length of a sentence
             padding="max_length",
             return_attention_mask=True,  # Generate the attention mask
             return_tensors="pt",  # ask the function to return PyTorch tensors
         )
         task_embs = model(**tokens)["pooler_output"].detach()
+    return task_embs
+
+
+def load_task_embs(
+    task_embedding_format, descriptions, max_word_len, use_cache=True, folder=None
+):
+    """
+    The embeddings of some descriptions. With use_cache, the embeddings are
+    read from the cache file of the format, and only the missing ones are
+    encoded and added to it.
+    """
+    if not use_cache:
+        return encode_descriptions(task_embedding_format, descriptions, max_word_len)
+
+    cache_file = get_task_emb_cache_file(task_embedding_format, max_word_len, folder)
+    cache = load_cached_task_embs(cache_file)
+    missing = [
+        description
+        for description in dict.fromkeys(descriptions)
+        if hash_description(description) not in cache
+    ]
+    if len(missing) > 0:
+        missing_embs = encode_descriptions(
+            task_embedding_format, missing, max_word_len
+        ).numpy()
+        save_cached_task_embs(cache_file, missing, missing_embs)
+        for description, emb in zip(missing, missing_embs):
+            cache[hash_description(description)] = emb
+    return torch.from_numpy(
+        np.stack([cache[hash_description(description)] for description in descriptions])
+    ).float()
+
+
+def get_task_embs(cfg, descriptions):
+    if cfg.task_embedding_format == "one-hot":
+        # offset defaults to 1, if we have pretrained another model, this offset
+        # starts from the pretrained number of tasks + 1
+        offset = cfg.task_embedding_one_hot_offset
+        descriptions = [f"Task {i+offset}" for i in range(len(descriptions))]
+
+    task_embs = load_task_embs(
+        cfg.task_embedding_format,
+        descriptions,
+        cfg.data.max_word_len,
+        use_cache=cfg.get("task_embedding_cache", True),
+    )
     cfg.policy.language_encoder.network_kwargs.input_size = task_embs.shape[-1]
     return task_embs
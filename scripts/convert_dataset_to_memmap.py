@@ -0,0 +1,43 @@
+"""Convert `*_demo.hdf5` files into the memory-mapped layout used with `data.use_memmap=true`.
+
+Example:
+    python scripts/convert_dataset_to_memmap.py --dataset-folder libero/datasets/libero_90
+"""
+import argparse
+import glob
+import os
+
+import init_path
+from libero.lifelong.datasets import convert_hdf5_to_memmap, get_memmap_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--datasets", type=str, nargs="*", default=[])
+    parser.add_argument(
+        "--dataset-folder",
+        type=str,
+        default=None,
+        help="Convert all the hdf5 files under this folder",
+    )
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    datasets = list(args.datasets)
+    if args.dataset_folder is not None:
+        datasets += sorted(
+            glob.glob(os.path.join(args.dataset_folder, "**", "*.hdf5"), recursive=True)
+        )
+    assert len(datasets) > 0, "[error] no hdf5 files given"
+
+    for dataset_path in datasets:
+        output_path = get_memmap_path(dataset_path)
+        if os.path.exists(output_path) and not args.overwrite:
+            print(f"[info] skipping {output_path}, it already exists")
+            continue
+        convert_hdf5_to_memmap(dataset_path, output_path, overwrite=args.overwrite)
+        print(f"[info] converted {dataset_path} to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,325 @@
+"""Replay the demonstrations collected with collect_demonstration.py and save
+their observations as a LIBERO dataset.
+
+The demos are replayed by stepping their actions, or with --replay states by
+rendering their recorded states without stepping the physics, which is exact
+and faster. Both observe the state after each action; the states replay drops
+the last step of each demo, whose next state is not recorded. --check-replay
+replays a demo both ways and compares their observations. They are replayed by a pool of envs, and every worker writes each
+demo it replays to its own shard file in --shard-dir as soon as it is done. An
+interrupted conversion resumes from the demos without a shard. The shards are
+then merged into the dataset, either by copying them or as virtual datasets
+referencing them, and a summary of the playback divergence is reported.
+
+Example:
+    python scripts/create_dataset.py --demo-file demo.hdf5 --use-camera-obs \
+        --num-workers 16 --compression gzip --camera-height 256 --camera-width 256
+"""
 import argparse
+import multiprocessing
 import os
 from pathlib import Path
 import h5py
 import numpy as np
 import json
-import robosuite
 import robosuite.utils.transform_utils as T
 import robosuite.macros as macros
 
 import init_path
 import libero.libero.utils.utils as libero_utils
-import cv2
-from PIL import Image
-from robosuite.utils import camera_utils
 
 from libero.libero.envs import *
 from libero.libero import get_libero_path
 
+# Skip recording the first steps because the force sensor is not stable in the
+# beginning
+CAP_INDEX = 5
+# playback errors above this are reported as divergence
+DIVERGENCE_THRESHOLD = 0.01
+
+# the env of a worker process, created by init_worker
+ENV = None
+
+
+def get_dataset_path(bddl_file_name):
+    """The dataset of a task, e.g. <datasets>/libero_90/<task>_demo.hdf5."""
+    task_file = bddl_file_name.split("bddl_files/")[-1]
+    return os.path.join(
+        get_libero_path("datasets"), task_file.replace(".bddl", "_demo.hdf5")
+    )
+
+
+def get_shard_file(shard_dir, demo_name):
+    return os.path.join(shard_dir, f"{demo_name}.hdf5")
+
+
+def is_finished(shard_file, demo_name):
+    """Whether a demo was completely written to its shard."""
+    if not os.path.exists(shard_file):
+        return False
+    try:
+        with h5py.File(shard_file, "r") as f:
+            return f"data/{demo_name}" in f
+    except OSError:
+        return False
+
+
+def init_worker(problem_name, env_kwargs):
+    global ENV
+    ENV = TASK_MAPPING[problem_name](**env_kwargs)
+
+
+def record(buffers, key, index, value, length):
+    """Write value at index of buffers[key], allocated at the first value."""
+    if key not in buffers:
+        value = np.asarray(value)
+        buffers[key] = np.empty((length,) + value.shape, dtype=value.dtype)
+    buffers[key][index] = value
+
+
+def record_obs(env, obs, k, length, obs_data, robot_states, options):
+    """Record the observations of the k-th step of a demo."""
+    if not options["no_proprio"]:
+        if "robot0_gripper_qpos" in obs:
+            record(obs_data, "gripper_states", k, obs["robot0_gripper_qpos"], length)
+        record(obs_data, "joint_states", k, obs["robot0_joint_pos"], length)
+        ee_state = np.hstack(
+            (obs["robot0_eef_pos"], T.quat2axisangle(obs["robot0_eef_quat"]))
+        )
+        record(obs_data, "ee_states", k, ee_state, length)
+        record(obs_data, "ee_pos", k, ee_state[:3], length)
+        record(obs_data, "ee_ori", k, ee_state[3:], length)
+
+    record(robot_states, "robot_states", k, env.get_robot_state_vector(obs), length)
+
+    if options["use_camera_obs"]:
+        if options["use_depth"]:
+            record(obs_data, "agentview_depth", k, obs["agentview_depth"], length)
+            record(
+                obs_data, "eye_in_hand_depth", k, obs["robot0_eye_in_hand_depth"], length
+            )
+        record(obs_data, "agentview_rgb", k, obs["agentview_image"], length)
+        record(obs_data, "eye_in_hand_rgb", k, obs["robot0_eye_in_hand_image"], length)
+
+
+def replay_demo(env, model_xml, states, actions, options):
+    """
+    Replay a demo from its first state, by stepping its actions or, with the
+    "states" replay, by rendering its recorded states.
+
+    Returns:
+        data (dict): The arrays of the demo, with the observations in "obs".
+        model_xml (str): The model xml of the replay.
+        errors (np.array): The distance between the replayed and the recorded
+            states after every action but the last, zeros for the "states"
+            replay.
+
+    Both replays observe the state after each action, like the existing
+    datasets. The "states" replay renders the recorded state following each
+    action, so it drops the last action, whose next state is not recorded.
+    """
+    reset_success = False
+    while not reset_success:
+        try:
+            env.reset()
+            reset_success = True
+        except:
+            continue
+
+    model_xml = libero_utils.postprocess_model_xml(model_xml, {})
+
+    if options["render"]:
+        env.viewer.set_camera(0)
+
+    num_actions = actions.shape[0]
+    init_idx = 0
+    env.reset_from_xml_string(model_xml)
+    env.sim.reset()
+    env.sim.set_state_from_flattened(states[init_idx])
+    env.sim.forward()
+    model_xml = env.sim.model.get_xml()
+
+    if options["replay"] == "states":
+        valid_index = np.arange(CAP_INDEX, num_actions - 1)
+    else:
+        valid_index = np.arange(CAP_INDEX, num_actions)
+    length = len(valid_index)
+    obs_data = {}
+    robot_states = {}
+    errors = np.zeros(max(num_actions - 1, 0))
+
+    if options["replay"] == "states":
+        # the observation of the state each action leads to, rendered without
+        # stepping the physics
+        rendered_obs = env.render_states(states[valid_index + 1])
+        for k in range(length):
+            obs = {name: value[k] for name, value in rendered_obs.items()}
+            record_obs(env, obs, k, length, obs_data, robot_states, options)
+    else:
+        for j, action in enumerate(actions):
+            obs, reward, done, info = env.step(action)
+
+            if j < num_actions - 1:
+                # ensure that the actions deterministically lead to the same recorded states
+                state_playback = env.sim.get_state().flatten()
+                errors[j] = np.linalg.norm(states[j + 1] - state_playback)
+
+            if j < CAP_INDEX:
+                continue
+            record_obs(
+                env, obs, j - CAP_INDEX, length, obs_data, robot_states, options
+            )
+            if options["render"]:
+                env.render()
+
+    dones = np.zeros(length).astype(np.uint8)
+    dones[-1] = 1
+    rewards = np.zeros(length).astype(np.uint8)
+    rewards[-1] = 1
+    data = {
+        "obs": obs_data,
+        "actions": actions[valid_index],
+        "states": states[valid_index],
+        "robot_states": robot_states["robot_states"],
+        "rewards": rewards,
+        "dones": dones,
+    }
+    return data, model_xml, errors
+
+
+def check_replay(env, demo_file, ep, options):
+    """
+    Replay a demo by stepping its actions and by rendering its states, and
+    return the largest per-step mean absolute difference of every observation
+    (images in [0, 1]) over the steps they share, and the playback errors of
+    the actions replay.
+    """
+    with h5py.File(demo_file, "r") as f:
+        model_xml = f[f"data/{ep}"].attrs["model_file"]
+        states = f[f"data/{ep}/states"][()]
+        actions = np.array(f[f"data/{ep}/actions"][()])
+    replays = {}
+    for replay in ["actions", "states"]:
+        replay_options = dict(options, replay=replay, render=False)
+        replays[replay] = replay_demo(env, model_xml, states, actions, replay_options)
+    (data_a, _, errors), (data_s, _, _) = replays["actions"], replays["states"]
+    length = len(data_s["actions"])
+    assert np.array_equal(data_a["actions"][:length], data_s["actions"])
+
+    obs_pairs = [(key, data_a["obs"][key], data_s["obs"][key]) for key in data_s["obs"]]
+    obs_pairs.append(("robot_states", data_a["robot_states"], data_s["robot_states"]))
+    diffs = {}
+    for key, value_a, value_s in obs_pairs:
+        if length == 0:
+            diffs[key] = 0.0
+            continue
+        scale = 255.0 if value_s.dtype == np.uint8 else 1.0
+        value_a = value_a[:length].astype(np.float64) / scale
+        value_s = value_s.astype(np.float64) / scale
+        diff = np.abs(value_a - value_s).reshape(length, -1).mean(axis=1)
+        diffs[key] = float(diff.max())
+    return diffs, errors
+
+
+def create_chunked_dataset(grp, name, data, options):
+    """Create a dataset chunked along time and optionally compressed."""
+    kwargs = {}
+    if len(data) > 0:
+        kwargs["chunks"] = (min(options["chunk_len"], len(data)),) + data.shape[1:]
+        if options["compression"] is not None:
+            kwargs["compression"] = options["compression"]
+            kwargs["compression_opts"] = options["compression_opts"]
+    grp.create_dataset(name, data=data, **kwargs)
+
+
+def write_shard(shard_file, demo_name, ep, data, model_xml, errors, options):
+    """Write a demo to its shard file, atomically so that it is either complete
+    or missing."""
+    tmp_file = f"{shard_file}.tmp"
+    with h5py.File(tmp_file, "w") as f:
+        f.attrs["source_demo"] = ep
+        f.create_dataset("playback_errors", data=errors)
+
+        ep_data_grp = f.create_group(f"data/{demo_name}")
+        obs_grp = ep_data_grp.create_group("obs")
+        for key, value in data["obs"].items():
+            create_chunked_dataset(obs_grp, key, value, options)
+        for key in ["actions", "states", "robot_states", "rewards", "dones"]:
+            create_chunked_dataset(ep_data_grp, key, data[key], options)
+        ep_data_grp.attrs["num_samples"] = len(data["actions"])
+        ep_data_grp.attrs["model_file"] = model_xml
+        ep_data_grp.attrs["init_state"] = data["states"][0]
+    os.replace(tmp_file, shard_file)
+
+
+def convert_demo(job):
+    demo_file, ep, demo_name, shard_file, options = job
+    with h5py.File(demo_file, "r") as f:
+        model_xml = f[f"data/{ep}"].attrs["model_file"]
+        states = f[f"data/{ep}/states"][()]
+        actions = np.array(f[f"data/{ep}/actions"][()])
+    data, model_xml, errors = replay_demo(ENV, model_xml, states, actions, options)
+    write_shard(shard_file, demo_name, ep, data, model_xml, errors, options)
+    return demo_name, errors
+
+
+def link_virtual(src, dst_grp, name):
+    """Recreate a group of a shard in dst_grp with virtual datasets."""
+    if isinstance(src, h5py.Group):
+        grp = dst_grp.create_group(name)
+        for key in src:
+            link_virtual(src[key], grp, key)
+        dst = grp
+    else:
+        layout = h5py.VirtualLayout(shape=src.shape, dtype=src.dtype)
+        layout[...] = h5py.VirtualSource(src)
+        dst = dst_grp.create_virtual_dataset(name, layout)
+    for key, value in src.attrs.items():
+        dst.attrs[key] = value
+
+
+def merge_shards(grp, shard_files, merge):
+    """Add the demos of the shard files to grp, returns their total length."""
+    total_len = 0
+    for demo_name, shard_file in shard_files:
+        with h5py.File(os.path.abspath(shard_file), "r") as shard_f:
+            src = shard_f[f"data/{demo_name}"]
+            if merge == "virtual":
+                link_virtual(src, grp, demo_name)
+            else:
+                grp.copy(src, demo_name)
+            total_len += int(src.attrs["num_samples"])
+    return total_len
+
+
+def summarize_playback(shard_files, num_converted):
+    errors = {}
+    for demo_name, shard_file in shard_files:
+        with h5py.File(shard_file, "r") as f:
+            errors[demo_name] = f["playback_errors"][()]
+    max_errors = {
+        demo_name: float(demo_errors.max()) if len(demo_errors) > 0 else 0.0
+        for demo_name, demo_errors in errors.items()
+    }
+    all_errors = np.concatenate([np.zeros(0)] + list(errors.values()))
+    diverged_demos = [
+        demo_name
+        for demo_name, max_error in max_errors.items()
+        if max_error > DIVERGENCE_THRESHOLD
+    ]
+    return {
+        "num_demos": len(shard_files),
+        "num_converted": num_converted,
+        "num_resumed": len(shard_files) - num_converted,
+        "divergence_threshold": DIVERGENCE_THRESHOLD,
+        "mean_error": float(all_errors.mean()) if len(all_errors) > 0 else 0.0,
+        "max_error": max(max_errors.values(), default=0.0),
+        "num_diverged_steps": int((all_errors > DIVERGENCE_THRESHOLD).sum()),
+        "diverged_demos": diverged_demos,
+        "max_error_per_demo": max_errors,
+    }
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--demo-file", default="demo.hdf5")
@@ -44,46 +347,94 @@ def main():
         "--use-depth",
         action="store_true",
     )
+    parser.add_argument("--camera-height", type=int, default=128)
+    parser.add_argument("--camera-width", type=int, default=128)
+    parser.add_argument(
+        "--output-path",
+        type=str,
+        default=None,
+        help="Defaults to <datasets>/<suite>/<task>_demo.hdf5",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        type=str,
+        default=None,
+        help="Defaults to the output path without extension, suffixed with _shards",
+    )
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument(
+        "--replay",
+        type=str,
+        default="actions",
+        choices=["actions", "states"],
+        help="actions steps the recorded actions and observes the state after "
+        "each of them; states renders the recorded state after each of them, "
+        "without stepping the physics, and drops the last one",
+    )
+    parser.add_argument(
+        "--compression", type=str, default=None, choices=["gzip", "lzf"]
+    )
+    parser.add_argument(
+        "--compression-opts",
+        type=int,
+        default=None,
+        help="The gzip level",
+    )
+    parser.add_argument(
+        "--chunk-len",
+        type=int,
+        default=64,
+        help="The number of steps per chunk of the datasets",
+    )
+    parser.add_argument(
+        "--merge",
+        type=str,
+        default="copy",
+        choices=["copy", "virtual"],
+        help="virtual keeps the data in the shards, which must then be kept",
+    )
+    parser.add_argument(
+        "--check-replay",
+        action="store_true",
+        help="Replay the first demo with both --replay modes, compare their "
+        "observations and exit without writing the dataset",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Replay the demos that already have a shard again",
+    )
 
     args = parser.parse_args()
 
-    hdf5_path = args.demo_file
-    f = h5py.File(hdf5_path, "r")
+    demo_file = os.path.abspath(args.demo_file)
+    f = h5py.File(demo_file, "r")
     env_name = f["data"].attrs["env"]
 
-    env_args = f["data"].attrs["env_info"]
     env_kwargs = json.loads(f["data"].attrs["env_info"])
 
     problem_info = json.loads(f["data"].attrs["problem_info"])
-    problem_info["domain_name"]
     problem_name = problem_info["problem_name"]
-    language_instruction = problem_info["language_instruction"]
 
     # list of all demonstrations episodes
     demos = list(f["data"].keys())
 
     bddl_file_name = f["data"].attrs["bddl_file_name"]
 
-    bddl_file_dir = os.path.dirname(bddl_file_name)
-    replace_bddl_prefix = "/".join(bddl_file_dir.split("bddl_files/")[:-1] + "bddl_files")
-
-    hdf5_path = os.path.join(get_libero_path("datasets"), bddl_file_dir.split("bddl_files/")[-1].replace(".bddl", "_demo.hdf5"))
+    hdf5_path = args.output_path or get_dataset_path(bddl_file_name)
+    shard_dir = args.shard_dir or f"{os.path.splitext(hdf5_path)[0]}_shards"
 
     output_parent_dir = Path(hdf5_path).parent
     output_parent_dir.mkdir(parents=True, exist_ok=True)
+    os.makedirs(shard_dir, exist_ok=True)
 
-    h5py_f = h5py.File(hdf5_path, "w")
-
-    grp = h5py_f.create_group("data")
-
-    grp.attrs["env_name"] = env_name
-    grp.attrs["problem_info"] = f["data"].attrs["problem_info"]
-    grp.attrs["macros_image_convention"] = macros.IMAGE_CONVENTION
-
+    render = (
+        not args.use_camera_obs and args.num_workers <= 1 and args.replay == "actions"
+    )
     libero_utils.update_env_kwargs(
         env_kwargs,
         bddl_file_name=bddl_file_name,
-        has_renderer=not args.use_camera_obs,
+        has_renderer=render,
         has_offscreen_renderer=args.use_camera_obs,
         ignore_done=True,
         use_camera_obs=args.use_camera_obs,
@@ -94,185 +445,107 @@ def main():
         ],
         reward_shaping=True,
         control_freq=20,
-        camera_heights=128,
-        camera_widths=128,
+        camera_heights=args.camera_height,
+        camera_widths=args.camera_width,
         camera_segmentations=None,
     )
 
-    grp.attrs["bddl_file_name"] = bddl_file_name
-    grp.attrs["bddl_file_content"] = open(bddl_file_name, "r").read()
-    print(grp.attrs["bddl_file_content"])
+    options = {
+        "replay": args.replay,
+        "render": render,
+        "use_camera_obs": args.use_camera_obs,
+        "use_depth": args.use_depth,
+        "no_proprio": args.no_proprio,
+        "compression": args.compression,
+        "compression_opts": args.compression_opts
+        if args.compression == "gzip"
+        else None,
+        "chunk_len": args.chunk_len,
+    }
 
-    env = TASK_MAPPING[problem_name](
-        **env_kwargs,
+    if args.check_replay:
+        init_worker(problem_name, env_kwargs)
+        diffs, errors = check_replay(ENV, demo_file, demos[0], options)
+        ENV.close()
+        max_error = errors.max() if len(errors) > 0 else 0.0
+        print(f"[info] playback error of the actions replay: max {max_error:.4f}")
+        for key, diff in diffs.items():
+            print(f"[info] {key}: largest mean absolute difference {diff:.4f}")
+        mismatched = [key for key, diff in diffs.items() if diff > DIVERGENCE_THRESHOLD]
+        if len(mismatched) > 0:
+            print(f"[warning] the replay modes differ in {mismatched}")
+        else:
+            print("[info] the replay modes match")
+        return
+
+    shard_files = []
+    jobs = []
+    for (i, ep) in enumerate(demos):
+        demo_name = f"demo_{i}"
+        shard_file = get_shard_file(shard_dir, demo_name)
+        shard_files.append((demo_name, shard_file))
+        if args.overwrite or not is_finished(shard_file, demo_name):
+            jobs.append((demo_file, ep, demo_name, shard_file, options))
+    f.close()
+    print(
+        f"[info] replaying {len(jobs)} demos, {len(demos) - len(jobs)} already "
+        f"in {shard_dir}"
     )
 
+    def report(demo_name, errors):
+        max_error = errors.max() if len(errors) > 0 else 0.0
+        if max_error > DIVERGENCE_THRESHOLD:
+            print(f"[warning] playback diverged by {max_error:.2f} for {demo_name}")
+        else:
+            print(f"[info] converted {demo_name}")
+
+    if args.num_workers > 1:
+        # robosuite and MuJoCo state should not be inherited by forked workers
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(
+            args.num_workers,
+            initializer=init_worker,
+            initargs=(problem_name, env_kwargs),
+        ) as pool:
+            for demo_name, errors in pool.imap_unordered(convert_demo, jobs):
+                report(demo_name, errors)
+    elif len(jobs) > 0:
+        init_worker(problem_name, env_kwargs)
+        for job in jobs:
+            report(*convert_demo(job))
+        ENV.close()
+
     env_args = {
         "type": 1,
         "env_name": env_name,
         "problem_name": problem_name,
-        "bddl_file": f["data"].attrs["bddl_file_name"],
+        "bddl_file": bddl_file_name,
         "env_kwargs": env_kwargs,
     }
 
-    grp.attrs["env_args"] = json.dumps(env_args)
-    print(grp.attrs["env_args"])
-    total_len = 0
-    demos = demos
-
-    cap_index = 5
-
-    for (i, ep) in enumerate(demos):
-        print("Playing back random episode... (press ESC to quit)")
-
-        # # select an episode randomly
-        # read the model xml, using the metadata stored in the attribute for this episode
-        model_xml = f["data/{}".format(ep)].attrs["model_file"]
-        reset_success = False
-        while not reset_success:
-            try:
-                env.reset()
-                reset_success = True
-            except:
-                continue
-
-        model_xml = libero_utils.postprocess_model_xml(model_xml, {})
-
-        if not args.use_camera_obs:
-            env.viewer.set_camera(0)
-
-        # load the flattened mujoco states
-        states = f["data/{}/states".format(ep)][()]
-        actions = np.array(f["data/{}/actions".format(ep)][()])
-
-        num_actions = actions.shape[0]
-
-        init_idx = 0
-        env.reset_from_xml_string(model_xml)
-        env.sim.reset()
-        env.sim.set_state_from_flattened(states[init_idx])
-        env.sim.forward()
-        model_xml = env.sim.model.get_xml()
-
-        ee_states = []
-        gripper_states = []
-        joint_states = []
-        robot_states = []
-
-        agentview_images = []
-        eye_in_hand_images = []
-
-        agentview_depths = []
-        eye_in_hand_depths = []
-
-        agentview_seg = {0: [], 1: [], 2: [], 3: [], 4: []}
-
-        rewards = []
-        dones = []
-
-        valid_index = []
-
-        for j, action in enumerate(actions):
-
-            obs, reward, done, info = env.step(action)
-
-            if j < num_actions - 1:
-                # ensure that the actions deterministically lead to the same recorded states
-                state_playback = env.sim.get_state().flatten()
-                # assert(np.all(np.equal(states[j + 1], state_playback)))
-                err = np.linalg.norm(states[j + 1] - state_playback)
-
-                if err > 0.01:
-                    print(
-                        f"[warning] playback diverged by {err:.2f} for ep {ep} at step {j}"
-                    )
-
-            # Skip recording because the force sensor is not stable in
-            # the beginning
-            if j < cap_index:
-                continue
-
-            valid_index.append(j)
-
-            if not args.no_proprio:
-                if "robot0_gripper_qpos" in obs:
-                    gripper_states.append(obs["robot0_gripper_qpos"])
-
-                joint_states.append(obs["robot0_joint_pos"])
-
-                ee_states.append(
-                    np.hstack(
-                        (
-                            obs["robot0_eef_pos"],
-                            T.quat2axisangle(obs["robot0_eef_quat"]),
-                        )
-                    )
-                )
-
-            robot_states.append(env.get_robot_state_vector(obs))
-
-            if args.use_camera_obs:
-
-                if args.use_depth:
-                    agentview_depths.append(obs["agentview_depth"])
-                    eye_in_hand_depths.append(obs["robot0_eye_in_hand_depth"])
-
-                agentview_images.append(obs["agentview_image"])
-                eye_in_hand_images.append(obs["robot0_eye_in_hand_image"])
-            else:
-                env.render()
-
-        # end of one trajectory
-        states = states[valid_index]
-        actions = actions[valid_index]
-        dones = np.zeros(len(actions)).astype(np.uint8)
-        dones[-1] = 1
-        rewards = np.zeros(len(actions)).astype(np.uint8)
-        rewards[-1] = 1
-        print(len(actions), len(agentview_images))
-        assert len(actions) == len(agentview_images)
-        print(len(actions))
-
-        ep_data_grp = grp.create_group(f"demo_{i}")
-
-        obs_grp = ep_data_grp.create_group("obs")
-        if not args.no_proprio:
-            obs_grp.create_dataset(
-                "gripper_states", data=np.stack(gripper_states, axis=0)
-            )
-            obs_grp.create_dataset("joint_states", data=np.stack(joint_states, axis=0))
-            obs_grp.create_dataset("ee_states", data=np.stack(ee_states, axis=0))
-            obs_grp.create_dataset("ee_pos", data=np.stack(ee_states, axis=0)[:, :3])
-            obs_grp.create_dataset("ee_ori", data=np.stack(ee_states, axis=0)[:, 3:])
-
-        obs_grp.create_dataset("agentview_rgb", data=np.stack(agentview_images, axis=0))
-        obs_grp.create_dataset(
-            "eye_in_hand_rgb", data=np.stack(eye_in_hand_images, axis=0)
-        )
-        if args.use_depth:
-            obs_grp.create_dataset(
-                "agentview_depth", data=np.stack(agentview_depths, axis=0)
-            )
-            obs_grp.create_dataset(
-                "eye_in_hand_depth", data=np.stack(eye_in_hand_depths, axis=0)
-            )
-
-        ep_data_grp.create_dataset("actions", data=actions)
-        ep_data_grp.create_dataset("states", data=states)
-        ep_data_grp.create_dataset("robot_states", data=np.stack(robot_states, axis=0))
-        ep_data_grp.create_dataset("rewards", data=rewards)
-        ep_data_grp.create_dataset("dones", data=dones)
-        ep_data_grp.attrs["num_samples"] = len(agentview_images)
-        ep_data_grp.attrs["model_file"] = model_xml
-        ep_data_grp.attrs["init_state"] = states[init_idx]
-        total_len += len(agentview_images)
-
-    grp.attrs["num_demos"] = len(demos)
-    grp.attrs["total"] = total_len
-    env.close()
-
-    h5py_f.close()
-    f.close()
+    with h5py.File(demo_file, "r") as f, h5py.File(hdf5_path, "w") as h5py_f:
+        grp = h5py_f.create_group("data")
+
+        grp.attrs["env_name"] = env_name
+        grp.attrs["problem_info"] = f["data"].attrs["problem_info"]
+        grp.attrs["macros_image_convention"] = macros.IMAGE_CONVENTION
+        grp.attrs["bddl_file_name"] = bddl_file_name
+        grp.attrs["bddl_file_content"] = open(bddl_file_name, "r").read()
+        grp.attrs["env_args"] = json.dumps(env_args)
+
+        total_len = merge_shards(grp, shard_files, args.merge)
+        grp.attrs["num_demos"] = len(demos)
+        grp.attrs["total"] = total_len
+
+    summary = summarize_playback(shard_files, len(jobs))
+    with open(os.path.join(shard_dir, "summary.json"), "w") as summary_f:
+        json.dump(summary, summary_f, indent=4)
+    print(
+        f"[info] {summary['num_demos']} demos ({summary['num_resumed']} resumed), "
+        f"playback error mean {summary['mean_error']:.4f} max {summary['max_error']:.4f}, "
+        f"{summary['num_diverged_steps']} steps of {len(summary['diverged_demos'])} "
+        f"demos above {DIVERGENCE_THRESHOLD}"
+    )
 
     print("The created dataset is saved in the following path: ")
     print(hdf5_path)
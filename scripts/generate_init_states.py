@@ -0,0 +1,66 @@
+"""Generate fixed initial states (`.pruned_init` files) for bddl files.
+
+Example:
+    python scripts/generate_init_states.py --bddl-folder /tmp/pddl --suite my_tasks --num-states 50
+"""
+import argparse
+import glob
+import os
+
+import init_path
+from libero.libero import get_libero_path
+from libero.libero.utils.init_state_utils import generate_init_states
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bddl-files", type=str, nargs="*", default=[])
+    parser.add_argument(
+        "--bddl-folder",
+        type=str,
+        default=None,
+        help="Use all the bddl files under this folder",
+    )
+    parser.add_argument(
+        "--output-folder",
+        type=str,
+        default=None,
+        help="Root folder of the init state files, defaults to the init_states path of the LIBERO config",
+    )
+    parser.add_argument(
+        "--suite",
+        type=str,
+        default=None,
+        help="Suite folder of the generated files, defaults to the folder name of each bddl file",
+    )
+    parser.add_argument("--num-states", type=int, default=50)
+    parser.add_argument("--num-workers", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--settle-steps", type=int, default=10)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    bddl_files = list(args.bddl_files)
+    if args.bddl_folder is not None:
+        bddl_files += sorted(
+            glob.glob(os.path.join(args.bddl_folder, "**", "*.bddl"), recursive=True)
+        )
+    assert len(bddl_files) > 0, "[error] no bddl files given"
+
+    output_folder = args.output_folder or get_libero_path("init_states")
+    generate_init_states(
+        bddl_files,
+        output_folder,
+        num_states=args.num_states,
+        num_workers=args.num_workers,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+        settle_steps=args.settle_steps,
+        suite=args.suite,
+        overwrite=args.overwrite,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Encode the task descriptions of the registered benchmarks into the task
+embedding cache, so that training and evaluation jobs do not load the
+language models.
+
+Example:
+    python scripts/precompute_task_embs.py --formats bert clip
+"""
+import argparse
+
+import init_path
+from libero.libero.benchmark import get_benchmark, get_benchmark_dict
+from libero.lifelong.utils import (
+    TASK_EMB_MODELS,
+    get_task_emb_cache_file,
+    load_task_embs,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--formats",
+        type=str,
+        nargs="*",
+        default=list(TASK_EMB_MODELS.keys()),
+        choices=list(TASK_EMB_MODELS.keys()),
+    )
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Defaults to all the registered benchmarks",
+    )
+    parser.add_argument("--max-word-len", type=int, default=25)
+    parser.add_argument(
+        "--one-hot-offset",
+        type=int,
+        default=1,
+        help="The task_embedding_one_hot_offset of the one-hot descriptions",
+    )
+    parser.add_argument(
+        "--folder",
+        type=str,
+        default=None,
+        help="Defaults to the task_embs path of the LIBERO config",
+    )
+    args = parser.parse_args()
+
+    benchmark_names = args.benchmarks or list(get_benchmark_dict().keys())
+    descriptions = []
+    max_n_tasks = 0
+    for benchmark_name in benchmark_names:
+        benchmark = get_benchmark(benchmark_name)()
+        descriptions += [
+            benchmark.get_task(i).language for i in range(benchmark.n_tasks)
+        ]
+        max_n_tasks = max(max_n_tasks, benchmark.n_tasks)
+    descriptions = list(dict.fromkeys(descriptions))
+
+    for task_embedding_format in args.formats:
+        if task_embedding_format == "one-hot":
+            format_descriptions = [
+                f"Task {i + args.one_hot_offset}" for i in range(max_n_tasks)
+            ]
+        else:
+            format_descriptions = descriptions
+        load_task_embs(
+            task_embedding_format,
+            format_descriptions,
+            args.max_word_len,
+            folder=args.folder,
+        )
+        cache_file = get_task_emb_cache_file(
+            task_embedding_format, args.max_word_len, args.folder
+        )
+        print(
+            f"[info] cached {len(format_descriptions)} {task_embedding_format} "
+            f"embeddings in {cache_file}"
+        )
+
+
+if __name__ == "__main__":
+    main()